@@ -3,7 +3,7 @@ API v1 endpoints
 """
 from fastapi import APIRouter
 
-from app.api.v1 import auth, items, oauth, parser, reservations, telegram, wishlists
+from app.api.v1 import admin, auth, images, items, oauth, parser, reservations, telegram, uploads, wishlists
 
 api_router = APIRouter()
 
@@ -15,3 +15,6 @@ api_router.include_router(wishlists.router, prefix="/wishlists", tags=["wishlist
 api_router.include_router(items.router, prefix="/items", tags=["items"])
 api_router.include_router(reservations.router, prefix="/reservations", tags=["reservations"])
 api_router.include_router(parser.router, prefix="/parser", tags=["parser"])
+api_router.include_router(images.router, prefix="/images", tags=["images"])
+api_router.include_router(uploads.router, prefix="/uploads", tags=["uploads"])
+api_router.include_router(admin.router, prefix="/admin", tags=["admin"])
@@ -0,0 +1,75 @@
+"""
+Admin API endpoints
+"""
+from fastapi import APIRouter, Depends
+from pydantic import BaseModel, Field
+
+from app.api.deps import get_current_admin_user
+from app.models.user import User
+from app.services.parser.cache import parse_cache
+from app.services.parser.circuit import host_guard
+from app.services.parser.executor import parse_executor
+from app.services.parser.http import parser_http_client
+from app.services.parser.images import image_prober
+from app.services.parser.telemetry import parser_telemetry
+from app.services.parser.wb_baskets import basket_resolver
+from app.services.product_parser import product_parser
+
+router = APIRouter()
+
+
+class BasketTable(BaseModel):
+    """Таблица корзин Wildberries: пары (последний vol, номер корзины)"""
+    table: list[tuple[int, str]] = Field(min_length=1)
+
+
+@router.get("/parser-stats")
+async def get_parser_stats(
+    current_user: User = Depends(get_current_admin_user)
+):
+    """
+    Телеметрия парсеров (только для администраторов)
+
+    По каждому маркетплейсу:
+    - исходы парсинга: success, timeout, http_status, blocked, network,
+      empty, not_found, unavailable, error - всего и за последние
+      PARSER_TELEMETRY_WINDOW секунд (частота в минуту, доля успехов);
+    - гистограммы длительности parse() и фаз: connect (включая DNS), tls,
+      ttfb, download, parse.
+
+    Плюс счётчики HTTP клиента, лимитов хостов, пула разбора, кэша
+    и проверки изображений.
+    Данные локальны для процесса, который обработал запрос.
+    """
+    return {
+        "marketplaces": parser_telemetry.snapshot(),
+        "http": parser_http_client.stats,
+        "hosts": host_guard.stats,
+        "executor": {**parse_executor.stats, "in_flight": parse_executor.in_flight},
+        "cache": parse_cache.stats,
+        "images": image_prober.stats,
+        "parser": product_parser.stats,
+    }
+
+
+@router.get("/wb-baskets", response_model=BasketTable)
+async def get_wb_baskets(
+    current_user: User = Depends(get_current_admin_user)
+):
+    """Текущая таблица корзин Wildberries (в процессе, обработавшем запрос)"""
+    return BasketTable(table=basket_resolver.table)
+
+
+@router.put("/wb-baskets", response_model=BasketTable)
+async def update_wb_baskets(
+    data: BasketTable,
+    current_user: User = Depends(get_current_admin_user)
+):
+    """
+    Замена таблицы корзин Wildberries без перезапуска
+
+    Таблица применяется сразу в этом процессе и публикуется в Redis -
+    остальные воркеры подхватят её за PARSER_WB_BASKETS_RELOAD_INTERVAL.
+    """
+    await basket_resolver.publish(data.table)
+    return BasketTable(table=basket_resolver.table)
@@ -0,0 +1,42 @@
+"""
+Image proxy endpoint
+"""
+from fastapi import APIRouter, Header, HTTPException, Query
+from fastapi.responses import FileResponse
+
+from app.config import settings
+from app.services.image_proxy import ImageProxyError, image_proxy
+
+router = APIRouter()
+
+
+@router.get("/proxy")
+async def proxy_image(
+    url: str = Query(..., max_length=2000),
+    w: int = Query(320, ge=16, le=4096),
+    accept: str | None = Header(None)
+):
+    """
+    Превью изображения товара
+
+    Ширина округляется вверх до одной из IMAGE_PROXY_WIDTHS, формат - AVIF
+    (если клиент его принимает) или WebP. Ответ кэшируется браузером и CDN
+    надолго: превью для ссылки и ширины не меняется.
+
+    Без авторизации - используется в <img> на публичных страницах списков,
+    поэтому источники - только CDN маркетплейсов (IMAGE_PROXY_ALLOWED_HOSTS).
+    """
+    try:
+        path, media_type = await image_proxy.get(url, w, accept or "")
+    except ImageProxyError as e:
+        headers = {"Retry-After": str(e.retry_after)} if e.retry_after else None
+        raise HTTPException(status_code=e.status_code, detail=str(e), headers=headers) from e
+
+    return FileResponse(
+        path,
+        media_type=media_type,
+        headers={
+            "Cache-Control": f"public, max-age={settings.IMAGE_PROXY_CACHE_SECONDS}, immutable",
+            "Vary": "Accept",
+        },
+    )
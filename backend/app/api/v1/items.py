@@ -2,17 +2,23 @@
 Items API endpoints
 """
 
-from fastapi import APIRouter, Depends, HTTPException
+from datetime import datetime, timedelta
+
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.api.deps import get_current_user
+from app.api.deps import get_current_user, get_optional_current_user
 from app.database import get_db
 from app.models.item import WishlistItem
 from app.models.user import User
-from app.models.wishlist import Wishlist
+from app.models.wishlist import Wishlist, WishlistAccessType
+from app.schemas.item import PriceHistory, PricePoint, WishlistItemCreate, WishlistItemUpdate
 from app.schemas.item import WishlistItem as ItemSchema
-from app.schemas.item import WishlistItemCreate, WishlistItemUpdate
+from app.services.price_history import price_history
+from app.services.price_refresh import price_refresher
+from app.services.product_catalog import CATALOG_FIELDS, product_catalog
+from app.services.product_parser import product_parser
 
 router = APIRouter()
 
@@ -34,7 +40,11 @@ async def create_item(
     if not result.scalar_one_or_none():
         raise HTTPException(status_code=403, detail="Доступ запрещён")
 
-    item = WishlistItem(**data.model_dump())
+    # Не переданные описание и картинки берутся из каталога, пустые ("" или [])
+    # в запросе - очищены владельцем
+    item = WishlistItem(**data.model_dump(exclude=set(CATALOG_FIELDS) - data.model_fields_set))
+    price_refresher.schedule(item)
+    await product_catalog.attach(db, item)
     db.add(item)
     await db.commit()
     await db.refresh(item)
@@ -64,8 +74,12 @@ async def update_item(
     if not wishlist_result.scalar_one_or_none():
         raise HTTPException(status_code=403, detail="Доступ запрещён")
 
-    for key, value in data.model_dump(exclude_unset=True).items():
+    updates = data.model_dump(exclude_unset=True)
+    for key, value in updates.items():
         setattr(item, key, value)
+    if "link" in updates:
+        price_refresher.schedule(item)
+        await product_catalog.attach(db, item)
 
     await db.commit()
     await db.refresh(item)
@@ -96,3 +110,40 @@ async def delete_item(
 
     await db.delete(item)
     await db.commit()
+
+
+@router.get("/{item_id}/price-history", response_model=PriceHistory)
+async def get_item_price_history(
+    item_id: int,
+    days: int = Query(90, ge=1, le=365),
+    current_user: User | None = Depends(get_optional_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """История цены товара элемента (для графика и бейджа "цена снизилась")"""
+    result = await db.execute(
+        select(WishlistItem.link, Wishlist.owner_id, Wishlist.access_type)
+        .join(Wishlist, Wishlist.id == WishlistItem.wishlist_id)
+        .where(WishlistItem.id == item_id)
+    )
+    row = result.one_or_none()
+    if not row:
+        raise HTTPException(status_code=404, detail="Элемент не найден")
+
+    # Права как у списка: владелец, публичный или по ссылке
+    link, owner_id, access_type = row
+    is_owner = current_user and owner_id == current_user.id
+    if not (is_owner or access_type in (WishlistAccessType.public, WishlistAccessType.by_link)):
+        raise HTTPException(status_code=403, detail="Доступ запрещён")
+
+    key = product_parser.product_key(link) if link else None
+    if key is None:
+        return PriceHistory()
+
+    points = await price_history.history(db, key, since=datetime.utcnow() - timedelta(days=days))
+    minimums = await price_history.min_prices(db, [key])
+    return PriceHistory(
+        product_key=key,
+        points=[PricePoint(recorded_at=recorded_at, price=price) for recorded_at, price in points],
+        current_price=points[-1][1] if points else None,
+        min_price_30d=minimums.get(key),
+    )
@@ -2,12 +2,16 @@
 Parser API endpoint
 """
 from fastapi import APIRouter, Depends
-from pydantic import BaseModel
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.api.deps import get_current_user
+from app.config import settings
+from app.database import get_db
 from app.models.user import User
 from app.schemas.item import ParsedItemData
-from app.services.product_parser import product_parser
+from app.services.product_catalog import product_catalog
 
 router = APIRouter()
 
@@ -17,10 +21,23 @@ class ParseRequest(BaseModel):
     url: str
 
 
+class ParseBatchRequest(BaseModel):
+    """Запрос на пакетный парсинг списка URL"""
+    urls: list[str] = Field(min_length=1, max_length=settings.PARSER_BATCH_MAX_URLS)
+
+
+class ParseBatchItem(BaseModel):
+    """Одна строка ответа пакетного парсинга"""
+    index: int  # Позиция ссылки в запросе
+    url: str
+    result: ParsedItemData
+
+
 @router.post("/parse-url", response_model=ParsedItemData)
 async def parse_product_url(
     request: ParseRequest,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Парсинг товара по URL
@@ -37,6 +54,32 @@ async def parse_product_url(
     - Ozon
     - Яндекс.Маркет
     - Любые сайты с OpenGraph метатегами
+
+    Товары маркетплейсов берутся из общего каталога, если недавно спарсены.
     """
-    result = await product_parser.parse_url(request.url)
+    result = await product_catalog.parse_url(db, request.url)
     return result
+
+
+@router.post("/parse-urls")
+async def parse_product_urls(
+    request: ParseBatchRequest,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Пакетный парсинг списка ссылок (импорт в вишлист)
+
+    Ссылки парсятся параллельно, результаты отдаются потоком NDJSON
+    (одна строка ParseBatchItem на ссылку) в порядке готовности,
+    а не в порядке запроса - для сопоставления используйте index.
+
+    Как и parse-url, товары маркетплейсов берутся из общего каталога
+    и записываются в него.
+    """
+    async def stream():
+        async for index, result in product_catalog.parse_many(db, request.urls):
+            item = ParseBatchItem(index=index, url=request.urls[index], result=result)
+            yield item.model_dump_json() + "\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
@@ -3,65 +3,80 @@ Reservations API endpoints
 """
 
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy import select
+from sqlalchemy import select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.api.deps import get_current_user
 from app.database import get_db
-from app.models.item import WishlistItem
+from app.models.item import ItemStatus, WishlistItem
 from app.models.reservation import Reservation
 from app.models.user import User
-from app.models.wishlist import Wishlist
+from app.models.wishlist import Wishlist, WishlistAccessType
 from app.schemas.item import Reservation as ReservationSchema
 from app.schemas.item import ReservationCreate
 
 router = APIRouter()
 
 
-@router.post("/", response_model=ReservationSchema, status_code=201)
-async def create_reservation(
-    data: ReservationCreate,
-    current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
-):
-    """Создание бронирования подарка"""
-    # Получаем item
+async def reservation_error(db: AsyncSession, item_id: int, current_user: User) -> HTTPException:
+    """Почему подарок не удалось занять (читается только при отказе)"""
     result = await db.execute(
-        select(WishlistItem).where(WishlistItem.id == data.item_id)
+        select(WishlistItem.status, Wishlist)
+        .join(Wishlist, Wishlist.id == WishlistItem.wishlist_id)
+        .where(WishlistItem.id == item_id)
     )
-    item = result.scalar_one_or_none()
-    if not item:
-        raise HTTPException(status_code=404, detail="Подарок не найден")
-
-    # Проверяем, что item еще не забронирован
-    if item.status != 'available':
-        raise HTTPException(status_code=400, detail="Подарок уже забронирован")
+    row = result.one_or_none()
+    if not row:
+        return HTTPException(status_code=404, detail="Подарок не найден")
 
-    # Получаем wishlist для проверки прав
-    wishlist_result = await db.execute(
-        select(Wishlist).where(Wishlist.id == item.wishlist_id)
-    )
-    wishlist = wishlist_result.scalar_one_or_none()
-    if not wishlist:
-        raise HTTPException(status_code=404, detail="Список не найден")
+    status, wishlist = row
+    if status != ItemStatus.available:
+        return HTTPException(status_code=400, detail="Подарок уже забронирован")
 
     # Владелец не может бронировать свои же подарки
     if wishlist.owner_id == current_user.id:
-        raise HTTPException(status_code=400, detail="Нельзя бронировать свои подарки")
+        return HTTPException(status_code=400, detail="Нельзя бронировать свои подарки")
 
-    # Проверяем, разрешены ли бронирования
     if not wishlist.allow_reservations:
-        raise HTTPException(status_code=400, detail="Бронирование отключено для этого списка")
+        return HTTPException(status_code=400, detail="Бронирование отключено для этого списка")
+
+    return HTTPException(status_code=403, detail="Доступ запрещён")
 
-    # Проверяем доступ к wishlist
-    is_public = wishlist.access_type == 'public'
-    is_by_link = wishlist.access_type == 'by_link'
-    if not (is_public or is_by_link):
-        raise HTTPException(status_code=403, detail="Доступ запрещён")
 
-    # Создаем бронирование
+@router.post("/", response_model=ReservationSchema, status_code=201)
+async def create_reservation(
+    data: ReservationCreate,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Создание бронирования подарка
+
+    Подарок занимается одним условным UPDATE ... RETURNING: статус меняется,
+    только если подарок ещё свободен, а список открыт, разрешает бронь
+    и принадлежит другому пользователю. Из одновременных запросов строку
+    меняет ровно один - остальные ждут его блокировку и видят уже
+    reserved. Бронь вставляется в той же транзакции.
+    """
+    claimed = await db.scalar(
+        update(WishlistItem)
+        .where(
+            WishlistItem.id == data.item_id,
+            WishlistItem.status == ItemStatus.available,
+            WishlistItem.wishlist_id == Wishlist.id,
+            Wishlist.owner_id != current_user.id,
+            Wishlist.allow_reservations.is_(True),
+            Wishlist.access_type.in_([WishlistAccessType.public, WishlistAccessType.by_link]),
+        )
+        .values(status=ItemStatus.reserved)
+        .returning(WishlistItem.id)
+        .execution_options(synchronize_session="fetch")
+    )
+    if claimed is None:
+        raise await reservation_error(db, data.item_id, current_user)
+
     reservation = Reservation(
-        item_id=data.item_id,
+        item_id=claimed,
         user_id=current_user.id,
         guest_name=data.guest_name,
         guest_email=data.guest_email,
@@ -70,11 +85,8 @@ async def create_reservation(
     )
     db.add(reservation)
 
-    # Обновляем статус item
-    item.status = 'reserved'
-
+    # id и created_at заполняются при вставке, повторно бронь не читается
     await db.commit()
-    await db.refresh(reservation)
     return reservation
 
 
@@ -0,0 +1,58 @@
+"""
+Uploads API endpoints
+"""
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+
+from app.api.deps import get_current_user
+from app.config import settings
+from app.models.user import User
+from app.schemas.upload import UploadedImage
+from app.services.uploads import FILE_FIELD, MULTIPART_OVERHEAD, UploadError, upload_service
+
+router = APIRouter()
+
+# Тело читается вручную (потоком), поэтому схему запроса описываем для docs явно
+UPLOAD_REQUEST_SCHEMA = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": [FILE_FIELD],
+                    "properties": {FILE_FIELD: {"type": "string", "format": "binary"}},
+                }
+            }
+        },
+    }
+}
+
+
+@router.post(
+    "/images",
+    response_model=UploadedImage,
+    status_code=status.HTTP_201_CREATED,
+    openapi_extra=UPLOAD_REQUEST_SCHEMA
+)
+async def upload_image(
+    request: Request,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Загрузка изображения (обложка списка, фото товара)
+
+    Возвращает ссылку на файл для cover_image_url / image_url и ссылки
+    на превью WebP. Превью создаются в фоне и появляются через несколько
+    секунд после ответа. Один и тот же файл хранится один раз.
+    """
+    content_length = request.headers.get("content-length", "")
+    if content_length.isdigit() and int(content_length) > settings.MAX_UPLOAD_SIZE + MULTIPART_OVERHEAD:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Файл больше {settings.MAX_UPLOAD_SIZE // (1024 * 1024)} МБ"
+        )
+
+    try:
+        return await upload_service.save_image(request.headers.get("content-type", ""), request.stream())
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e)) from e
@@ -3,13 +3,14 @@ Wishlists API endpoints
 """
 
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy import select
+from sqlalchemy import or_, select
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
+from sqlalchemy.orm import contains_eager, selectinload
 
 from app.api.deps import get_current_user, get_optional_current_user
 from app.core.utils import generate_slug
 from app.database import get_db
+from app.models.item import WishlistItem
 from app.models.user import User
 from app.models.wishlist import Wishlist, WishlistAccessType
 from app.schemas.wishlist import Wishlist as WishlistSchema
@@ -63,38 +64,45 @@ async def get_wishlist_by_username(
     current_user: User | None = Depends(get_optional_current_user),
     db: AsyncSession = Depends(get_db)
 ):
-    """Получение списка по username и ID (публичная ссылка)"""
-    # Находим пользователя по username
+    """
+    Получение списка по username и ID (публичная ссылка)
+
+    Самая посещаемая страница, поэтому владелец, список и элементы по
+    порядку (с товарами каталога) читаются одним запросом с JOIN, а права
+    доступа проверяются в WHERE. Причина отказа (404/403) выясняется
+    отдельным запросом только при промахе.
+    """
+    # Владелец всегда имеет доступ
+    # Публичные списки доступны всем
+    # Списки "по ссылке" доступны всем, кто знает ссылку
+    # Приватные списки - только владельцу
+    visible = Wishlist.access_type.in_([WishlistAccessType.public, WishlistAccessType.by_link])
+    if current_user:
+        visible = or_(visible, Wishlist.owner_id == current_user.id)
+
     result = await db.execute(
-        select(User).where(User.username == username)
+        select(Wishlist)
+        .join(Wishlist.owner)
+        .outerjoin(Wishlist.items)
+        .options(contains_eager(Wishlist.items))
+        .where(User.username == username, Wishlist.id == wishlist_id, visible)
+        .order_by(WishlistItem.position)
     )
-    owner = result.scalar_one_or_none()
-    if not owner:
-        raise HTTPException(status_code=404, detail="Пользователь не найден")
+    wishlist = result.unique().scalar_one_or_none()
+    if wishlist:
+        return wishlist
 
-    # Находим вишлист
     result = await db.execute(
-        select(Wishlist)
-        .options(selectinload(Wishlist.items))
-        .where(Wishlist.id == wishlist_id, Wishlist.owner_id == owner.id)
+        select(User.id, Wishlist.id)
+        .outerjoin(Wishlist, (Wishlist.owner_id == User.id) & (Wishlist.id == wishlist_id))
+        .where(User.username == username)
     )
-    wishlist = result.scalar_one_or_none()
-    if not wishlist:
+    row = result.one_or_none()
+    if not row:
+        raise HTTPException(status_code=404, detail="Пользователь не найден")
+    if row[1] is None:
         raise HTTPException(status_code=404, detail="Список не найден")
-
-    # Проверка прав доступа
-    is_owner = current_user and wishlist.owner_id == current_user.id
-    is_public = wishlist.access_type == WishlistAccessType.public
-    is_by_link = wishlist.access_type == WishlistAccessType.by_link
-
-    # Владелец всегда имеет доступ
-    # Публичные списки доступны всем
-    # Списки "по ссылке" доступны всем, кто знает ссылку
-    # Приватные списки - только владельцу
-    if not (is_owner or is_public or is_by_link):
-        raise HTTPException(status_code=403, detail="Доступ запрещён")
-
-    return wishlist
+    raise HTTPException(status_code=403, detail="Доступ запрещён")
 
 
 @router.get("/{wishlist_id}", response_model=WishlistDetail)
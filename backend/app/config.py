@@ -34,6 +34,9 @@ class Settings(BaseSettings):
     REDIS_HOST: str = "redis"
     REDIS_PORT: int = 6379
     REDIS_DB: int = 0
+    REDIS_ENABLED: bool = True
+    REDIS_SOCKET_TIMEOUT: float = 1.0
+    REDIS_RETRY_INTERVAL: float = 30.0  # пауза перед повторным подключением после ошибки
 
     @property
     def REDIS_URL(self) -> str:
@@ -71,6 +74,26 @@ class Settings(BaseSettings):
     UPLOAD_DIR: str = "/app/uploads"
     MAX_UPLOAD_SIZE: int = 5 * 1024 * 1024  # 5 MB
     ALLOWED_EXTENSIONS: list = [".jpg", ".jpeg", ".png", ".gif", ".webp"]
+    UPLOAD_URL_PREFIX: str = "/uploads"  # по этому пути nginx отдаёт UPLOAD_DIR
+    UPLOAD_VARIANT_WIDTHS: list = [320, 640, 1080]  # превью WebP загруженных изображений
+
+    # Прокси изображений: превью нужной ширины в WebP/AVIF, кэш на диске в UPLOAD_DIR
+    IMAGE_PROXY_WIDTHS: list = [160, 320, 640, 1080]  # запрошенная ширина округляется вверх
+    IMAGE_PROXY_QUALITY: int = 80
+    IMAGE_PROXY_CACHE_MAX_BYTES: int = 1024 * 1024 * 1024  # 1 GB, сверх - вытесняются давно не запрошенные
+    IMAGE_PROXY_CACHE_SECONDS: int = 365 * 24 * 60 * 60  # Cache-Control max-age
+    IMAGE_PROXY_MAX_SOURCE_BYTES: int = 15 * 1024 * 1024  # исходник больше - отказ
+    IMAGE_PROXY_MAX_PIXELS: int = 50_000_000  # защита от "бомб" распаковки
+    IMAGE_PROXY_WORKERS: int = 2  # процессов для ресайза
+    IMAGE_PROXY_MAX_QUEUE: int = 32  # задач в очереди и в работе, сверх - 503
+    IMAGE_PROXY_ALLOWED_HOSTS: list = [  # источники - только CDN маркетплейсов (домен и поддомены)
+        "wbbasket.ru",
+        "wbstatic.net",
+        "ozone.ru",
+        "ozon.ru",
+        "yandex.net",
+        "yastatic.net",
+    ]
 
     # CORS
     CORS_ORIGINS: list = [
@@ -85,6 +108,111 @@ class Settings(BaseSettings):
     OZON_API_KEY: str | None = None
     YANDEX_MARKET_API_KEY: str | None = None
 
+    # HTTP клиент парсеров (общий пул соединений)
+    PARSER_HTTP2: bool = True
+    PARSER_HTTP_MAX_CONNECTIONS: int = 100
+    PARSER_HTTP_MAX_KEEPALIVE: int = 20  # keep-alive соединений на весь пул
+    PARSER_HTTP_KEEPALIVE_EXPIRY: float = 30.0  # секунд
+    PARSER_HTTP_CONNECT_TIMEOUT: float = 5.0
+    PARSER_HTTP_READ_TIMEOUT: float = 10.0
+    PARSER_HTTP_POOL_TIMEOUT: float = 5.0  # ожидание свободного соединения в пуле
+
+    # Лимит частоты запросов к хосту (запросов в секунду на воркер)
+    PARSER_RATE_LIMITS: dict = {
+        "ozon.ru": 2.0,
+        "market.yandex.ru": 2.0,
+        "wildberries.ru": 5.0,
+    }
+    PARSER_RATE_LIMIT_DEFAULT: float = 10.0
+    PARSER_RATE_BURST: int = 5
+    PARSER_RATE_MAX_WAIT: float = 2.0  # дольше ждать токен не имеет смысла - отказ
+
+    # Circuit breaker для хостов, которые блокируют нас или не отвечают
+    PARSER_CIRCUIT_FAILURES: int = 5  # ошибок (сеть, 403, 429, 5xx) за окно
+    PARSER_CIRCUIT_WINDOW: float = 60.0
+    PARSER_CIRCUIT_OPEN_SECONDS: float = 30.0
+    PARSER_CIRCUIT_SYNC_INTERVAL: float = 1.0  # как часто сверять состояние с Redis
+
+    # Потоковая загрузка страниц
+    PARSER_FETCH_MAX_BYTES: int = 3 * 1024 * 1024  # сверх лимита тело не читается
+    PARSER_FETCH_STOP_AT_HEAD: bool = True  # не читать <body>, если метаданных в <head> достаточно
+    PARSER_FETCH_GALLERY_MAX_BYTES: int = 16 * 1024  # сколько <body> читать в поисках галереи
+
+    # Проверка изображений товара перед отдачей клиенту (мёртвые ссылки выбрасываются)
+    PARSER_IMAGE_PROBE: bool = True
+    PARSER_IMAGE_PROBE_TIMEOUT: float = 1.5  # секунд на проверку всех изображений товара
+    PARSER_IMAGE_PROBE_TTL: int = 24 * 60 * 60  # кэш живой ссылки
+    PARSER_IMAGE_PROBE_DEAD_TTL: int = 60 * 60  # кэш мёртвой ссылки
+    PARSER_IMAGE_PROBE_LRU_SIZE: int = 8192
+
+    # Пул для разбора HTML (BeautifulSoup не блокирует event loop)
+    PARSER_EXECUTOR: str = "thread"  # "thread" или "process"
+    PARSER_EXECUTOR_WORKERS: int = 4
+    PARSER_EXECUTOR_MAX_QUEUE: int = 64  # задач в очереди и в работе, сверх - отказ
+
+    # Кэш результатов парсинга (LRU в процессе + Redis)
+    PARSER_CACHE_LRU_SIZE: int = 2048
+    PARSER_CACHE_TTL: dict = {  # секунд, по маркетплейсу
+        "wildberries": 60 * 30,
+        "ozon": 60 * 30,
+        "yandex_market": 60 * 30,
+        "other": 60 * 60,
+    }
+    PARSER_CACHE_NEGATIVE_TTL: int = 60 * 5  # для "товар не найден"
+    PARSER_CACHE_STALE_TTL: int = 24 * 60 * 60  # устаревший результат - запасной ответ при hedging
+
+    # Hedging: если парсер маркетплейса не ответил за PARSER_HEDGE_DELAY секунд,
+    # параллельно запускается запасная стратегия (устаревший кэш или OpenGraph)
+    PARSER_HEDGE_ENABLED: bool = True
+    PARSER_HEDGE_DELAY: float = 2.0
+
+    # Фоновое обновление цен в списках желаний
+    PRICE_REFRESH_ENABLED: bool = True
+    PRICE_REFRESH_INTERVAL: float = 60.0  # секунд между циклами
+    PRICE_REFRESH_PRODUCTS_PER_CYCLE: int = 200  # бюджет парсингов за цикл
+    PRICE_REFRESH_MAX_ITEMS_PER_CYCLE: int = 5000  # элементов, выбираемых из очереди за цикл
+    PRICE_REFRESH_BASE_HOURS: float = 24.0
+    PRICE_REFRESH_MIN_HOURS: float = 2.0
+    PRICE_REFRESH_EVENT_WINDOW_DAYS: int = 14  # событие ближе - обновляем чаще
+    PRICE_REFRESH_RETRY_HOURS: float = 6.0  # после временной ошибки парсинга
+
+    # Уведомления о снижении цены
+    PRICE_ALERT_ENABLED: bool = True
+    PRICE_ALERT_MIN_DROP_PERCENT: float = 5.0  # меньшее снижение не уведомляем
+    PRICE_ALERT_MAX_ITEMS: int = 10  # товаров в одном сообщении, остальные - "и ещё N"
+    PRICE_ALERT_TELEGRAM_RATE: float = 25.0  # сообщений в секунду (лимит Telegram - 30)
+    PRICE_ALERT_EMAIL_RATE: float = 5.0  # писем в секунду
+    PRICE_ALERT_EMAIL_BATCH: int = 50  # писем на одно SMTP соединение
+
+    # История цен
+    PRICE_HISTORY_MIN_DAYS: int = 30  # окно "минимальной цены" для бейджей
+    PRICE_HISTORY_RAW_DAYS: int = 90  # старше - одна точка в день
+    PRICE_HISTORY_COMPACT_HOURS: float = 24.0  # как часто прореживать
+
+    # Single-flight: один парсинг на товар для всех одновременных запросов
+    PARSER_SINGLEFLIGHT_LOCK_TTL_MS: int = 15000  # lock в Redis (больше таймаута парсинга)
+    PARSER_SINGLEFLIGHT_WAIT_TIMEOUT: float = 12.0  # ожидание результата другого воркера
+
+    # Пакетный парсинг (импорт списка ссылок)
+    PARSER_BATCH_MAX_URLS: int = 50
+    PARSER_BATCH_CONCURRENCY: int = 16  # одновременных парсингов на процесс
+    PARSER_BATCH_PER_MARKETPLACE: int = 4  # одновременных запросов к одному маркетплейсу
+
+    # Wildberries: карточки за окно собираются в один запрос card.wb.ru (nm=1;2;3)
+    PARSER_WB_BATCH_WINDOW: float = 0.02  # секунд, 0 - без батчинга
+    PARSER_WB_BATCH_MAX_SIZE: int = 50  # артикулов в одном запросе
+
+    # Wildberries: таблица корзин изображений [[последний vol, "номер"], ...]
+    PARSER_WB_BASKETS: list = []  # пусто - встроенная таблица
+    PARSER_WB_BASKET_PROBE: bool = True  # искать корзину для vol за пределами таблицы
+    PARSER_WB_BASKET_PROBE_RANGE: int = 8  # сколько следующих корзин проверять
+    PARSER_WB_BASKET_PROBE_TIMEOUT: float = 2.0
+    PARSER_WB_BASKETS_RELOAD_INTERVAL: float = 600.0  # секунд между перечитыванием таблицы из Redis
+    PARSER_WB_BASKET_REFRESH_TTL: int = 300  # секунд не спрашивать Redis повторно о том же vol
+
+    # Телеметрия парсеров (GET /admin/parser-stats)
+    PARSER_TELEMETRY_WINDOW: int = 300  # секунд, окно для текущей частоты и доли успехов
+
     # Админка
     ADMIN_EMAIL: str = "admin@wishlist.app"
     ADMIN_PASSWORD: str = "admin"  # ОБЯЗАТЕЛЬНО ИЗМЕНИТЬ!
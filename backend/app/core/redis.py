@@ -0,0 +1,51 @@
+"""
+Подключение к Redis
+
+Redis используется как общий между воркерами кэш и координатор.
+Если Redis недоступен, клиент помечается "упавшим" на REDIS_RETRY_INTERVAL
+секунд, и вызывающий код работает без него (только локальные структуры).
+"""
+import time
+
+from redis.asyncio import Redis
+
+from app.config import settings
+
+
+class RedisClient:
+    """Ленивый async клиент Redis с отключением при ошибках соединения"""
+
+    def __init__(self):
+        self._client: Redis | None = None
+        self._down_until = 0.0
+
+    @property
+    def available(self) -> bool:
+        """Можно ли сейчас обращаться к Redis"""
+        return settings.REDIS_ENABLED and time.monotonic() >= self._down_until
+
+    def mark_down(self) -> None:
+        """Пометить Redis недоступным до следующей попытки"""
+        self._down_until = time.monotonic() + settings.REDIS_RETRY_INTERVAL
+
+    @property
+    def client(self) -> Redis:
+        """Текущий клиент (создаётся при первом обращении)"""
+        if self._client is None:
+            self._client = Redis.from_url(
+                settings.REDIS_URL,
+                decode_responses=True,
+                socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+                socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT,
+            )
+        return self._client
+
+    async def close(self) -> None:
+        """Закрытие соединений"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+# Глобальный клиент Redis
+redis_client = RedisClient()
@@ -2,6 +2,8 @@
 Вспомогательные функции
 """
 import secrets
+from html import escape
+from urllib.parse import urlsplit
 
 from slugify import slugify
 
@@ -91,3 +93,17 @@ def truncate_text(text: str, max_length: int = 100, suffix: str = "...") -> str:
         return text
 
     return text[:max_length - len(suffix)] + suffix
+
+
+def safe_href(url: str | None) -> str | None:
+    """
+    Ссылка для атрибута href в HTML (письма, сообщения Telegram)
+
+    Пропускаются только http(s) ссылки, кавычки и угловые скобки экранируются.
+
+    Returns:
+        Экранированная ссылка или None, если ссылку нельзя вставлять
+    """
+    if not url or urlsplit(url.strip()).scheme.lower() not in ("http", "https"):
+        return None
+    return escape(url.strip(), quote=True)
@@ -5,10 +5,19 @@ from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.staticfiles import StaticFiles
 
 from app.api.v1 import api_router
 from app.config import settings
+from app.core.redis import redis_client
+from app.services.image_proxy import image_proxy
+from app.services.parser.executor import parse_executor
+from app.services.parser.http import parser_http_client
+from app.services.parser.wb_baskets import basket_resolver
+from app.services.price_alerts import price_alerts
+from app.services.price_refresh import price_refresher
 from app.services.telegram_bot import wishlist_bot
+from app.services.uploads import upload_service
 
 
 @asynccontextmanager
@@ -17,6 +26,15 @@ async def lifespan(app: FastAPI):
     # Startup
     print("🚀 Starting Wishlist API...")
 
+    # Общий пул HTTP соединений для парсеров товаров
+    await parser_http_client.start()
+
+    # Таблица корзин Wildberries, опубликованная администратором
+    basket_resolver.start()
+
+    # Фоновое обновление цен товаров
+    price_refresher.start()
+
     # Инициализация Telegram бота
     if settings.TELEGRAM_BOT_TOKEN:
         try:
@@ -30,6 +48,15 @@ async def lifespan(app: FastAPI):
 
     # Shutdown
     print("👋 Shutting down Wishlist API...")
+    await price_refresher.stop()
+    await basket_resolver.stop()
+    await price_alerts.stop()
+    await upload_service.stop()
+    await parser_http_client.close()
+    parse_executor.shutdown()
+    await image_proxy.close()
+    image_proxy.shutdown()
+    await redis_client.close()
 
 
 # Создание приложения
@@ -52,6 +79,9 @@ app.add_middleware(
 # Подключение роутеров
 app.include_router(api_router, prefix=settings.API_V1_PREFIX)
 
+# Загруженные файлы (в проде их отдаёт nginx, сюда запросы доходят только без него)
+app.mount(settings.UPLOAD_URL_PREFIX, StaticFiles(directory=settings.UPLOAD_DIR, check_dir=False), name="uploads")
+
 
 @app.get("/")
 async def root():
@@ -3,12 +3,16 @@ SQLAlchemy модели для базы данных
 """
 from app.models.item import WishlistItem
 from app.models.oauth import OAuthAccount
+from app.models.price import PricePoint
+from app.models.product import Product
 from app.models.reservation import Reservation
 from app.models.user import User
 from app.models.wishlist import Wishlist
 
 __all__ = [
     "OAuthAccount",
+    "PricePoint",
+    "Product",
     "Reservation",
     "User",
     "Wishlist",
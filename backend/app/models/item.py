@@ -1,14 +1,17 @@
 """
 Модель элемента списка желаний (WishlistItem)
 """
+from copy import copy
 from datetime import UTC, datetime
 from enum import Enum
 
-from sqlalchemy import JSON, DateTime, ForeignKey, Integer, Numeric, String, Text
+from sqlalchemy import JSON, DateTime, ForeignKey, Index, Integer, Numeric, String, Text, func, select
 from sqlalchemy import Enum as SQLEnum
+from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.database import Base
+from app.models.product import Product
 
 
 class ItemPriority(str, Enum):
@@ -33,6 +36,43 @@ class MarketplaceType(str, Enum):
     other = "other"
 
 
+def catalog_field(name: str, cleared=""):
+    """
+    Поле элемента, которое по умолчанию берётся из каталога товаров
+
+    В колонке элемента (_name) хранится только своё значение пользователя;
+    NULL - значение товара из каталога (WishlistItem.product),
+    пустое значение ("" или []) - владелец очистил поле.
+
+    В запросах (select/where/order_by) поле - COALESCE(колонка элемента,
+    колонка товара), в update() пишется колонка элемента.
+    """
+    column = f"_{name}"
+
+    def get(item):
+        value = getattr(item, column)
+        if value is None and item.product is not None:
+            return getattr(item.product, name)
+        return value
+
+    def set_(item, value):
+        # Очистка поля у привязанного элемента: NULL вернул бы значение каталога
+        if value is None and item.product_id is not None:
+            value = copy(cleared)
+        setattr(item, column, value)
+
+    def expression(cls):
+        shared = select(getattr(Product, name)).where(Product.id == cls.product_id).scalar_subquery()
+        return func.coalesce(getattr(cls, column), shared)
+
+    def update_expression(cls, value):
+        return [(getattr(cls, column), value)]
+
+    # По имени getter-а SQLAlchemy находит поле среди атрибутов модели
+    get.__name__ = name
+    return hybrid_property(get, set_, expr=expression, update_expr=update_expression)
+
+
 class WishlistItem(Base):
     """
     Элемент списка желаний (одно желание)
@@ -43,15 +83,31 @@ class WishlistItem(Base):
     - Абонемент в спортзал
     """
     __tablename__ = "wishlist_items"
+    __table_args__ = (
+        # Элементы списка по порядку (selectinload(Wishlist.items) с order_by position)
+        Index("ix_wishlist_items_wishlist_id_position", "wishlist_id", "position"),
+        # Очередь обновления цен: в индексе только запланированные элементы
+        Index(
+            "ix_wishlist_items_price_refresh_at",
+            "price_refresh_at",
+            postgresql_where="price_refresh_at IS NOT NULL",
+        ),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
 
     # Связь со списком желаний
     wishlist_id: Mapped[int] = mapped_column(Integer, ForeignKey("wishlists.id", ondelete="CASCADE"), nullable=False)
 
+    # Товар из общего каталога (NULL - ссылка не на маркетплейс или товар ещё не спарсен)
+    product_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("products.id", ondelete="SET NULL"), nullable=True, index=True
+    )
+
     # Основная информация
     title: Mapped[str] = mapped_column(String(500), nullable=False)
-    description: Mapped[str] = mapped_column(Text, nullable=True)
+    _description: Mapped[str] = mapped_column("description", Text, nullable=True)
+    description = catalog_field("description")
 
     # Ссылка на товар
     link: Mapped[str] = mapped_column(String(1000), nullable=True)
@@ -67,6 +123,10 @@ class WishlistItem(Base):
     price: Mapped[float] = mapped_column(Numeric(10, 2), nullable=True)
     currency: Mapped[str] = mapped_column(String(10), default="RUB", nullable=True)
 
+    # Фоновое обновление цены (см. app.services.price_refresh)
+    price_checked_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+    price_refresh_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)  # NULL - не обновлять
+
     # Приоритет и статус
     priority: Mapped[ItemPriority] = mapped_column(
         SQLEnum(ItemPriority),
@@ -80,8 +140,10 @@ class WishlistItem(Base):
     )
 
     # Изображения
-    image_url: Mapped[str] = mapped_column(String(1000), nullable=True)
-    images: Mapped[list] = mapped_column(JSON, nullable=True)  # Список URL дополнительных картинок
+    _image_url: Mapped[str] = mapped_column("image_url", String(1000), nullable=True)
+    _images: Mapped[list] = mapped_column("images", JSON, nullable=True)  # Список URL дополнительных картинок
+    image_url = catalog_field("image_url")
+    images = catalog_field("images", cleared=[])
 
     # Теги/категории (JSON массив)
     tags: Mapped[list] = mapped_column(JSON, nullable=True)
@@ -95,6 +157,8 @@ class WishlistItem(Base):
 
     # Relationships
     wishlist: Mapped["Wishlist"] = relationship("Wishlist", back_populates="items")
+    # Читается вместе с элементом (LEFT JOIN), описание и картинки - из каталога
+    product: Mapped["Product"] = relationship("Product", lazy="joined")
     reservations: Mapped[list["Reservation"]] = relationship(
         "Reservation",
         back_populates="item",
@@ -3,7 +3,7 @@
 """
 from datetime import UTC, datetime
 
-from sqlalchemy import JSON, DateTime, ForeignKey, Integer, String
+from sqlalchemy import JSON, DateTime, ForeignKey, Index, Integer, String
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.database import Base
@@ -19,17 +19,23 @@ class OAuthAccount(Base):
     - Потенциально другие провайдеры (Google, VK и т.д.)
     """
     __tablename__ = "oauth_accounts"
+    __table_args__ = (
+        # Вход через провайдера: один внешний аккаунт - одна привязка
+        Index("ix_oauth_accounts_provider_user", "provider", "provider_user_id", unique=True),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
 
     # Связь с пользователем
-    user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    user_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True
+    )
 
     # Провайдер OAuth (yandex, telegram, google и т.д.)
-    provider: Mapped[str] = mapped_column(String(50), nullable=False, index=True)
+    provider: Mapped[str] = mapped_column(String(50), nullable=False)
 
     # ID пользователя у провайдера
-    provider_user_id: Mapped[str] = mapped_column(String(255), nullable=False, index=True)
+    provider_user_id: Mapped[str] = mapped_column(String(255), nullable=False)
 
     # Access token (опционально, может храниться для API запросов)
     access_token: Mapped[str] = mapped_column(String(500), nullable=True)
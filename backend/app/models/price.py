@@ -0,0 +1,34 @@
+"""
+Модель истории цен товаров
+"""
+from datetime import datetime
+
+from sqlalchemy import DateTime, Index, Numeric, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.database import Base
+
+
+class PricePoint(Base):
+    """
+    Точка истории цены товара
+
+    История ведётся по товару, а не по элементу списка: тысячи элементов
+    с одной ссылкой делят один ряд. Ключ товара - "маркетплейс:ID"
+    (см. ProductParserService.product_key). Точка записывается только
+    при изменении цены, старые точки прореживаются до одной в день.
+    """
+    __tablename__ = "price_points"
+    __table_args__ = (
+        # Диапазоны и минимумы по товару читаются по этому индексу
+        Index("ix_price_points_product_key_recorded_at", "product_key", "recorded_at"),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+
+    product_key: Mapped[str] = mapped_column(String(255), nullable=False)
+    price: Mapped[float] = mapped_column(Numeric(10, 2), nullable=False)
+    recorded_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f"<PricePoint {self.product_key}: {self.price}>"
@@ -0,0 +1,50 @@
+"""
+Модель каталога товаров маркетплейсов
+"""
+from datetime import datetime
+
+from sqlalchemy import JSON, DateTime, Numeric, String, Text, UniqueConstraint
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.database import Base
+
+
+class Product(Base):
+    """
+    Товар маркетплейса (общий для всех пользователей)
+
+    Результат парсинга хранится один раз на товар, а не копируется в каждый
+    элемент списка: тысячи элементов с одной ссылкой ссылаются на один ряд
+    (WishlistItem.product_id). Ключ - (маркетплейс, ID товара на маркетплейсе),
+    тот же, что в ProductParserService.product_key ("маркетплейс:ID").
+    """
+    __tablename__ = "products"
+    __table_args__ = (
+        UniqueConstraint("marketplace", "external_id", name="uq_products_marketplace_external_id"),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+
+    # Ключ товара
+    marketplace: Mapped[str] = mapped_column(String(32), nullable=False)
+    external_id: Mapped[str] = mapped_column(String(100), nullable=False)
+
+    # Данные последнего парсинга
+    title: Mapped[str] = mapped_column(String(500), nullable=True)
+    description: Mapped[str] = mapped_column(Text, nullable=True)
+    price: Mapped[float] = mapped_column(Numeric(10, 2), nullable=True)
+    currency: Mapped[str] = mapped_column(String(10), nullable=True)
+    image_url: Mapped[str] = mapped_column(String(1000), nullable=True)
+    images: Mapped[list] = mapped_column(JSON, nullable=True)
+
+    # Timestamps
+    parsed_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+    @property
+    def key(self) -> str:
+        """Ключ товара "маркетплейс:ID" """
+        return f"{self.marketplace}:{self.external_id}"
+
+    def __repr__(self):
+        return f"<Product {self.key}: {self.title}>"
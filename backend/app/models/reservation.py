@@ -23,7 +23,9 @@ class Reservation(Base):
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
 
     # Связь с элементом списка
-    item_id: Mapped[int] = mapped_column(Integer, ForeignKey("wishlist_items.id", ondelete="CASCADE"), nullable=False)
+    item_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("wishlist_items.id", ondelete="CASCADE"), nullable=False, index=True
+    )
 
     # Кто забронировал (опционально - может быть незарегистрированный гость)
     user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
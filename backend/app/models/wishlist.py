@@ -32,7 +32,9 @@ class Wishlist(Base):
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
 
     # Владелец списка
-    owner_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    owner_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True
+    )
 
     # Основная информация
     title: Mapped[str] = mapped_column(String(255), nullable=False)
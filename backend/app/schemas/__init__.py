@@ -3,6 +3,7 @@ Pydantic схемы для валидации данных API
 """
 from app.schemas.auth import Token, TokenData, UserLogin, UserRegister
 from app.schemas.item import ParsedItemData, WishlistItem, WishlistItemCreate, WishlistItemUpdate
+from app.schemas.upload import UploadedImage
 from app.schemas.user import User, UserCreate, UserProfile, UserUpdate
 from app.schemas.wishlist import Wishlist, WishlistCreate, WishlistDetail, WishlistUpdate
 
@@ -22,5 +23,6 @@ __all__ = [
     "WishlistItem",
     "WishlistItemCreate",
     "WishlistItemUpdate",
-    "ParsedItemData"
+    "ParsedItemData",
+    "UploadedImage"
 ]
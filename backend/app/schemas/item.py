@@ -2,6 +2,7 @@
 Pydantic схемы для элементов списка желаний
 """
 from datetime import datetime
+from enum import Enum
 
 from pydantic import BaseModel, ConfigDict
 
@@ -56,6 +57,17 @@ class WishlistItem(WishlistItemBase):
     model_config = ConfigDict(from_attributes=True)
 
 
+class ParseErrorKind(str, Enum):
+    """Класс ошибки парсинга"""
+    not_found = "not_found"   # Товара нет на маркетплейсе (404, пустой ответ API)
+    unavailable = "unavailable"  # Маркетплейс ограничил запросы (circuit breaker, лимит частоты)
+    timeout = "timeout"       # Маркетплейс не ответил за таймаут
+    http_status = "http_status"  # Ошибочный HTTP статус (5xx и прочие)
+    blocked = "blocked"       # Маркетплейс отказал (403, 429) - антибот
+    network = "network"       # Сетевая ошибка (DNS, соединение, TLS)
+    empty = "empty"           # Страница загружена, но данных товара на ней нет
+
+
 class ParsedItemData(BaseModel):
     """Данные, распарсенные из URL товара"""
     title: str | None = None
@@ -67,6 +79,21 @@ class ParsedItemData(BaseModel):
     marketplace: MarketplaceType | None = MarketplaceType.other
     success: bool = True
     error: str | None = None
+    error_kind: ParseErrorKind | None = None
+
+
+class PricePoint(BaseModel):
+    """Точка истории цены"""
+    recorded_at: datetime
+    price: float
+
+
+class PriceHistory(BaseModel):
+    """История цены товара элемента"""
+    product_key: str | None = None
+    points: list[PricePoint] = []
+    current_price: float | None = None
+    min_price_30d: float | None = None
 
 
 class ReservationCreate(BaseModel):
@@ -0,0 +1,14 @@
+"""
+Pydantic схемы для загрузки файлов
+"""
+from pydantic import BaseModel
+
+
+class UploadedImage(BaseModel):
+    """Загруженное изображение"""
+    url: str  # Путь к файлу (отдаётся nginx как статика)
+    size: int  # Байт
+    width: int
+    height: int
+    deduplicated: bool = False  # Такой же файл уже загружали - вернули его
+    variants: dict[int, str] = {}  # Ширина -> превью WebP (создаются в фоне)
@@ -1,17 +1,23 @@
 """
 Сервис отправки email уведомлений
 """
+from email.message import EmailMessage
+from email.utils import formataddr, formatdate, make_msgid
+from html import escape
 from pathlib import Path
 
 from fastapi_mail import ConnectionConfig, FastMail, MessageSchema
+from fastapi_mail.connection import Connection
 
 from app.config import settings
+from app.core.utils import safe_href
 
 # Конфигурация email
 conf = ConnectionConfig(
     MAIL_USERNAME=settings.SMTP_USER or "",
     MAIL_PASSWORD=settings.SMTP_PASSWORD or "",
     MAIL_FROM=settings.SMTP_FROM,
+    MAIL_FROM_NAME=settings.SMTP_FROM_NAME,
     MAIL_PORT=settings.SMTP_PORT,
     MAIL_SERVER=settings.SMTP_HOST,
     MAIL_STARTTLS=settings.SMTP_TLS,
@@ -108,6 +114,98 @@ class EmailService:
 
         await fastmail.send_message(message)
 
+    @staticmethod
+    def price_drop_message(email: str, drops: list[dict], more: int = 0) -> MessageSchema:
+        """
+        Письмо о снижении цен (все товары пользователя в одном письме)
+
+        Args:
+            drops: Товары - словари с ключами title, link, old_price, new_price
+            more: Сколько ещё товаров подешевело, но не вошло в письмо
+        """
+        rows = "".join(
+            f"""<li>{EmailService._drop_title(drop)}: """
+            f"""<s>{drop['old_price']:.0f} ₽</s> <strong>{drop['new_price']:.0f} ₽</strong></li>"""
+            for drop in drops
+        )
+        tail = f"<p>И ещё {more} товаров.</p>" if more else ""
+
+        html = f"""
+        <html>
+        <body style="font-family: Arial, sans-serif;">
+            <h2>Цены снизились!</h2>
+            <p>Привет!</p>
+            <p>Подешевели товары из ваших списков желаний:</p>
+            <ul>{rows}</ul>
+            {tail}
+            <p><a href="{settings.FRONTEND_URL}/wishlists">Перейти к спискам</a></p>
+            <br>
+            <p>С уважением,<br>Команда Wishlist</p>
+        </body>
+        </html>
+        """
+
+        return MessageSchema(
+            subject="Цены на товары из вашего списка снизились",
+            recipients=[email],
+            body=html,
+            subtype="html"
+        )
+
+    @staticmethod
+    def _drop_title(drop: dict) -> str:
+        """Название товара - ссылкой, если ссылка http(s) (ссылку задаёт владелец списка)"""
+        title = escape(drop['title'])
+        href = safe_href(drop.get('link'))
+        return f'<a href="{href}">{title}</a>' if href else title
+
+    @staticmethod
+    def sender() -> str:
+        """Отправитель, как в FastMail.send_message: "Имя <адрес>" """
+        if conf.MAIL_FROM_NAME:
+            return formataddr((conf.MAIL_FROM_NAME, conf.MAIL_FROM))
+        return conf.MAIL_FROM
+
+    @classmethod
+    def build_message(cls, message: MessageSchema) -> EmailMessage:
+        """MIME письмо из MessageSchema (стандартная библиотека email)"""
+        msg = EmailMessage()
+        msg["Subject"] = message.subject
+        msg["From"] = cls.sender()
+        msg["To"] = ", ".join(str(recipient) for recipient in message.recipients)
+        msg["Date"] = formatdate(localtime=True)
+        msg["Message-ID"] = make_msgid(domain=conf.MAIL_FROM.split("@")[-1])
+        msg.set_content(message.body, subtype=message.subtype.value)
+        return msg
+
+    @classmethod
+    async def send_messages(cls, messages: list[MessageSchema], before_send=None) -> int:
+        """
+        Отправка пачки писем через одно SMTP соединение
+
+        FastMail открывает соединение на каждое письмо, поэтому письма
+        собираются здесь (build_message) и отправляются через общее соединение.
+
+        Args:
+            before_send: Корутина, вызываемая перед каждым письмом (ограничение скорости)
+
+        Returns:
+            Сколько писем отправлено
+        """
+        sent = 0
+        async with Connection(conf) as connection:
+            for message in messages:
+                if before_send is not None:
+                    await before_send()
+                try:
+                    msg = cls.build_message(message)
+                    if not conf.SUPPRESS_SEND:
+                        await connection.session.send_message(msg)
+                    sent += 1
+                except Exception as e:
+                    print(f"Ошибка отправки письма {message.recipients}: {e}")
+        return sent
+
 
 # Создаём глобальный экземпляр
 email_service = EmailService()
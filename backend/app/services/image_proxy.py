@@ -0,0 +1,401 @@
+"""
+Прокси изображений товаров
+
+Страницы списков показывают изображения маркетплейсов в полном размере
+(WB images/big, Ozon wc1000) - мобильный клиент Telegram WebApp скачивает
+мегабайты на список. Прокси отдаёт превью нужной ширины:
+
+- исходник скачивается один раз и хранится на диске по хэшу содержимого;
+- ширина округляется вверх до одной из IMAGE_PROXY_WIDTHS, превью
+  строится Pillow в пуле процессов и сохраняется рядом с исходником
+  (одинаковые картинки по разным ссылкам дают одни и те же файлы);
+- формат - AVIF, если клиент его принимает и Pillow умеет его писать,
+  иначе WebP;
+- кэш ограничен IMAGE_PROXY_CACHE_MAX_BYTES: при переполнении удаляются
+  файлы, к которым дольше всего не обращались (mtime обновляется при отдаче).
+
+Эндпоинт открыт без авторизации, поэтому источники ограничены CDN
+маркетплейсов (IMAGE_PROXY_ALLOWED_HOSTS), а запросы идут через свой клиент:
+без прокси из окружения и с соединением на проверенный IP (PinnedTransport).
+
+Раскладка в UPLOAD_DIR/image-cache:
+- urls/ab/<sha256 URL> - хэш содержимого исходника для ссылки;
+- objects/cd/<sha256 содержимого> - исходник;
+- objects/cd/<sha256 содержимого>-<ширина>.<формат> - превью.
+"""
+import asyncio
+import hashlib
+import ipaddress
+import math
+import os
+import socket
+from importlib.util import find_spec
+from io import BytesIO
+from pathlib import Path
+from urllib.parse import urljoin, urlsplit
+
+import httpx
+from PIL import Image, ImageOps
+
+from app.config import settings
+from app.services.parser.circuit import CircuitOpenError, HostUnavailableError
+from app.services.parser.executor import ParseExecutor, ParseQueueFullError
+from app.services.parser.http import DEFAULT_HEADERS, GuardedTransport
+from app.services.parser.telemetry import current_marketplace
+
+# AVIF пишет Pillow 11.2+ или плагин pillow-avif-plugin (если установлен)
+if find_spec("pillow_avif") is not None:
+    import pillow_avif  # noqa: F401
+
+Image.init()
+AVIF_SUPPORTED = "AVIF" in Image.SAVE
+
+MEDIA_TYPES = {"avif": "image/avif", "webp": "image/webp"}
+
+# Сколько редиректов источника проходить (каждый адрес проверяется заново)
+MAX_REDIRECTS = 3
+
+
+class ImageProxyError(Exception):
+    """
+    Изображение нельзя отдать (status_code - HTTP статус ответа,
+    retry_after - через сколько секунд повторить, если ошибка временная)
+    """
+
+    def __init__(self, status_code: int, message: str, retry_after: int | None = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+def render_variant(source: bytes, width: int, fmt: str, quality: int, max_pixels: int) -> bytes:
+    """
+    Превью шириной не больше width (выполняется в пуле процессов)
+
+    Raises:
+        ValueError: Изображение слишком большое
+        PIL.UnidentifiedImageError: Не изображение
+    """
+    with Image.open(BytesIO(source)) as original:
+        if original.width * original.height > max_pixels:
+            raise ValueError("Изображение слишком большое")
+        # JPEG декодируется сразу в уменьшенном масштабе
+        original.draft("RGB", (width, max(original.height * width // original.width, 1)))
+        image = ImageOps.exif_transpose(original)
+
+        if image.width > width:
+            height = max(round(image.height * width / image.width), 1)
+            image = image.resize((width, height), Image.Resampling.LANCZOS)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if image.has_transparency_data else "RGB")
+
+        output = BytesIO()
+        if fmt == "webp":
+            image.save(output, format="WEBP", quality=quality, method=4)
+        else:
+            image.save(output, format="AVIF", quality=quality)
+        return output.getvalue()
+
+
+class PinnedTransport(httpx.AsyncBaseTransport):
+    """
+    Транспорт, соединяющийся с проверенным адресом
+
+    Хост ссылки резолвится и проверяется перед каждым запросом (в том числе
+    после редиректа), а соединение открывается с полученным IP - Host и SNI
+    остаются исходными. Повторный DNS ответ (DNS rebinding) не может подменить
+    адрес между проверкой и соединением.
+    """
+
+    def __init__(self, resolve, transport: httpx.AsyncBaseTransport | None = None):
+        self.resolve = resolve
+        self.transport = transport or httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        host = request.url.host
+        address = await self.resolve(host)
+        request.extensions["sni_hostname"] = host
+        request.url = request.url.copy_with(host=str(address))
+        return await self.transport.handle_async_request(request)
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+
+class ImageProxyService:
+    """Скачивание исходников, ресайз и дисковый кэш превью"""
+
+    def __init__(self, executor: ParseExecutor | None = None, transport: httpx.AsyncBaseTransport | None = None):
+        self.transport = transport
+        self._client: httpx.AsyncClient | None = None
+        self.executor = executor or ParseExecutor(
+            kind="process",
+            workers=settings.IMAGE_PROXY_WORKERS,
+            max_queue=settings.IMAGE_PROXY_MAX_QUEUE,
+            phase=None,
+        )
+        # Одновременные запросы одного превью строят его один раз
+        self._inflight: dict[Path, asyncio.Task] = {}
+        # Занятое место на диске (считается при первом обращении)
+        self._cache_bytes: int | None = None
+        self.stats = {
+            "hits": 0,
+            "source_fetches": 0,
+            "renders": 0,
+            "evicted": 0,
+        }
+
+    @property
+    def cache_dir(self) -> Path:
+        return Path(settings.UPLOAD_DIR) / "image-cache"
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """
+        Клиент для исходников (создаётся лениво)
+
+        trust_env=False: HTTP прокси из окружения соединялся бы с адресом сам,
+        в обход проверки. Лимиты хостов и телеметрия - как у парсеров.
+        """
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                transport=GuardedTransport(PinnedTransport(self._resolve, self.transport)),
+                timeout=httpx.Timeout(settings.PARSER_HTTP_READ_TIMEOUT, connect=settings.PARSER_HTTP_CONNECT_TIMEOUT),
+                headers=DEFAULT_HEADERS,
+                trust_env=False,
+            )
+        return self._client
+
+    async def close(self) -> None:
+        """Закрытие клиента (при завершении приложения)"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    @staticmethod
+    def snap_width(width: int) -> int:
+        """Ширина из IMAGE_PROXY_WIDTHS: ближайшая не меньше запрошенной"""
+        widths = sorted(settings.IMAGE_PROXY_WIDTHS)
+        return next((allowed for allowed in widths if allowed >= width), widths[-1])
+
+    @staticmethod
+    def choose_format(accept: str) -> str:
+        """AVIF, если клиент принимает и он доступен, иначе WebP"""
+        return "avif" if AVIF_SUPPORTED and "image/avif" in accept else "webp"
+
+    async def get(self, url: str, width: int, accept: str = "") -> tuple[Path, str]:
+        """
+        Превью изображения
+
+        Args:
+            url: Ссылка на исходное изображение
+            width: Желаемая ширина
+            accept: Заголовок Accept клиента (для выбора формата)
+
+        Returns:
+            (путь к файлу превью, media type)
+
+        Raises:
+            ImageProxyError: Ссылка недопустима, источник недоступен или не изображение
+        """
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https"):
+            raise ImageProxyError(400, "Некорректная ссылка на изображение")
+        if not self.is_allowed_host(parts.hostname or ""):
+            raise ImageProxyError(400, "Недопустимый адрес изображения")
+
+        width = self.snap_width(width)
+        fmt = self.choose_format(accept)
+
+        digest = self._read_url_record(url)
+        if digest is not None:
+            path = self._variant_path(digest, width, fmt)
+            if self._touch(path):
+                self.stats["hits"] += 1
+                return path, MEDIA_TYPES[fmt]
+
+        key = self._url_record_path(url).with_suffix(f".{width}.{fmt}")
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._build(url, width, fmt))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task), MEDIA_TYPES[fmt]
+
+    async def _build(self, url: str, width: int, fmt: str) -> Path:
+        """Исходник (с диска или из сети) -> превью на диске"""
+        digest = self._read_url_record(url)
+        source_path = self._object_path(digest) if digest else None
+        source = await asyncio.to_thread(source_path.read_bytes) if source_path and source_path.exists() else None
+
+        if source is None:
+            source = await self._fetch(url)
+            digest = hashlib.sha256(source).hexdigest()
+            source_path = self._object_path(digest)
+            await asyncio.to_thread(self._write, source_path, source)
+            self._write(self._url_record_path(url), digest.encode())
+            self._account(len(source))
+
+        path = self._variant_path(digest, width, fmt)
+        if self._touch(path):
+            return path
+
+        try:
+            variant = await self.executor.run(
+                render_variant, source, width, fmt, settings.IMAGE_PROXY_QUALITY, settings.IMAGE_PROXY_MAX_PIXELS
+            )
+        except ParseQueueFullError as e:
+            raise ImageProxyError(503, str(e)) from e
+        except Exception as e:
+            raise ImageProxyError(415, "Не удалось обработать изображение") from e
+        self.stats["renders"] += 1
+
+        await asyncio.to_thread(self._write, path, variant)
+        self._account(len(variant))
+        await self._evict_if_needed()
+        return path
+
+    async def _fetch(self, url: str) -> bytes:
+        """Скачивание исходника с проверкой адреса, типа и размера"""
+        max_bytes = settings.IMAGE_PROXY_MAX_SOURCE_BYTES
+        # Запросы прокси не смешиваются в телеметрии с парсингом сайтов
+        current_marketplace.set("image_proxy")
+        for _ in range(MAX_REDIRECTS + 1):
+            try:
+                # Адрес проверяется в PinnedTransport - и для каждого редиректа
+                async with self.client.stream("GET", url, follow_redirects=False) as response:
+                    if response.is_redirect:
+                        url = urljoin(url, response.headers["location"])
+                        continue
+                    if response.status_code != 200:
+                        raise ImageProxyError(502, f"Источник ответил {response.status_code}")
+                    if not response.headers.get("content-type", "").startswith("image/"):
+                        raise ImageProxyError(415, "По ссылке не изображение")
+
+                    data = bytearray()
+                    async for chunk in response.aiter_bytes():
+                        data += chunk
+                        if len(data) > max_bytes:
+                            raise ImageProxyError(413, "Изображение слишком большое")
+            except httpx.HTTPError as e:
+                raise ImageProxyError(502, "Источник изображения недоступен") from e
+            except HostUnavailableError as e:
+                # Цепь хоста открыта или лимит запросов исчерпан - источник не запрашивался
+                retry_after = (
+                    settings.PARSER_CIRCUIT_OPEN_SECONDS if isinstance(e, CircuitOpenError)
+                    else settings.PARSER_RATE_MAX_WAIT
+                )
+                raise ImageProxyError(503, "Источник изображения временно недоступен", math.ceil(retry_after)) from e
+            self.stats["source_fetches"] += 1
+            return bytes(data)
+        raise ImageProxyError(502, "Слишком много перенаправлений")
+
+    @staticmethod
+    def is_allowed_host(host: str) -> bool:
+        """Хост - CDN маркетплейса из IMAGE_PROXY_ALLOWED_HOSTS (или его поддомен)"""
+        host = host.lower().rstrip(".")
+        return any(host == allowed or host.endswith(f".{allowed}") for allowed in settings.IMAGE_PROXY_ALLOWED_HOSTS)
+
+    async def _resolve(self, host: str) -> ipaddress.IPv4Address | ipaddress.IPv6Address:
+        """
+        Адрес для соединения с источником
+
+        Raises:
+            ImageProxyError: Хост не из списка разрешённых или адрес не публичный
+        """
+        if not self.is_allowed_host(host):
+            raise ImageProxyError(400, "Недопустимый адрес изображения")
+        try:
+            infos = await self._lookup(host)
+        except OSError as e:
+            raise ImageProxyError(502, "Источник изображения недоступен") from e
+        addresses = [ipaddress.ip_address(info) for info in infos]
+
+        # Запрет запросов во внутреннюю сеть: все адреса хоста должны быть публичными
+        if not addresses or not all(address.is_global for address in addresses):
+            raise ImageProxyError(400, "Недопустимый адрес изображения")
+        return addresses[0]
+
+    @staticmethod
+    async def _lookup(host: str) -> list[str]:
+        """IP адреса хоста (DNS)"""
+        infos = await asyncio.get_running_loop().getaddrinfo(host, None, type=socket.SOCK_STREAM)
+        return [info[4][0] for info in infos]
+
+    def _url_record_path(self, url: str) -> Path:
+        name = hashlib.sha256(url.encode()).hexdigest()
+        return self.cache_dir / "urls" / name[:2] / name
+
+    def _object_path(self, digest: str) -> Path:
+        return self.cache_dir / "objects" / digest[:2] / digest
+
+    def _variant_path(self, digest: str, width: int, fmt: str) -> Path:
+        return self._object_path(digest).with_name(f"{digest}-{width}.{fmt}")
+
+    def _read_url_record(self, url: str) -> str | None:
+        try:
+            return self._url_record_path(url).read_text() or None
+        except FileNotFoundError:
+            return None
+
+    def _touch(self, path: Path) -> bool:
+        """Отметить обращение к файлу (для LRU); False - файла нет"""
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def _write(self, path: Path, data: bytes) -> None:
+        """Атомарная запись (читатели не видят недописанный файл)"""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+
+    def _account(self, size: int) -> None:
+        if self._cache_bytes is not None:
+            self._cache_bytes += size
+
+    async def _evict_if_needed(self) -> None:
+        if self._cache_bytes is None:
+            self._cache_bytes = await asyncio.to_thread(self._disk_usage)
+        if self._cache_bytes > settings.IMAGE_PROXY_CACHE_MAX_BYTES:
+            await asyncio.to_thread(self.evict)
+
+    def _disk_usage(self) -> int:
+        objects = self.cache_dir / "objects"
+        return sum(path.stat().st_size for path in objects.rglob("*") if path.is_file()) if objects.exists() else 0
+
+    def evict(self) -> None:
+        """
+        Удаление давно не запрошенных файлов до 90% IMAGE_PROXY_CACHE_MAX_BYTES
+
+        Размер пересчитывается по диску: другие воркеры пишут в тот же кэш.
+        """
+        files = []
+        for path in (self.cache_dir / "objects").rglob("*"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            if path.is_file():
+                files.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in files)
+        target = settings.IMAGE_PROXY_CACHE_MAX_BYTES * 0.9
+        for _, size, path in sorted(files):
+            if total <= target:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            self.stats["evicted"] += 1
+        self._cache_bytes = total
+
+    def shutdown(self) -> None:
+        """Остановка пула (при завершении приложения)"""
+        self.executor.shutdown()
+
+
+# Глобальный прокси изображений
+image_proxy = ImageProxyService()
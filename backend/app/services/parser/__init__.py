@@ -1,11 +1,19 @@
 """
 Парсеры товаров из маркетплейсов
+
+Модули парсеров импортируются при первом обращении к ним
+(см. также app.services.parser.registry).
 """
+from importlib import import_module
+
 from app.services.parser.base import BaseParser
-from app.services.parser.opengraph import OpenGraphParser
-from app.services.parser.ozon import OzonParser
-from app.services.parser.wildberries import WildberriesParser
-from app.services.parser.yandex_market import YandexMarketParser
+
+_LAZY_PARSERS = {
+    "WildberriesParser": "app.services.parser.wildberries",
+    "OzonParser": "app.services.parser.ozon",
+    "YandexMarketParser": "app.services.parser.yandex_market",
+    "OpenGraphParser": "app.services.parser.opengraph",
+}
 
 __all__ = [
     "BaseParser",
@@ -14,3 +22,10 @@ __all__ = [
     "YandexMarketParser",
     "OpenGraphParser"
 ]
+
+
+def __getattr__(name: str):
+    module = _LAZY_PARSERS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(import_module(module), name)
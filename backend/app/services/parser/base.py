@@ -4,12 +4,55 @@
 Каждый парсер должен наследоваться от BaseParser и реализовать:
 - can_parse(url) - проверка, может ли парсер обработать эту ссылку
 - parse(url) - непосредственно парсинг данных
+
+Опционально:
+- get_product_id(url) - канонический ID товара (для кэша)
 """
+import codecs
+import re
 from abc import ABC, abstractmethod
+from collections.abc import Callable
+from urllib.parse import urlsplit
 
 import httpx
 
-from app.schemas.item import ParsedItemData
+from app.config import settings
+from app.models.item import MarketplaceType
+from app.schemas.item import ParsedItemData, ParseErrorKind
+from app.services.parser.http import parser_http_client
+from app.services.parser.images import image_prober
+from app.services.parser.metadata import MetadataScanner, PageMetadata
+from app.services.parser.revalidation import NotModifiedError, current_revalidation
+
+# <meta charset="..."> или http-equiv с charset в начале документа
+META_CHARSET_RE = re.compile(rb'<meta[^>]+charset=["\']?([\w-]+)', re.I)
+
+
+def url_host(url: str) -> str:
+    """Хост ссылки в нижнем регистре, без www. и точки на конце"""
+    try:
+        host = urlsplit(url).hostname or ""
+    except ValueError:
+        return ""
+    host = host.rstrip(".")
+    return host[4:] if host.startswith("www.") else host
+
+
+class ProductNotFoundError(Exception):
+    """Страница товара не существует (HTTP 404/410)"""
+
+
+def classify_error(e: Exception) -> ParseErrorKind | None:
+    """Класс ошибки загрузки (None - прочие ошибки, например разбора)"""
+    if isinstance(e, httpx.TimeoutException):
+        return ParseErrorKind.timeout
+    if isinstance(e, httpx.HTTPStatusError):
+        if e.response.status_code in (403, 429):
+            return ParseErrorKind.blocked
+        return ParseErrorKind.http_status
+    if isinstance(e, httpx.TransportError):
+        return ParseErrorKind.network
+    return None
 
 
 class BaseParser(ABC):
@@ -20,8 +63,15 @@ class BaseParser(ABC):
     должен наследоваться от этого класса.
     """
 
+    # Маркетплейс, который обслуживает парсер
+    marketplace: MarketplaceType = MarketplaceType.other
+
+    # Домены маркетплейса (поддомены подходят тоже), см. ParserRegistry
+    domains: tuple[str, ...] = ()
+
     def __init__(self):
-        self.timeout = 10  # Таймаут для HTTP запросов
+        # Общий HTTP клиент с пулом соединений (см. app.services.parser.http)
+        self.http = parser_http_client
 
     @abstractmethod
     def can_parse(self, url: str) -> bool:
@@ -49,29 +99,196 @@ class BaseParser(ABC):
         """
         pass
 
-    async def fetch_html(self, url: str) -> str | None:
+    def matches_host(self, url: str) -> bool:
+        """Хост ссылки - один из domains или их поддомен"""
+        host = url_host(url)
+        return any(host == domain or host.endswith("." + domain) for domain in self.domains)
+
+    def get_product_id(self, url: str) -> str | None:
+        """
+        Канонический ID товара на маркетплейсе (артикул, product id)
+
+        Используется как ключ кэша вместо исходного URL.
+
+        Args:
+            url: URL товара
+
+        Returns:
+            ID товара или None, если парсер не умеет его извлекать
+        """
+        return None
+
+    def not_found_result(self, error: str = "Товар не найден") -> ParsedItemData:
+        """Результат "товар не найден" (попадает в негативный кэш)"""
+        return ParsedItemData(
+            success=False,
+            error=error,
+            error_kind=ParseErrorKind.not_found
+        )
+
+    def image_variants(self, url: str) -> list[str]:
+        """
+        Варианты ссылки на изображение по убыванию предпочтения
+
+        Переопределяется парсерами, которые подставляют размер в ссылку:
+        если такого размера нет, берётся следующий вариант.
+        """
+        return [url]
+
+    async def verify_images(self, images: list[str]) -> list[str]:
         """
-        Загрузка HTML страницы
+        Живые варианты изображений (см. app.services.parser.images)
+
+        Непроверенные ссылки удлиняют parse() не больше чем на
+        PARSER_IMAGE_PROBE_TIMEOUT.
+
+        Args:
+            images: Ссылки в порядке галереи
+
+        Returns:
+            Ссылки без мёртвых изображений
+        """
+        if not settings.PARSER_IMAGE_PROBE or not images:
+            return images
+        return await image_prober.select([self.image_variants(url) for url in images])
+
+    def error_result(self, e: Exception) -> ParsedItemData:
+        """Результат для ошибки парсинга с её классом (см. classify_error)"""
+        return ParsedItemData(
+            success=False,
+            error=f"Ошибка парсинга: {e}",
+            error_kind=classify_error(e)
+        )
+
+    async def fetch_html(
+        self,
+        url: str,
+        enough: Callable[[PageMetadata], bool] | None = None,
+        gallery: Callable[[PageMetadata], bool] | None = None
+    ) -> str:
+        """
+        Потоковая загрузка HTML страницы
+
+        Тело читается порциями и декодируется по мере чтения. Чтение
+        прекращается, когда достигнут лимит PARSER_FETCH_MAX_BYTES или когда
+        пришёл </head> и enough() подтвердил, что метаданных достаточно.
+        С gallery() после такого </head> дочитывается начало <body> - до
+        галереи или не больше PARSER_FETCH_GALLERY_MAX_BYTES.
+
+        При повторном парсинге (см. revalidation) запрос условный: на 304
+        или неизменившееся содержимое разбор не нужен.
 
         Args:
             url: URL страницы
+            enough: Проверка метаданных <head> (см. MetadataScanner)
+            gallery: Проверка, что галерея из <body> уже прочитана
 
         Returns:
-            HTML код страницы или None при ошибке
+            HTML код страницы (возможно, только начало)
+
+        Raises:
+            ProductNotFoundError: Если страница не существует (404/410)
+            httpx.HTTPError: Если страница не загрузилась (таймаут, статус, сеть)
+            HostUnavailableError: Если запросы к сайту сейчас не выполняются
+            NotModifiedError: Если страница не изменилась с прошлого парсинга
         """
+        if not settings.PARSER_FETCH_STOP_AT_HEAD:
+            enough = gallery = None
+        revalidation = current_revalidation.get()
+        headers = revalidation.request_headers() if revalidation else None
+
         try:
-            async with httpx.AsyncClient(timeout=self.timeout, follow_redirects=True) as client:
-                headers = {
-                    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-                }
-                response = await client.get(url, headers=headers)
+            async with self.http.client.stream("GET", url, headers=headers) as response:
+                if response.status_code in (404, 410):
+                    raise ProductNotFoundError(url)
+                if response.status_code == 304 and revalidation and revalidation.previous:
+                    revalidation.on_not_modified(response)
+                    raise NotModifiedError(url)
                 response.raise_for_status()
-                return response.text
-        except Exception as e:
+                html = await self._read_html(response, enough, gallery)
+
+            if revalidation:
+                revalidation.on_response(response, html)
+                if revalidation.not_modified:
+                    raise NotModifiedError(url)
+            return html
+        except httpx.HTTPError as e:
             print(f"Ошибка при загрузке {url}: {e}")
-            return None
+            raise
+
+    async def _read_html(
+        self,
+        response: httpx.Response,
+        enough: Callable[[PageMetadata], bool] | None,
+        gallery: Callable[[PageMetadata], bool] | None = None
+    ) -> str:
+        """Чтение тела ответа с лимитом и ранней остановкой"""
+        max_bytes = settings.PARSER_FETCH_MAX_BYTES
+        decoder = None
+        parts: list[str] = []
+        read = 0
+        gallery_until = None
+        stop_reason = None
+        scanner = MetadataScanner(enough, gallery) if enough is not None else None
+
+        async for chunk in response.aiter_bytes():
+            if decoder is None:
+                decoder = codecs.getincrementaldecoder(self._detect_encoding(response, chunk))(errors="replace")
+
+            if read + len(chunk) > max_bytes:
+                chunk = chunk[:max_bytes - read]
+                stop_reason = "truncated"
+
+            read += len(chunk)
+            parts.append(decoder.decode(chunk))
+            if stop_reason:
+                break
 
-    def extract_price(self, text: str) -> float | None:
+            if scanner is not None:
+                # Каждая порция подаётся в потоковый сканер один раз - накопленное не перечитывается
+                if scanner.feed(parts[-1]):
+                    stop_reason = "stopped_early"
+                    break
+                if scanner.scanning_body:
+                    # Галерея ищется только в начале <body> (лимит считается от
+                    # порции с </head>): дальше - похожие товары и прочее,
+                    # что парсеру не нужно
+                    if gallery_until is None:
+                        gallery_until = read - len(chunk) + settings.PARSER_FETCH_GALLERY_MAX_BYTES
+                    if read >= gallery_until:
+                        stop_reason = "stopped_early"
+                        break
+                elif scanner.head_closed:
+                    # В <head> данных не хватило - дочитываем документ без сканера
+                    # (полный разбор - в пуле parse_executor)
+                    scanner = None
+
+        if decoder is not None:
+            parts.append(decoder.decode(b"", final=True))
+
+        self.http.record_read(response, stop_reason)
+        return "".join(parts)
+
+    @staticmethod
+    def _detect_encoding(response: httpx.Response, first_chunk: bytes) -> str:
+        """Кодировка из Content-Type, затем из <meta charset>, иначе utf-8"""
+        candidates = [response.charset_encoding]
+        match = META_CHARSET_RE.search(first_chunk[:4096])
+        if match:
+            candidates.append(match.group(1).decode("ascii", "ignore"))
+
+        for encoding in candidates:
+            if not encoding:
+                continue
+            try:
+                codecs.lookup(encoding)
+                return encoding
+            except LookupError:
+                continue
+        return "utf-8"
+
+    @staticmethod
+    def extract_price(text: str) -> float | None:
         """
         Извлечение цены из текста
 
@@ -81,8 +298,6 @@ class BaseParser(ABC):
         Returns:
             Цена в виде числа или None
         """
-        import re
-
         # Удаляем все кроме цифр и точки/запятой
         cleaned = re.sub(r'[^\d.,]', '', text)
 
@@ -0,0 +1,91 @@
+"""
+Микро-батчинг запросов к API маркетплейсов
+
+Запросы, пришедшие в течение короткого окна, собираются в один пакетный
+вызов API (например, card.wb.ru принимает несколько артикулов через ";"),
+а ответ раскладывается обратно ожидающим вызывающим.
+"""
+import asyncio
+from collections.abc import Awaitable, Callable
+
+# Загрузка пакета: ключи -> {ключ: результат}; отсутствующие ключи = None
+BatchFetch = Callable[[list[str]], Awaitable[dict[str, dict]]]
+
+
+class MicroBatcher:
+    """
+    Собирает одиночные запросы по ключу в пакеты
+
+    Пакет отправляется, когда истекло окно window секунд с первого запроса
+    или набралось max_size разных ключей - что наступит раньше.
+    """
+
+    def __init__(self, fetch: BatchFetch, window: float, max_size: int):
+        self._fetch = fetch
+        self.window = window
+        self.max_size = max_size
+        self._pending: dict[str, list[asyncio.Future]] = {}
+        self._timer: asyncio.TimerHandle | None = None
+        # Ссылки на запущенные пакеты, чтобы их не собрал GC
+        self._flushing: set[asyncio.Task] = set()
+        self.stats = {"requests": 0, "batches": 0}
+
+    async def get(self, key: str) -> dict | None:
+        """
+        Результат для одного ключа (в составе ближайшего пакета)
+
+        Raises:
+            Exception: Ошибка загрузки пакета пробрасывается всем его участникам
+        """
+        self.stats["requests"] += 1
+        if self.window <= 0:
+            self.stats["batches"] += 1
+            return (await self._fetch([key])).get(key)
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.setdefault(key, []).append(future)
+
+        if len(self._pending) >= self.max_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+
+        return await future
+
+    def _flush(self) -> None:
+        """Отправка накопленного пакета"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch, self._pending = self._pending, {}
+        if not batch:
+            return
+
+        task = asyncio.create_task(self._run(batch))
+        self._flushing.add(task)
+        task.add_done_callback(self._flushing.discard)
+
+    async def _run(self, batch: dict[str, list[asyncio.Future]]) -> None:
+        self.stats["batches"] += 1
+        try:
+            try:
+                results = await self._fetch(list(batch))
+            except Exception as e:
+                for futures in batch.values():
+                    for future in futures:
+                        if not future.done():
+                            future.set_exception(e)
+                return
+
+            for key, futures in batch.items():
+                for future in futures:
+                    # Вызывающий мог отмениться, пока пакет загружался
+                    if not future.done():
+                        future.set_result(results.get(key))
+        finally:
+            # Пакет отменён (остановка приложения) - ожидающие не должны зависнуть
+            for futures in batch.values():
+                for future in futures:
+                    future.cancel()
@@ -0,0 +1,228 @@
+"""
+Кэш результатов парсинга
+
+Два уровня:
+- in-process LRU (самые популярные товары отдаются без сети вообще)
+- Redis (общий для всех воркеров uvicorn)
+
+Ключом служит каноническая идентичность товара (маркетплейс + артикул/ID),
+а не исходный URL: разные ссылки на один товар попадают в одну запись.
+
+Успешные результаты хранятся ещё PARSER_CACHE_STALE_TTL секунд после
+истечения TTL: get() их уже не отдаёт, а get_stale() отдаёт как запасной
+ответ, пока маркетплейс отвечает медленно (см. hedging в ProductParserService).
+"""
+import json
+import time
+from collections import OrderedDict
+
+from redis.exceptions import RedisError
+
+from app.config import settings
+from app.core.redis import redis_client
+from app.schemas.item import ParsedItemData, ParseErrorKind
+from app.services.parser.revalidation import Validators
+
+# Префикс ключей в Redis (версия меняется при смене формата записи)
+# v2: TTL ключа успешного результата включает PARSER_CACHE_STALE_TTL
+REDIS_KEY_PREFIX = "parse:v2:"
+
+# Валидаторы ответа (ETag, Last-Modified, хэш) для условной перезагрузки
+REDIS_VALIDATORS_PREFIX = "parse:validators:v1:"
+
+
+class ParseResultCache:
+    """
+    Двухуровневый кэш ParsedItemData
+
+    Кэшируются успешные результаты и "товар не найден" (негативный кэш).
+    Временные ошибки (таймаут, 5xx) не кэшируются.
+    """
+
+    def __init__(self, max_size: int | None = None):
+        self.max_size = max_size or settings.PARSER_CACHE_LRU_SIZE
+        # key -> (fresh_until, stale_until, result, validators)
+        self._lru: OrderedDict[str, tuple[float, float, ParsedItemData, Validators | None]] = OrderedDict()
+        self.stats = {
+            "lru_hits": 0,
+            "redis_hits": 0,
+            "negative_hits": 0,
+            "stale_hits": 0,
+            "misses": 0,
+        }
+
+    def is_cacheable(self, result: ParsedItemData) -> bool:
+        """Можно ли класть результат в кэш"""
+        return result.success or result.error_kind == ParseErrorKind.not_found
+
+    def ttl_for(self, marketplace: str, result: ParsedItemData) -> int:
+        """TTL записи в секундах"""
+        if not result.success:
+            return settings.PARSER_CACHE_NEGATIVE_TTL
+        return settings.PARSER_CACHE_TTL.get(marketplace, settings.PARSER_CACHE_TTL["other"])
+
+    def stale_ttl_for(self, result: ParsedItemData) -> int:
+        """Сколько хранить запись после истечения TTL (только успешные)"""
+        return settings.PARSER_CACHE_STALE_TTL if result.success else 0
+
+    async def get(self, key: str) -> ParsedItemData | None:
+        """Поиск свежего результата сначала в LRU, затем в Redis"""
+        result = self._get_local(key)
+        if result is not None:
+            self.stats["lru_hits"] += 1
+        else:
+            result, fresh = await self._get_redis(key)
+            if not fresh:
+                result = None
+            if result is not None:
+                self.stats["redis_hits"] += 1
+
+        if result is None:
+            self.stats["misses"] += 1
+            return None
+
+        if not result.success:
+            self.stats["negative_hits"] += 1
+        return result.model_copy()
+
+    async def get_stale(self, key: str) -> ParsedItemData | None:
+        """Успешный результат с истёкшим TTL (или свежий), если он ещё хранится"""
+        entry = self._lru.get(key)
+        if entry is not None and entry[1] >= time.monotonic():
+            result = entry[2]
+        else:
+            result, _ = await self._get_redis(key)
+
+        if result is None or not result.success:
+            return None
+        self.stats["stale_hits"] += 1
+        return result.model_copy()
+
+    async def get_previous(self, key: str) -> tuple[ParsedItemData | None, Validators | None]:
+        """
+        Прошлый успешный результат (в том числе устаревший) и валидаторы его ответа
+
+        Используется при повторном парсинге для условной загрузки страницы.
+        """
+        entry = self._lru.get(key)
+        if entry is not None and entry[1] >= time.monotonic() and entry[3] is not None:
+            result, validators = entry[2], entry[3]
+        elif redis_client.available:
+            try:
+                async with redis_client.client.pipeline(transaction=False) as pipe:
+                    raw, raw_validators = await pipe.get(REDIS_KEY_PREFIX + key).get(
+                        REDIS_VALIDATORS_PREFIX + key
+                    ).execute()
+            except (RedisError, OSError):
+                redis_client.mark_down()
+                return None, None
+            if raw is None or raw_validators is None:
+                return None, None
+            result = ParsedItemData.model_validate_json(raw)
+            validators = Validators.from_dict(json.loads(raw_validators))
+        else:
+            return None, None
+
+        if not result.success:
+            return None, None
+        return result.model_copy(), validators
+
+    async def put(
+        self,
+        key: str,
+        marketplace: str,
+        result: ParsedItemData,
+        validators: Validators | None = None
+    ) -> None:
+        """Сохранение результата (и валидаторов ответа, если есть) в оба уровня"""
+        if not self.is_cacheable(result):
+            return
+
+        ttl = self.ttl_for(marketplace, result)
+        stale_ttl = self.stale_ttl_for(result)
+        self._set_local(key, result, ttl, stale_ttl, validators)
+
+        if redis_client.available:
+            try:
+                async with redis_client.client.pipeline(transaction=False) as pipe:
+                    pipe.set(REDIS_KEY_PREFIX + key, result.model_dump_json(), ex=ttl + stale_ttl)
+                    if validators is not None:
+                        pipe.set(REDIS_VALIDATORS_PREFIX + key, json.dumps(validators.to_dict()), ex=ttl + stale_ttl)
+                    await pipe.execute()
+            except (RedisError, OSError):
+                redis_client.mark_down()
+
+    async def delete(self, key: str) -> None:
+        """Удаление записи из обоих уровней"""
+        self._lru.pop(key, None)
+        if redis_client.available:
+            try:
+                await redis_client.client.delete(REDIS_KEY_PREFIX + key, REDIS_VALIDATORS_PREFIX + key)
+            except (RedisError, OSError):
+                redis_client.mark_down()
+
+    def clear(self) -> None:
+        """Очистка локального уровня"""
+        self._lru.clear()
+
+    def _get_local(self, key: str) -> ParsedItemData | None:
+        entry = self._lru.get(key)
+        if entry is None:
+            return None
+
+        fresh_until, stale_until, result, _ = entry
+        now = time.monotonic()
+        if stale_until < now:
+            del self._lru[key]
+            return None
+        if fresh_until < now:
+            # Устаревшая запись остаётся для get_stale()
+            return None
+
+        self._lru.move_to_end(key)
+        return result
+
+    def _set_local(
+        self,
+        key: str,
+        result: ParsedItemData,
+        ttl: int,
+        stale_ttl: int = 0,
+        validators: Validators | None = None
+    ) -> None:
+        now = time.monotonic()
+        self._lru[key] = (now + ttl, now + ttl + stale_ttl, result, validators)
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_size:
+            self._lru.popitem(last=False)
+
+    async def _get_redis(self, key: str) -> tuple[ParsedItemData | None, bool]:
+        """Запись из Redis и признак того, что она свежая"""
+        if not redis_client.available:
+            return None, False
+
+        try:
+            # Значение и оставшийся TTL за один round trip
+            async with redis_client.client.pipeline(transaction=False) as pipe:
+                raw, ttl = await pipe.get(REDIS_KEY_PREFIX + key).ttl(REDIS_KEY_PREFIX + key).execute()
+        except (RedisError, OSError):
+            redis_client.mark_down()
+            return None, False
+
+        if raw is None:
+            return None, False
+
+        result = ParsedItemData.model_validate_json(raw)
+        if not ttl or ttl <= 0:
+            return result, True
+
+        # Последние stale_ttl секунд жизни ключа запись устаревшая
+        stale_ttl = self.stale_ttl_for(result)
+        fresh_ttl = max(ttl - stale_ttl, 0)
+        # Прогреваем локальный уровень на оставшееся время жизни записи
+        self._set_local(key, result, fresh_ttl, min(stale_ttl, ttl))
+        return result, fresh_ttl > 0
+
+
+# Глобальный кэш результатов парсинга
+parse_cache = ParseResultCache()
@@ -0,0 +1,304 @@
+"""
+Ограничение частоты и circuit breaker для исходящих запросов парсеров
+
+Когда маркетплейс начинает отвечать 403/429 или перестаёт отвечать, каждый
+следующий запрос только ждёт таймаут и ухудшает репутацию наших IP. HostGuard
+стоит перед каждым запросом общего HTTP клиента (см. GuardedTransport):
+
+- token bucket на хост: не больше PARSER_RATE_LIMITS[домен] запросов в секунду
+  на воркер; если ждать токен дольше PARSER_RATE_MAX_WAIT - RateLimitedError;
+- circuit breaker на хост: PARSER_CIRCUIT_FAILURES ошибок (сеть, 403, 429, 5xx)
+  за PARSER_CIRCUIT_WINDOW секунд открывают цепь на PARSER_CIRCUIT_OPEN_SECONDS,
+  запросы сразу получают CircuitOpenError. Затем цепь полуоткрыта: проходит
+  один пробный запрос, успех закрывает цепь, ошибка открывает снова.
+
+Состояние цепи (счётчик ошибок, время открытия, пробный запрос) общее для
+воркеров через Redis; без Redis каждый воркер считает сам.
+"""
+import asyncio
+import time
+from dataclasses import dataclass
+
+from redis.exceptions import RedisError
+
+from app.config import settings
+from app.core.redis import redis_client
+
+REDIS_KEY_PREFIX = "parse:circuit:"
+
+# Ответы, которые означают "нас ограничивают или сервис лежит"
+FAILURE_STATUSES = frozenset({403, 429})
+
+
+class HostUnavailableError(Exception):
+    """Хост сейчас не принимает запросы (цепь открыта или превышен лимит)"""
+
+    def __init__(self, host: str, message: str):
+        super().__init__(message)
+        self.host = host
+
+
+class CircuitOpenError(HostUnavailableError):
+    """Цепь для хоста открыта - запрос не отправлялся"""
+
+    def __init__(self, host: str):
+        super().__init__(host, f"{host} временно недоступен (circuit open)")
+
+
+class RateLimitedError(HostUnavailableError):
+    """Лимит запросов к хосту исчерпан"""
+
+    def __init__(self, host: str):
+        super().__init__(host, f"Превышен лимит запросов к {host}")
+
+
+def is_failure_status(status_code: int) -> bool:
+    """Ответ считается ошибкой для circuit breaker"""
+    return status_code in FAILURE_STATUSES or status_code >= 500
+
+
+class TokenBucket:
+    """Token bucket: rate токенов в секунду, не больше burst в запасе"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def reserve(self, max_wait: float) -> float | None:
+        """
+        Зарезервировать токен
+
+        Returns:
+            Сколько секунд подождать перед запросом или None, если дольше max_wait
+        """
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+        # Отрицательный запас - очередь уже зарезервировавших запросов
+        wait = (1 - self.tokens) / self.rate if self.tokens < 1 else 0.0
+        if wait > max_wait:
+            return None
+        self.tokens -= 1
+        return wait
+
+
+@dataclass
+class _Circuit:
+    """Локальная копия состояния цепи хоста"""
+
+    failures: list[float]
+    open_until: float = 0.0  # time.time(); 0 - цепь закрыта
+    probing: bool = False
+    synced_at: float = 0.0
+
+
+class HostGuard:
+    """
+    Лимиты и circuit breaker по хостам
+
+    Метрики (stats):
+    - rate_limited - отклонено по лимиту частоты
+    - rejected - отклонено открытой цепью
+    - opened - сколько раз цепь открывалась
+    - probes - пробных запросов в полуоткрытом состоянии
+    """
+
+    def __init__(
+        self,
+        failures: int | None = None,
+        window: float | None = None,
+        open_seconds: float | None = None,
+    ):
+        self.failure_threshold = failures or settings.PARSER_CIRCUIT_FAILURES
+        self.window = window or settings.PARSER_CIRCUIT_WINDOW
+        self.open_seconds = open_seconds or settings.PARSER_CIRCUIT_OPEN_SECONDS
+        self._buckets: dict[str, TokenBucket] = {}
+        self._circuits: dict[str, _Circuit] = {}
+        self.stats = {
+            "rate_limited": 0,
+            "rejected": 0,
+            "opened": 0,
+            "probes": 0,
+        }
+
+    async def acquire(self, host: str) -> bool:
+        """
+        Разрешение на запрос к хосту (ждёт токен, если нужно)
+
+        Returns:
+            True, если это пробный запрос полуоткрытой цепи
+
+        Raises:
+            CircuitOpenError: Цепь открыта
+            RateLimitedError: Токена не дождаться за PARSER_RATE_MAX_WAIT
+        """
+        probe = await self._check_circuit(host)
+
+        wait = self._bucket(host).reserve(settings.PARSER_RATE_MAX_WAIT)
+        if wait is None:
+            self.stats["rate_limited"] += 1
+            if probe:
+                await self._release_probe(host)
+            raise RateLimitedError(host)
+        if wait:
+            await asyncio.sleep(wait)
+        return probe
+
+    async def record(self, host: str, ok: bool | None, probe: bool = False) -> None:
+        """
+        Результат запроса
+
+        Args:
+            host: Хост
+            ok: True - успех, False - ошибка, None - без результата (отмена)
+            probe: Запрос был пробным (см. acquire)
+        """
+        circuit = self._circuit(host)
+        if probe:
+            await self._release_probe(host)
+
+        if ok is None:
+            return
+        if ok:
+            if probe or circuit.open_until:
+                await self._close(host)
+            return
+
+        if probe:
+            await self._open(host)
+            return
+
+        now = time.time()
+        circuit.failures = [t for t in circuit.failures if now - t < self.window]
+        circuit.failures.append(now)
+        failures = len(circuit.failures)
+
+        if redis_client.available:
+            key = f"{REDIS_KEY_PREFIX}failures:{host}"
+            try:
+                async with redis_client.client.pipeline(transaction=False) as pipe:
+                    pipe.incr(key)
+                    pipe.expire(key, int(self.window), nx=True)
+                    failures, _ = await pipe.execute()
+            except (RedisError, OSError):
+                redis_client.mark_down()
+
+        if failures >= self.failure_threshold:
+            await self._open(host)
+
+    async def is_open(self, host: str) -> bool:
+        """Цепь хоста открыта (полуоткрытая считается закрытой)"""
+        circuit = await self._sync(host)
+        return time.time() < circuit.open_until
+
+    def _bucket(self, host: str) -> TokenBucket:
+        bucket = self._buckets.get(host)
+        if bucket is None:
+            rate = settings.PARSER_RATE_LIMIT_DEFAULT
+            for domain, domain_rate in settings.PARSER_RATE_LIMITS.items():
+                if host == domain or host.endswith("." + domain):
+                    rate = domain_rate
+                    break
+            bucket = self._buckets[host] = TokenBucket(rate, settings.PARSER_RATE_BURST)
+        return bucket
+
+    def _circuit(self, host: str) -> _Circuit:
+        circuit = self._circuits.get(host)
+        if circuit is None:
+            circuit = self._circuits[host] = _Circuit(failures=[])
+        return circuit
+
+    async def _sync(self, host: str) -> _Circuit:
+        """Подтянуть время открытия цепи из Redis (не чаще PARSER_CIRCUIT_SYNC_INTERVAL)"""
+        circuit = self._circuit(host)
+        now = time.monotonic()
+        if not redis_client.available or now - circuit.synced_at < settings.PARSER_CIRCUIT_SYNC_INTERVAL:
+            return circuit
+
+        circuit.synced_at = now
+        try:
+            open_until = await redis_client.client.get(f"{REDIS_KEY_PREFIX}open:{host}")
+        except (RedisError, OSError):
+            redis_client.mark_down()
+            return circuit
+        # Redis - источник правды: цепь могли закрыть или открыть другие воркеры
+        circuit.open_until = float(open_until) if open_until else 0.0
+        return circuit
+
+    async def _check_circuit(self, host: str) -> bool:
+        circuit = await self._sync(host)
+        if not circuit.open_until:
+            return False
+
+        if time.time() < circuit.open_until or not await self._claim_probe(host):
+            self.stats["rejected"] += 1
+            raise CircuitOpenError(host)
+
+        self.stats["probes"] += 1
+        return True
+
+    async def _claim_probe(self, host: str) -> bool:
+        """Полуоткрытая цепь пропускает один запрос на все воркеры"""
+        circuit = self._circuit(host)
+        if circuit.probing:
+            return False
+        circuit.probing = True
+
+        if redis_client.available:
+            try:
+                claimed = await redis_client.client.set(
+                    f"{REDIS_KEY_PREFIX}probe:{host}", "1",
+                    nx=True, px=int(settings.PARSER_HTTP_READ_TIMEOUT * 2000),
+                )
+            except (RedisError, OSError):
+                redis_client.mark_down()
+                return True
+            if not claimed:
+                circuit.probing = False
+                return False
+        return True
+
+    async def _release_probe(self, host: str) -> None:
+        self._circuit(host).probing = False
+        if redis_client.available:
+            try:
+                await redis_client.client.delete(f"{REDIS_KEY_PREFIX}probe:{host}")
+            except (RedisError, OSError):
+                redis_client.mark_down()
+
+    async def _open(self, host: str) -> None:
+        circuit = self._circuit(host)
+        circuit.open_until = time.time() + self.open_seconds
+        circuit.failures.clear()
+        self.stats["opened"] += 1
+        print(f"Circuit breaker: {host} недоступен, запросы приостановлены на {self.open_seconds} с")
+
+        if redis_client.available:
+            try:
+                # Ключ живёт дольше open_until: после него цепь полуоткрыта, а не закрыта
+                await redis_client.client.set(
+                    f"{REDIS_KEY_PREFIX}open:{host}", str(circuit.open_until),
+                    ex=int(self.open_seconds * 4) + 1,
+                )
+            except (RedisError, OSError):
+                redis_client.mark_down()
+
+    async def _close(self, host: str) -> None:
+        circuit = self._circuit(host)
+        circuit.open_until = 0.0
+        circuit.failures.clear()
+
+        if redis_client.available:
+            try:
+                await redis_client.client.delete(
+                    f"{REDIS_KEY_PREFIX}open:{host}", f"{REDIS_KEY_PREFIX}failures:{host}"
+                )
+            except (RedisError, OSError):
+                redis_client.mark_down()
+
+
+# Глобальные лимиты исходящих запросов парсеров
+host_guard = HostGuard()
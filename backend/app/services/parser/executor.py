@@ -0,0 +1,131 @@
+"""
+Пул для CPU-тяжёлого разбора HTML
+
+BeautifulSoup и поиск по дереву на многомегабайтных страницах маркетплейсов
+блокируют event loop на десятки миллисекунд. Разбор выносится в пул потоков
+или процессов (Settings.PARSER_EXECUTOR), а очередь ограничена, чтобы
+всплеск запросов не копил бесконечный backlog.
+
+Для пула процессов функция и аргументы должны сериализоваться pickle:
+парсеры передают classmethod extract(html), а не методы экземпляра.
+"""
+import asyncio
+import time
+from collections.abc import Callable
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import suppress
+from typing import Any
+
+from app.config import settings
+from app.services.parser.telemetry import parser_telemetry
+
+
+class ParseQueueFullError(Exception):
+    """Очередь разбора переполнена"""
+
+
+def _timed_call(fn: Callable, args: tuple) -> tuple[Any, float, float]:
+    """Вызов в воркере пула с отметками начала и конца (time.monotonic общий для процессов)"""
+    started_at = time.monotonic()
+    result = fn(*args)
+    return result, started_at, time.monotonic()
+
+
+class ParseExecutor:
+    """
+    Пул для разбора HTML с ограничением очереди и метриками
+
+    Метрики (stats):
+    - submitted / completed / rejected - количество задач
+    - queue_seconds - суммарное ожидание свободного воркера
+    - run_seconds - суммарное время выполнения в пуле
+    - max_run_seconds - самая долгая задача
+    """
+
+    def __init__(
+        self,
+        kind: str | None = None,
+        workers: int | None = None,
+        max_queue: int | None = None,
+        phase: str | None = "parse",
+    ):
+        self.kind = kind or settings.PARSER_EXECUTOR
+        self.workers = workers or settings.PARSER_EXECUTOR_WORKERS
+        self.max_queue = max_queue or settings.PARSER_EXECUTOR_MAX_QUEUE
+        # Фаза телеметрии парсеров (None - пул не для парсинга, не учитывается)
+        self.phase = phase
+        self._pool: Executor | None = None
+        self._in_flight = 0
+        self.stats = {
+            "submitted": 0,
+            "completed": 0,
+            "rejected": 0,
+            "queue_seconds": 0.0,
+            "run_seconds": 0.0,
+            "max_run_seconds": 0.0,
+        }
+
+    @property
+    def pool(self) -> Executor:
+        """Пул (создаётся при первом обращении)"""
+        if self._pool is None:
+            if self.kind == "process":
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="parser")
+        return self._pool
+
+    @property
+    def in_flight(self) -> int:
+        """Задач в очереди и в работе"""
+        return self._in_flight
+
+    async def run(self, fn: Callable, *args: Any) -> Any:
+        """
+        Выполнить fn(*args) в пуле
+
+        Raises:
+            ParseQueueFullError: Если в очереди уже max_queue задач
+        """
+        if self._in_flight >= self.max_queue:
+            self.stats["rejected"] += 1
+            raise ParseQueueFullError("Сервис разбора страниц перегружен, попробуйте позже")
+
+        loop = asyncio.get_running_loop()
+        submitted_at = time.monotonic()
+        future = self.pool.submit(_timed_call, fn, args)
+        self._in_flight += 1
+        self.stats["submitted"] += 1
+        # Место в очереди освобождается, когда задача завершилась в пуле, а не когда
+        # вызывающий перестал ждать: отменённый запрос не отменяет уже запущенную задачу
+        future.add_done_callback(lambda _: self._release(loop))
+
+        result, started_at, finished_at = await asyncio.wrap_future(future)
+
+        run_seconds = finished_at - started_at
+        self.stats["completed"] += 1
+        self.stats["queue_seconds"] += max(started_at - submitted_at, 0.0)
+        self.stats["run_seconds"] += run_seconds
+        self.stats["max_run_seconds"] = max(self.stats["max_run_seconds"], run_seconds)
+        if self.phase:
+            parser_telemetry.observe_phase(self.phase, run_seconds)
+        return result
+
+    def _release(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Колбэк завершения задачи (вызывается из потока пула)"""
+        # RuntimeError - цикл событий уже закрыт, считать некому
+        with suppress(RuntimeError):
+            loop.call_soon_threadsafe(self._decrement)
+
+    def _decrement(self) -> None:
+        self._in_flight -= 1
+
+    def shutdown(self) -> None:
+        """Остановка пула (при завершении приложения)"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+# Глобальный пул разбора HTML
+parse_executor = ParseExecutor()
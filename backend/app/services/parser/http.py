@@ -0,0 +1,156 @@
+"""
+Общий HTTP клиент для парсеров
+
+Все парсеры используют один httpx.AsyncClient с пулом соединений,
+чтобы не делать TCP/TLS handshake к маркетплейсу на каждый запрос.
+Клиент создаётся и закрывается в lifespan приложения (app.main).
+"""
+from importlib.util import find_spec
+
+import httpx
+
+from app.config import settings
+from app.services.parser.circuit import HostGuard, host_guard, is_failure_status
+from app.services.parser.telemetry import parser_telemetry
+
+# User-Agent, с которым парсеры ходят на маркетплейсы
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+}
+
+
+class GuardedTransport(httpx.AsyncBaseTransport):
+    """
+    Транспорт, пропускающий каждый запрос через HostGuard
+
+    Лимит частоты и circuit breaker действуют на все запросы парсеров:
+    страницы, API Wildberries, пробы корзин. Фазы запроса (connect, tls,
+    ttfb, download) замеряются для телеметрии парсеров.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, guard: HostGuard | None = None):
+        self.transport = transport
+        self.guard = guard or host_guard
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        host = request.url.host
+        probe = await self.guard.acquire(host)
+        request.extensions.setdefault("trace", parser_telemetry.trace())
+
+        ok = None
+        try:
+            response = await self.transport.handle_async_request(request)
+            ok = not is_failure_status(response.status_code)
+            return response
+        except httpx.TransportError:
+            ok = False
+            raise
+        finally:
+            await self.guard.record(host, ok, probe)
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+
+class ParserHTTPClient:
+    """
+    Владелец общего httpx.AsyncClient для всех парсеров
+
+    Держит keep-alive соединения к каждому хосту, поддерживает HTTP/2
+    (если установлен пакет h2) и настраивается через Settings.PARSER_HTTP_*.
+    """
+
+    def __init__(self):
+        self._client: httpx.AsyncClient | None = None
+        # Статистика потокового чтения страниц (BaseParser.fetch_html)
+        self.stats = {
+            "responses": 0,
+            "bytes_read": 0,       # байт получено из сети
+            # Байт не скачано благодаря остановке - только по ответам с Content-Length,
+            # поэтому это нижняя оценка (без заголовка остановки считаются в saved_unknown)
+            "bytes_saved": 0,
+            "saved_unknown": 0,    # остановок, для которых размер ответа неизвестен (chunked)
+            "stopped_early": 0,    # чтение остановлено досрочно (после <head> или галереи)
+            "truncated": 0,        # чтение остановлено по лимиту PARSER_FETCH_MAX_BYTES
+        }
+
+    def _build_client(self, transport: httpx.AsyncBaseTransport | None = None) -> httpx.AsyncClient:
+        """
+        Создание клиента с настройками пула и таймаутов
+
+        Args:
+            transport: Подменный транспорт (бенчмарки) - без лимитов хостов и circuit breaker
+        """
+        limits = httpx.Limits(
+            max_connections=settings.PARSER_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.PARSER_HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=settings.PARSER_HTTP_KEEPALIVE_EXPIRY,
+        )
+        timeout = httpx.Timeout(
+            settings.PARSER_HTTP_READ_TIMEOUT,
+            connect=settings.PARSER_HTTP_CONNECT_TIMEOUT,
+            pool=settings.PARSER_HTTP_POOL_TIMEOUT,
+        )
+        # HTTP/2 требует пакет h2, без него остаёмся на HTTP/1.1
+        http2 = settings.PARSER_HTTP2 and find_spec("h2") is not None
+
+        if transport is None:
+            transport = GuardedTransport(httpx.AsyncHTTPTransport(http2=http2, limits=limits))
+
+        return httpx.AsyncClient(
+            transport=transport,
+            timeout=timeout,
+            headers=DEFAULT_HEADERS,
+            follow_redirects=True,
+        )
+
+    async def start(self) -> None:
+        """Создание клиента (вызывается при старте приложения)"""
+        if self._client is None or self._client.is_closed:
+            self._client = self._build_client()
+
+    async def use_transport(self, transport: httpx.AsyncBaseTransport) -> None:
+        """Замена транспорта (записанные ответы вместо сети)"""
+        await self.close()
+        self._client = self._build_client(transport)
+
+    async def close(self) -> None:
+        """Закрытие клиента и всех соединений пула"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def record_read(self, response: httpx.Response, stop_reason: str | None) -> None:
+        """
+        Учёт прочитанного ответа
+
+        Args:
+            response: Ответ (num_bytes_downloaded - байты на проводе)
+            stop_reason: "stopped_early", "truncated" или None (прочитан целиком)
+        """
+        downloaded = response.num_bytes_downloaded
+        self.stats["responses"] += 1
+        self.stats["bytes_read"] += downloaded
+
+        if stop_reason:
+            self.stats[stop_reason] += 1
+            content_length = response.headers.get("content-length")
+            if content_length and content_length.isdigit():
+                self.stats["bytes_saved"] += max(int(content_length) - downloaded, 0)
+            else:
+                self.stats["saved_unknown"] += 1
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """
+        Текущий клиент
+
+        Если lifespan не запускался (скрипты, тесты), клиент создаётся лениво.
+        """
+        if self._client is None or self._client.is_closed:
+            self._client = self._build_client()
+        return self._client
+
+
+# Глобальный клиент, общий для всех парсеров
+parser_http_client = ParserHTTPClient()
@@ -0,0 +1,285 @@
+"""
+Проверка изображений товара
+
+Парсеры собирают ссылки на изображения, не зная, существуют ли они:
+Ozon переписывает размер на /wc1000/, Wildberries генерирует пять ссылок
+по схеме корзин. Перед отдачей клиенту все кандидаты проверяются
+параллельно запросом первых PROBE_BYTES байт (Range), с общим сроком
+PARSER_IMAGE_PROBE_TIMEOUT:
+- 404/410, другие 4xx и не-изображения - ссылка мёртвая и выбрасывается;
+- из заголовка файла читаются размеры (PNG, GIF, JPEG, WebP), из
+  Content-Range/Content-Length - размер файла;
+- не успевшие за срок, 5xx и сетевые ошибки - статус неизвестен, ссылка
+  остаётся (лучше показать картинку, чем потерять её из-за медленного CDN).
+
+Для каждого изображения можно передать несколько вариантов по убыванию
+предпочтения (например, большой размер и оригинал) - выбирается первый живой.
+
+Результаты кэшируются по URL: в процессе (LRU) и в Redis.
+
+Проверка идёт внутри parse(), до кэширования результата: парсинг товара
+с непроверенными изображениями дольше на время ответа CDN, но не больше
+PARSER_IMAGE_PROBE_TIMEOUT. Повторный парсинг берёт результат из кэша
+парсинга, а ссылки, уже проверенные для других товаров, - из кэша проверок.
+Проверку нельзя отложить: клиент сохраняет ссылку из первого ответа, и
+мёртвый увеличенный вариант остался бы в списке. Цена проверки измеряется
+бенчмарком парсеров (probe_p50_ms в benchmarks/parsers.py).
+
+Запросы проверок учитываются в телеметрии отдельно от сайтов (image_probe).
+"""
+import asyncio
+import json
+import struct
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+
+from redis.exceptions import RedisError
+
+from app.config import settings
+from app.core.redis import redis_client
+from app.services.parser.http import parser_http_client
+from app.services.parser.telemetry import current_marketplace
+
+# Сколько байт запрашивать: заголовок JPEG с EXIF обычно умещается
+PROBE_BYTES = 16 * 1024
+
+# Префикс ключей в Redis (версия меняется при смене формата записи)
+REDIS_KEY_PREFIX = "image-probe:v1:"
+
+
+@dataclass
+class ImageInfo:
+    """Результат проверки изображения"""
+    url: str
+    ok: bool
+    width: int | None = None
+    height: int | None = None
+    content_length: int | None = None
+    content_type: str | None = None
+
+
+def image_size(data: bytes) -> tuple[int, int] | None:
+    """Размеры изображения (ширина, высота) по началу файла"""
+    if data.startswith(b"\x89PNG\r\n\x1a\n") and data[12:16] == b"IHDR" and len(data) >= 24:
+        return struct.unpack(">II", data[16:24])
+
+    if data[:6] in (b"GIF87a", b"GIF89a") and len(data) >= 10:
+        return struct.unpack("<HH", data[6:10])
+
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP" and len(data) >= 30:
+        chunk = data[12:16]
+        if chunk == b"VP8 ":
+            width, height = struct.unpack("<HH", data[26:30])
+            return width & 0x3FFF, height & 0x3FFF
+        if chunk == b"VP8L":
+            bits = int.from_bytes(data[21:25], "little")
+            return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+        if chunk == b"VP8X":
+            return int.from_bytes(data[24:27], "little") + 1, int.from_bytes(data[27:30], "little") + 1
+        return None
+
+    if data[:2] == b"\xff\xd8":
+        # Маркеры JPEG до SOFn (кроме DHT, JPG, DAC)
+        index = 2
+        while index + 9 <= len(data):
+            if data[index] != 0xFF:
+                return None
+            marker = data[index + 1]
+            if marker == 0xFF:
+                index += 1
+                continue
+            length = struct.unpack(">H", data[index + 2:index + 4])[0]
+            if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+                height, width = struct.unpack(">HH", data[index + 5:index + 9])
+                return width, height
+            index += 2 + length
+    return None
+
+
+def content_length(headers) -> int | None:
+    """Полный размер файла из Content-Range (ответ 206) или Content-Length"""
+    content_range = headers.get("content-range", "")
+    total = content_range.rpartition("/")[2]
+    if total.isdigit():
+        return int(total)
+    length = headers.get("content-length")
+    return int(length) if length and length.isdigit() and not content_range else None
+
+
+class ImageProber:
+    """
+    Параллельная проверка изображений с кэшем по URL
+
+    Метрики (stats):
+    - probes - запросов к CDN
+    - alive / dead - результаты запросов
+    - unknown - не успели за срок или временная ошибка
+    - lru_hits / redis_hits - результаты из кэша
+    """
+
+    def __init__(self, max_size: int | None = None):
+        self.max_size = max_size or settings.PARSER_IMAGE_PROBE_LRU_SIZE
+        # url -> (expires_at, info)
+        self._lru: OrderedDict[str, tuple[float, ImageInfo]] = OrderedDict()
+        self.stats = {
+            "probes": 0,
+            "alive": 0,
+            "dead": 0,
+            "unknown": 0,
+            "lru_hits": 0,
+            "redis_hits": 0,
+        }
+
+    async def select(self, groups: list[list[str]]) -> list[str]:
+        """
+        Выбор живого варианта для каждого изображения
+
+        Args:
+            groups: Варианты каждого изображения по убыванию предпочтения
+
+        Returns:
+            Ссылки без мёртвых изображений и без повторов, в исходном порядке
+        """
+        infos = await self.probe_many([url for group in groups for url in group])
+        selected = []
+        for group in groups:
+            alive = [url for url in group if infos.get(url) is not None and infos[url].ok]
+            unknown = [url for url in group if infos.get(url) is None]
+            url = (alive or unknown or [None])[0]
+            if url is not None and url not in selected:
+                selected.append(url)
+        return selected
+
+    async def probe_many(self, urls: list[str]) -> dict[str, ImageInfo | None]:
+        """
+        Проверка списка ссылок (кэш, затем параллельные запросы)
+
+        Returns:
+            URL -> результат проверки; None - статус неизвестен
+        """
+        infos: dict[str, ImageInfo | None] = {}
+        missing = []
+        for url in dict.fromkeys(urls):
+            info = self._get_local(url)
+            if info is not None:
+                self.stats["lru_hits"] += 1
+                infos[url] = info
+            else:
+                missing.append(url)
+
+        for url, info in (await self._get_redis(missing)).items():
+            self.stats["redis_hits"] += 1
+            self._put_local(url, info)
+            infos[url] = info
+        missing = [url for url in missing if url not in infos]
+        if not missing:
+            return infos
+
+        tasks = {url: asyncio.create_task(self._probe(url)) for url in missing}
+        await asyncio.wait(tasks.values(), timeout=settings.PARSER_IMAGE_PROBE_TIMEOUT)
+
+        found = {}
+        for url, task in tasks.items():
+            if not task.done():
+                task.cancel()
+            info = task.result() if task.done() and not task.cancelled() else None
+            infos[url] = info
+            if info is None:
+                self.stats["unknown"] += 1
+                continue
+            self.stats["alive" if info.ok else "dead"] += 1
+            self._put_local(url, info)
+            found[url] = info
+
+        await self._put_redis(found)
+        return infos
+
+    def get(self, url: str) -> ImageInfo | None:
+        """Результат из локального кэша (размеры, размер файла)"""
+        return self._get_local(url)
+
+    def clear(self) -> None:
+        """Очистка локального кэша (Redis не затрагивается)"""
+        self._lru.clear()
+
+    async def _probe(self, url: str) -> ImageInfo | None:
+        """Запрос начала файла; None - статус неизвестен"""
+        # Запросы к CDN не смешиваются в телеметрии с парсингом страниц
+        # (задача проверки - своя копия контекста)
+        current_marketplace.set("image_probe")
+        self.stats["probes"] += 1
+        headers = {"Range": f"bytes=0-{PROBE_BYTES - 1}"}
+        try:
+            async with parser_http_client.client.stream("GET", url, headers=headers) as response:
+                if response.status_code >= 500 or response.status_code == 429:
+                    return None
+                content_type = response.headers.get("content-type", "").split(";")[0].strip() or None
+                if response.status_code not in (200, 206) or (content_type and not content_type.startswith("image/")):
+                    return ImageInfo(url=url, ok=False)
+
+                # Сервер может проигнорировать Range - читаем только начало
+                data = b""
+                async for chunk in response.aiter_bytes():
+                    data += chunk
+                    if len(data) >= PROBE_BYTES:
+                        break
+        except Exception:
+            # Сеть, таймаут, ограничение хоста - проверим в следующий раз
+            return None
+
+        size = image_size(data)
+        return ImageInfo(
+            url=url,
+            ok=True,
+            width=size[0] if size else None,
+            height=size[1] if size else None,
+            content_length=content_length(response.headers),
+            content_type=content_type,
+        )
+
+    @staticmethod
+    def ttl_for(info: ImageInfo) -> int:
+        """TTL записи в секундах"""
+        return settings.PARSER_IMAGE_PROBE_TTL if info.ok else settings.PARSER_IMAGE_PROBE_DEAD_TTL
+
+    def _get_local(self, url: str) -> ImageInfo | None:
+        entry = self._lru.get(url)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del self._lru[url]
+            return None
+        self._lru.move_to_end(url)
+        return entry[1]
+
+    def _put_local(self, url: str, info: ImageInfo) -> None:
+        self._lru[url] = (time.monotonic() + self.ttl_for(info), info)
+        self._lru.move_to_end(url)
+        while len(self._lru) > self.max_size:
+            self._lru.popitem(last=False)
+
+    async def _get_redis(self, urls: list[str]) -> dict[str, ImageInfo]:
+        if not urls or not redis_client.available:
+            return {}
+        try:
+            values = await redis_client.client.mget([REDIS_KEY_PREFIX + url for url in urls])
+        except (RedisError, OSError):
+            redis_client.mark_down()
+            return {}
+        return {url: ImageInfo(**json.loads(raw)) for url, raw in zip(urls, values, strict=True) if raw is not None}
+
+    async def _put_redis(self, infos: dict[str, ImageInfo]) -> None:
+        if not infos or not redis_client.available:
+            return
+        try:
+            async with redis_client.client.pipeline(transaction=False) as pipe:
+                for url, info in infos.items():
+                    pipe.set(REDIS_KEY_PREFIX + url, json.dumps(asdict(info)), ex=self.ttl_for(info))
+                await pipe.execute()
+        except (RedisError, OSError):
+            redis_client.mark_down()
+
+
+# Глобальный кэш проверок изображений
+image_prober = ImageProber()
@@ -0,0 +1,219 @@
+"""
+Быстрое извлечение метаданных страницы без построения полного DOM
+
+Почти всё, что нужно парсерам (og:*, twitter:*, itemprop, <title>, первый
+<h1>, JSON-LD), лежит в <head> или рядом с ним. MetadataScanner читает
+документ потоково (lxml.etree.HTMLPullParser) за один проход, разбирает
+JSON-LD один раз и останавливается на </head>, если данных уже достаточно
+(или сразу после галереи в <body>, если картинки берутся оттуда).
+
+BeautifulSoup остаётся запасным путём для эвристик по <body>.
+"""
+import json
+from collections.abc import Callable
+from contextlib import suppress
+from dataclasses import dataclass, field
+
+from lxml import etree
+
+# Размер порции при потоковой подаче уже загруженной строки
+SCAN_CHUNK_SIZE = 64 * 1024
+
+# Сколько <img src> запоминать (для галерей маркетплейсов хватает с запасом)
+MAX_IMG_SOURCES = 200
+
+
+@dataclass
+class PageMetadata:
+    """Метаданные страницы, собранные за один проход"""
+
+    # <meta property|name="key" content="..."> и <meta itemprop="x"> (ключ "itemprop:x")
+    meta: dict[str, list[str]] = field(default_factory=dict)
+    title: str | None = None
+    h1: str | None = None
+    # Все JSON-LD объекты (списки и @graph развёрнуты), json.loads один раз
+    json_ld: list[dict] = field(default_factory=list)
+    # src всех <img> в порядке появления (если <body> читался)
+    img_sources: list[str] = field(default_factory=list)
+    # Сканирование остановлено досрочно (на </head> или после галереи) -
+    # документ прочитан не целиком
+    stopped_early: bool = False
+
+    def first(self, *keys: str) -> str | None:
+        """Первое непустое значение по первому найденному ключу"""
+        for key in keys:
+            for value in self.meta.get(key, []):
+                if value:
+                    return value
+        return None
+
+    def values(self, key: str) -> list[str]:
+        """Все значения мета-тега (например, несколько og:image)"""
+        return [value for value in self.meta.get(key, []) if value]
+
+    def product(self) -> dict | None:
+        """JSON-LD объект товара: @type Product, иначе первый объект с name"""
+        for item in self.json_ld:
+            item_type = item.get("@type")
+            if item_type == "Product" or (isinstance(item_type, list) and "Product" in item_type):
+                return item
+        for item in self.json_ld:
+            if "name" in item:
+                return item
+        return None
+
+    def product_price(self) -> float | None:
+        """Цена из offers JSON-LD объекта товара"""
+        product = self.product()
+        if not product:
+            return None
+
+        offers = product.get("offers")
+        if isinstance(offers, list):
+            offers = offers[0] if offers else None
+        if not isinstance(offers, dict):
+            return None
+
+        price = offers.get("price", offers.get("lowPrice"))
+        try:
+            return float(price) if price is not None else None
+        except (TypeError, ValueError):
+            return None
+
+    def _add_meta(self, attrib) -> None:
+        content = attrib.get("content")
+        if content is None:
+            return
+        key = attrib.get("property") or attrib.get("name")
+        if key:
+            self.meta.setdefault(key.lower(), []).append(content.strip())
+        itemprop = attrib.get("itemprop")
+        if itemprop:
+            self.meta.setdefault(f"itemprop:{itemprop.lower()}", []).append(content.strip())
+
+    def _add_json_ld(self, text: str | None) -> None:
+        if not text:
+            return
+        try:
+            data = json.loads(text)
+        except ValueError:
+            return
+
+        stack = [data]
+        while stack:
+            item = stack.pop(0)
+            if isinstance(item, list):
+                stack.extend(item)
+            elif isinstance(item, dict):
+                self.json_ld.append(item)
+                if isinstance(item.get("@graph"), list):
+                    stack.extend(item["@graph"])
+
+
+class MetadataScanner:
+    """
+    Потоковый сборщик PageMetadata
+
+    Данные подаются порциями через feed(); когда сканирование закончено
+    (на </head> при достаточных данных), feed() возвращает True и остаток
+    документа можно не читать.
+
+    Если в <head> всё есть, кроме галереи (gallery() ещё False), сканер
+    продолжает читать <body> до первого <img>, после которого gallery()
+    вернёт True. Сколько <body> читать, ограничивает вызывающий код.
+    """
+
+    def __init__(
+        self,
+        enough: Callable[[PageMetadata], bool] | None = None,
+        gallery: Callable[[PageMetadata], bool] | None = None
+    ):
+        self.page = PageMetadata()
+        self.done = False
+        # </head> разобран (данных могло и не хватить)
+        self.head_closed = False
+        # В <head> данных достаточно, дочитывается галерея из <body>
+        self.scanning_body = False
+        self._enough = enough
+        self._gallery = gallery
+        self._in_h1 = False
+        self._parser = etree.HTMLPullParser(events=("start", "end"))
+
+    def feed(self, chunk: str | bytes) -> bool:
+        """Подать очередную порцию документа; True - дальше можно не читать"""
+        if not self.done:
+            self._parser.feed(chunk)
+            self._read_events()
+        return self.done
+
+    def close(self) -> PageMetadata:
+        """Завершение сканирования"""
+        if not self.done:
+            # Обрезанный документ - не ошибка, берём то, что успели прочитать
+            with suppress(etree.LxmlError):
+                self._parser.close()
+            self._read_events()
+            self.done = True
+        return self.page
+
+    def _read_events(self) -> None:
+        page = self.page
+        for event, element in self._parser.read_events():
+            tag = element.tag
+            if not isinstance(tag, str):
+                continue
+
+            if event == "start":
+                if tag == "meta":
+                    page._add_meta(element.attrib)
+                elif tag == "img" and len(page.img_sources) < MAX_IMG_SOURCES:
+                    src = element.get("src")
+                    if src:
+                        page.img_sources.append(src)
+                        if self.scanning_body and self._gallery(page):
+                            page.stopped_early = True
+                            self.done = True
+                            return
+                elif tag == "h1" and page.h1 is None:
+                    self._in_h1 = True
+                continue
+
+            if tag == "title" and page.title is None:
+                page.title = (element.text or "").strip() or None
+            elif tag == "h1" and self._in_h1:
+                page.h1 = " ".join("".join(element.itertext()).split()) or None
+                self._in_h1 = False
+            elif tag == "script" and element.get("type") == "application/ld+json":
+                page._add_json_ld(element.text)
+            elif tag == "head":
+                self.head_closed = True
+                if self._enough is not None and self._enough(page):
+                    if self._gallery is not None and not self._gallery(page):
+                        self.scanning_body = True
+                        continue
+                    page.stopped_early = True
+                    self.done = True
+                    return
+
+            # Разобранные элементы больше не нужны - не копим дерево
+            # (кроме содержимого незакрытого <h1>, его текст ещё нужен)
+            if not self._in_h1 and tag not in ("html", "head", "body"):
+                element.clear(keep_tail=True)
+
+
+def scan_metadata(html: str | bytes, enough: Callable[[PageMetadata], bool] | None = None) -> PageMetadata:
+    """
+    Метаданные уже загруженной страницы
+
+    Args:
+        html: Документ целиком
+        enough: Проверка на </head>: True - <body> не читать
+
+    Returns:
+        Собранные метаданные
+    """
+    scanner = MetadataScanner(enough)
+    for start in range(0, len(html), SCAN_CHUNK_SIZE):
+        if scanner.feed(html[start:start + SCAN_CHUNK_SIZE]):
+            break
+    return scanner.close()
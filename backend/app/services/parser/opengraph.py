@@ -5,11 +5,13 @@
 Большинство современных сайтов поддерживают OpenGraph.
 """
 
-from bs4 import BeautifulSoup
-
 from app.models.item import MarketplaceType
-from app.schemas.item import ParsedItemData
-from app.services.parser.base import BaseParser
+from app.schemas.item import ParsedItemData, ParseErrorKind
+from app.services.parser.base import BaseParser, ProductNotFoundError
+from app.services.parser.circuit import HostUnavailableError
+from app.services.parser.executor import parse_executor
+from app.services.parser.metadata import PageMetadata, scan_metadata
+from app.services.parser.revalidation import NotModifiedError
 
 
 class OpenGraphParser(BaseParser):
@@ -29,28 +31,28 @@ class OpenGraphParser(BaseParser):
         """
         try:
             # Загружаем HTML страницы
-            html = await self.fetch_html(url)
+            html = await self.fetch_html(url, enough=self._has_enough)
 
             if not html:
                 return ParsedItemData(
                     success=False,
-                    error="Не удалось загрузить страницу"
+                    error="Не удалось загрузить страницу",
+                    error_kind=ParseErrorKind.empty
                 )
 
-            # Парсим HTML
-            soup = BeautifulSoup(html, 'html.parser')
-
-            # Извлекаем данные
-            title = self._extract_title(soup)
-            description = self._extract_description(soup)
-            price = self._extract_price_value(soup)
-            images = self._extract_images(soup)
+            # Разбираем HTML в пуле, чтобы не блокировать event loop
+            data = await parse_executor.run(self.extract, html)
+            title = data["title"]
+            description = data["description"]
+            price = data["price"]
+            images = await self.verify_images(data["images"])
 
             # Если не удалось извлечь хотя бы заголовок, считаем парсинг неудачным
             if not title:
                 return ParsedItemData(
                     success=False,
-                    error="Не удалось извлечь информацию о товаре"
+                    error="Не удалось извлечь информацию о товаре",
+                    error_kind=ParseErrorKind.empty
                 )
 
             return ParsedItemData(
@@ -64,110 +66,86 @@ class OpenGraphParser(BaseParser):
                 success=True
             )
 
-        except Exception as e:
-            return ParsedItemData(
-                success=False,
-                error=f"Ошибка парсинга: {str(e)}"
-            )
+        except ProductNotFoundError:
+            return self.not_found_result("Страница не найдена")
 
-    def _extract_title(self, soup: BeautifulSoup) -> str | None:
-        """Извлечение названия"""
-        # OpenGraph
-        og_title = soup.find('meta', property='og:title')
-        if og_title:
-            return og_title.get('content')
-
-        # Twitter Card
-        twitter_title = soup.find('meta', attrs={'name': 'twitter:title'})
-        if twitter_title:
-            return twitter_title.get('content')
-
-        # Schema.org Product
-        product_name = soup.find('meta', attrs={'itemprop': 'name'})
-        if product_name:
-            return product_name.get('content')
-
-        # Обычный title
-        title_tag = soup.find('title')
-        if title_tag:
-            return title_tag.get_text(strip=True)
-
-        # H1
-        h1_tag = soup.find('h1')
-        if h1_tag:
-            return h1_tag.get_text(strip=True)
+        except (HostUnavailableError, NotModifiedError):
+            # Лимит хоста и "страница не изменилась" обрабатывает ProductParserService
+            raise
 
-        return None
+        except Exception as e:
+            return self.error_result(e)
 
-    def _extract_description(self, soup: BeautifulSoup) -> str | None:
-        """Извлечение описания"""
-        # OpenGraph
-        og_description = soup.find('meta', property='og:description')
-        if og_description:
-            return og_description.get('content')
+    @classmethod
+    def extract(cls, html: str) -> dict:
+        """
+        Извлечение данных из HTML (выполняется в пуле parse_executor)
 
-        # Twitter Card
-        twitter_description = soup.find('meta', attrs={'name': 'twitter:description'})
-        if twitter_description:
-            return twitter_description.get('content')
+        Всё нужное лежит в мета-тегах, <title> и <h1>, поэтому полный DOM
+        не строится: один потоковый проход, остановка на </head>,
+        если название, цена и изображение уже найдены.
 
-        # Meta description
-        meta_description = soup.find('meta', attrs={'name': 'description'})
-        if meta_description:
-            return meta_description.get('content')
+        Returns:
+            Словарь с ключами title, description, price, images
+        """
+        page = scan_metadata(html, enough=cls._has_enough)
+        return {
+            "title": cls._extract_title(page),
+            "description": cls._extract_description(page),
+            "price": cls._extract_price_value(page),
+            "images": cls._extract_images(page),
+        }
+
+    @classmethod
+    def _has_enough(cls, page: PageMetadata) -> bool:
+        """Хватает ли данных из <head>, чтобы не читать <body>"""
+        return bool(cls._extract_title(page) and cls._extract_price_value(page) is not None and cls._extract_images(page))
+
+    @classmethod
+    def _extract_title(cls, page: PageMetadata) -> str | None:
+        """Извлечение названия"""
+        # OpenGraph, Twitter Card, Schema.org Product
+        title = page.first('og:title', 'twitter:title', 'itemprop:name')
+        if title:
+            return title
 
-        # Schema.org
-        product_description = soup.find('meta', attrs={'itemprop': 'description'})
-        if product_description:
-            return product_description.get('content')
+        # Обычный title, затем H1
+        return page.title or page.h1
 
-        return None
+    @classmethod
+    def _extract_description(cls, page: PageMetadata) -> str | None:
+        """Извлечение описания"""
+        # OpenGraph, Twitter Card, meta description, Schema.org
+        return page.first('og:description', 'twitter:description', 'description', 'itemprop:description')
 
-    def _extract_price_value(self, soup: BeautifulSoup) -> float | None:
+    @classmethod
+    def _extract_price_value(cls, page: PageMetadata) -> float | None:
         """Извлечение цены"""
-        # Schema.org Product
-        price_meta = soup.find('meta', attrs={'itemprop': 'price'})
-        if price_meta:
-            try:
-                return float(price_meta.get('content'))
-            except Exception:
-                pass
-
-        # OpenGraph product:price
-        og_price = soup.find('meta', property='product:price:amount')
-        if og_price:
-            try:
-                return float(og_price.get('content'))
-            except Exception:
-                pass
+        # Schema.org Product, затем OpenGraph product:price
+        for key in ('itemprop:price', 'product:price:amount'):
+            value = page.first(key)
+            if value:
+                try:
+                    return float(value)
+                except ValueError:
+                    pass
 
         return None
 
-    def _extract_images(self, soup: BeautifulSoup) -> list:
+    @classmethod
+    def _extract_images(cls, page: PageMetadata) -> list:
         """Извлечение изображений"""
         images = []
 
         # OpenGraph
-        og_images = soup.find_all('meta', property='og:image')
-        for og_image in og_images[:5]:
-            img_url = og_image.get('content')
-            if img_url and img_url not in images:
+        for img_url in page.values('og:image')[:5]:
+            if img_url not in images:
                 images.append(img_url)
 
-        # Twitter Card
-        if not images:
-            twitter_image = soup.find('meta', attrs={'name': 'twitter:image'})
-            if twitter_image:
-                img_url = twitter_image.get('content')
-                if img_url:
-                    images.append(img_url)
-
-        # Schema.org
+        # Twitter Card, затем Schema.org
         if not images:
-            product_image = soup.find('meta', attrs={'itemprop': 'image'})
-            if product_image:
-                img_url = product_image.get('content')
-                if img_url:
-                    images.append(img_url)
+            img_url = page.first('twitter:image', 'itemprop:image')
+            if img_url:
+                images.append(img_url)
 
         return images
@@ -0,0 +1,119 @@
+"""
+Реестр парсеров с выбором по домену
+
+Ссылка разбирается один раз, парсер ищется в словаре по хосту и его
+родительским доменам (shop.market.yandex.ru -> market.yandex.ru -> yandex.ru),
+то есть за O(число меток в хосте) независимо от количества парсеров.
+Если ни один парсер маркетплейса не подошёл - используется запасной (OpenGraph).
+
+Парсеры регистрируются строкой "модуль:Класс" и импортируются при первом
+обращении к их домену. Сторонние пакеты могут добавлять парсеры через
+entry points группы ENTRY_POINT_GROUP, где имя - домен, а значение - класс:
+
+    [project.entry-points."exflow.parsers"]
+    lamoda.ru = "exflow_lamoda.parser:LamodaParser"
+"""
+from importlib import import_module
+from importlib.metadata import entry_points
+
+from app.services.parser.base import BaseParser, url_host
+
+# Группа entry points для сторонних парсеров
+ENTRY_POINT_GROUP = "exflow.parsers"
+
+# Встроенные парсеры: домен -> "модуль:Класс"
+BUILTIN_PARSERS: dict[str, str] = {
+    "wildberries.ru": "app.services.parser.wildberries:WildberriesParser",
+    "wb.ru": "app.services.parser.wildberries:WildberriesParser",
+    "ozon.ru": "app.services.parser.ozon:OzonParser",
+    "market.yandex.ru": "app.services.parser.yandex_market:YandexMarketParser",
+}
+
+# Запасной парсер для любых ссылок
+FALLBACK_PARSER = "app.services.parser.opengraph:OpenGraphParser"
+
+
+def _import_parser(spec: str) -> type[BaseParser]:
+    """Импорт класса парсера по строке "модуль:Класс" """
+    module_name, _, class_name = spec.partition(":")
+    return getattr(import_module(module_name), class_name)
+
+
+class ParserRegistry:
+    """
+    Индекс домен -> парсер с ленивым импортом
+
+    Экземпляр парсера создаётся один раз на класс: WB зарегистрирован на два
+    домена, но у него одна очередь пакетных запросов.
+    """
+
+    def __init__(self, parsers: dict[str, str] | None = None, fallback: str = FALLBACK_PARSER):
+        self._specs: dict[str, str] = {}
+        self._instances: dict[str, BaseParser] = {}
+        self._fallback = fallback
+        self._entry_points_loaded = parsers is not None
+        for domain, spec in (BUILTIN_PARSERS if parsers is None else parsers).items():
+            self.register(domain, spec)
+
+    def register(self, domain: str, parser: str | type[BaseParser]) -> None:
+        """
+        Регистрация парсера для домена (и всех его поддоменов)
+
+        Args:
+            domain: Домен, например "ozon.ru"
+            parser: Строка "модуль:Класс" (импорт при первом использовании) или класс
+        """
+        spec = parser if isinstance(parser, str) else f"{parser.__module__}:{parser.__qualname__}"
+        self._specs[domain.lower().removeprefix("www.")] = spec
+
+    def load_entry_points(self) -> None:
+        """Добавить парсеры из entry points установленных пакетов (без импорта)"""
+        self._entry_points_loaded = True
+        for entry_point in entry_points(group=ENTRY_POINT_GROUP):
+            self.register(entry_point.name, entry_point.value)
+
+    @property
+    def domains(self) -> list[str]:
+        """Зарегистрированные домены"""
+        self._ensure_entry_points()
+        return sorted(self._specs)
+
+    def candidates(self, url: str) -> list[BaseParser]:
+        """
+        Парсеры, подходящие для ссылки, в порядке попытки
+
+        Сначала парсер самого длинного совпавшего домена (если его can_parse
+        подтверждает ссылку), последним - запасной парсер.
+        """
+        self._ensure_entry_points()
+        parsers = []
+
+        labels = url_host(url).split(".")
+        for start in range(len(labels) - 1):
+            spec = self._specs.get(".".join(labels[start:]))
+            if spec is not None:
+                parser = self._get(spec)
+                if parser.can_parse(url):
+                    parsers.append(parser)
+                break
+
+        parsers.append(self._get(self._fallback))
+        return parsers
+
+    def resolve(self, url: str) -> BaseParser:
+        """Парсер, который будет использован для ссылки первым"""
+        return self.candidates(url)[0]
+
+    def _get(self, spec: str) -> BaseParser:
+        parser = self._instances.get(spec)
+        if parser is None:
+            parser = self._instances[spec] = _import_parser(spec)()
+        return parser
+
+    def _ensure_entry_points(self) -> None:
+        if not self._entry_points_loaded:
+            self.load_entry_points()
+
+
+# Глобальный реестр парсеров
+parser_registry = ParserRegistry()
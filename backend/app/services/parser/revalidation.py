@@ -0,0 +1,88 @@
+"""
+Условная перезагрузка страниц уже известных товаров
+
+При повторном парсинге товара ProductParserService передаёт в fetch_html
+валидаторы прошлого ответа (ETag, Last-Modified, хэш содержимого) через
+contextvar. fetch_html отправляет If-None-Match / If-Modified-Since и на 304
+или неизменившийся хэш прерывает парсинг (NotModifiedError) - сервис
+возвращает прошлый результат без повторного разбора HTML.
+"""
+import hashlib
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass
+
+import httpx
+
+
+class NotModifiedError(Exception):
+    """Страница не изменилась с прошлого парсинга"""
+
+
+@dataclass
+class Validators:
+    """Валидаторы ответа, сохраняемые вместе с результатом парсинга"""
+
+    etag: str | None = None
+    last_modified: str | None = None
+    content_hash: str | None = None
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Validators":
+        return cls(**{name: data.get(name) for name in ("etag", "last_modified", "content_hash")})
+
+
+def content_hash(html: str) -> str:
+    """Хэш содержимого страницы (того, что было прочитано)"""
+    return hashlib.sha1(html.encode()).hexdigest()
+
+
+class Revalidation:
+    """Состояние перезагрузки одной страницы"""
+
+    def __init__(self, previous: Validators | None = None):
+        self.previous = previous
+        self.received: Validators | None = None
+        self.not_modified = False
+
+    def request_headers(self) -> dict[str, str]:
+        """Заголовки условного запроса"""
+        headers = {}
+        if self.previous is not None:
+            if self.previous.etag:
+                headers["If-None-Match"] = self.previous.etag
+            if self.previous.last_modified:
+                headers["If-Modified-Since"] = self.previous.last_modified
+        return headers
+
+    def on_not_modified(self, response: httpx.Response) -> None:
+        """Сервер ответил 304 - валидаторы остаются прежними (ETag мог обновиться)"""
+        self.not_modified = True
+        self.received = Validators(
+            etag=response.headers.get("etag", self.previous.etag if self.previous else None),
+            last_modified=response.headers.get(
+                "last-modified", self.previous.last_modified if self.previous else None
+            ),
+            content_hash=self.previous.content_hash if self.previous else None,
+        )
+
+    def on_response(self, response: httpx.Response, html: str) -> None:
+        """Запомнить валидаторы нового ответа; совпал хэш - страница не изменилась"""
+        self.received = Validators(
+            etag=response.headers.get("etag"),
+            last_modified=response.headers.get("last-modified"),
+            content_hash=content_hash(html),
+        )
+        if self.previous is not None and self.previous.content_hash == self.received.content_hash:
+            self.not_modified = True
+
+    @property
+    def validators(self) -> Validators | None:
+        """Что сохранить вместе с результатом"""
+        return self.received or self.previous
+
+
+# Перезагрузка, выполняемая в текущей задаче парсинга (None - обычная загрузка)
+current_revalidation: ContextVar[Revalidation | None] = ContextVar("current_revalidation", default=None)
@@ -0,0 +1,164 @@
+"""
+Single-flight: объединение одновременных одинаковых запросов на парсинг
+
+Когда ссылка на товар разлетается по чатам, десятки пользователей вставляют
+её одновременно. Вместо десятков запросов к маркетплейсу выполняется один:
+
+- внутри процесса вызывающие ждут одну и ту же asyncio.Task
+- между воркерами uvicorn - через Redis: воркер, взявший lock, парсит
+  и публикует результат в канал, остальные ждут сообщения
+"""
+import asyncio
+import secrets
+from collections.abc import Awaitable, Callable
+
+from redis.exceptions import RedisError
+
+from app.config import settings
+from app.core.redis import redis_client
+from app.schemas.item import ParsedItemData
+
+LOCK_PREFIX = "parse:lock:"
+CHANNEL_PREFIX = "parse:done:"
+
+# Снять lock, только если он всё ещё наш (не истёк и не перехвачен)
+RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+ParseCall = Callable[[], Awaitable[ParsedItemData]]
+CacheLookup = Callable[[], Awaitable[ParsedItemData | None]]
+
+
+class SingleFlight:
+    """Группа одновременных вызовов, объединённых по ключу товара"""
+
+    def __init__(self):
+        self._inflight: dict[str, asyncio.Task] = {}
+        self._waiters: dict[str, int] = {}
+        self.stats = {
+            "leader": 0,        # парсили сами
+            "coalesced": 0,     # дождались задачи в этом процессе
+            "remote": 0,        # получили результат от другого воркера
+        }
+
+    async def do(self, key: str, parse: ParseCall, lookup: CacheLookup) -> ParsedItemData:
+        """
+        Выполнить parse() один раз для всех одновременных вызовов с ключом key
+
+        Args:
+            key: Канонический ключ товара (тот же, что у кэша)
+            parse: Парсинг с сохранением результата в кэш
+            lookup: Проверка кэша (результат другого воркера мог уже появиться)
+
+        Returns:
+            Результат парсинга (копия для каждого вызывающего)
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._run(key, parse, lookup))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._finish(key, t))
+        else:
+            self.stats["coalesced"] += 1
+
+        # shield: отмена одного клиента не отменяет парсинг для остальных,
+        # но если ушли все ожидающие - парсинг больше никому не нужен
+        self._waiters[key] = self._waiters.get(key, 0) + 1
+        try:
+            result = await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if self._waiters[key] == 1 and self._inflight.get(key) is task:
+                task.cancel()
+            raise
+        finally:
+            self._waiters[key] -= 1
+            if not self._waiters[key]:
+                del self._waiters[key]
+        return result.model_copy()
+
+    def _finish(self, key: str, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Забираем исключение, если все ожидающие уже отменились
+        if not task.cancelled():
+            task.exception()
+
+    async def _run(self, key: str, parse: ParseCall, lookup: CacheLookup) -> ParsedItemData:
+        if not redis_client.available:
+            self.stats["leader"] += 1
+            return await parse()
+
+        token = secrets.token_hex(8)
+        try:
+            acquired = await redis_client.client.set(
+                LOCK_PREFIX + key, token, nx=True, px=settings.PARSER_SINGLEFLIGHT_LOCK_TTL_MS
+            )
+        except (RedisError, OSError):
+            redis_client.mark_down()
+            self.stats["leader"] += 1
+            return await parse()
+
+        if not acquired:
+            result = await self._wait_remote(key, lookup)
+            if result is not None:
+                self.stats["remote"] += 1
+                return result
+            # Лидер в другом воркере не успел или упал - парсим сами
+
+        self.stats["leader"] += 1
+        try:
+            result = await parse()
+            await self._publish(key, result)
+            return result
+        finally:
+            if acquired:
+                await self._release(key, token)
+
+    async def _wait_remote(self, key: str, lookup: CacheLookup) -> ParsedItemData | None:
+        """Ожидание результата от воркера, который держит lock"""
+        pubsub = redis_client.client.pubsub()
+        try:
+            await pubsub.subscribe(CHANNEL_PREFIX + key)
+
+            # Лидер мог закончить до нашей подписки - тогда результат уже в кэше
+            cached = await lookup()
+            if cached is not None:
+                return cached
+
+            async with asyncio.timeout(settings.PARSER_SINGLEFLIGHT_WAIT_TIMEOUT):
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        return ParsedItemData.model_validate_json(message["data"])
+        except TimeoutError:
+            return None
+        except (RedisError, OSError):
+            redis_client.mark_down()
+            return None
+        finally:
+            try:
+                await pubsub.unsubscribe()
+                await pubsub.aclose()
+            except (RedisError, OSError):
+                pass
+
+        return None
+
+    async def _publish(self, key: str, result: ParsedItemData) -> None:
+        if not redis_client.available:
+            return
+        try:
+            await redis_client.client.publish(CHANNEL_PREFIX + key, result.model_dump_json())
+        except (RedisError, OSError):
+            redis_client.mark_down()
+
+    async def _release(self, key: str, token: str) -> None:
+        if not redis_client.available:
+            return
+        try:
+            await redis_client.client.eval(RELEASE_LOCK_SCRIPT, 1, LOCK_PREFIX + key, token)
+        except (RedisError, OSError):
+            redis_client.mark_down()
@@ -0,0 +1,211 @@
+"""
+Телеметрия парсеров товаров
+
+По каждому маркетплейсу:
+- гистограммы фаз HTTP запроса (connect, tls, ttfb, download) - через
+  trace-расширение httpcore, которое GuardedTransport вешает на каждый запрос;
+- гистограмма фазы parse (разбор HTML в parse_executor) и полного parse();
+- счётчики исходов: success и классы ошибок ParseErrorKind (timeout,
+  http_status, blocked, network, empty, not_found, unavailable, error -
+  прочие), всего и в скользящем окне PARSER_TELEMETRY_WINDOW.
+
+Маркетплейс запроса берётся из contextvar, который ProductParserService
+выставляет на время parser.parse() (пакетные запросы WB наследуют его).
+DNS отдельно не измеряется: httpcore разрешает имя внутри connect_tcp,
+поэтому оно входит в фазу connect.
+
+Телеметрия локальна для процесса (как и остальные stats парсеров).
+"""
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from app.config import settings
+from app.schemas.item import ParsedItemData
+
+# Границы корзин гистограмм (секунды)
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Фазы запроса httpcore: шаг trace -> фаза телеметрии
+TRACE_PHASES = {
+    "connect_tcp": "connect",
+    "start_tls": "tls",
+    "receive_response_body": "download",
+}
+
+# Маркетплейс парсинга, выполняемого в текущей задаче
+current_marketplace: ContextVar[str] = ContextVar("current_marketplace", default="other")
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами"""
+
+    def __init__(self, buckets: tuple[float, ...] = BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # последняя - больше всех границ
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float | None:
+        """Оценка квантиля - верхняя граница корзины (для последней - последняя граница)"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return self.buckets[min(index, len(self.buckets) - 1)]
+        return self.buckets[-1]
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "avg": round(self.sum / self.count, 4) if self.count else None,
+            "p50": self.quantile(0.5),
+            "p90": self.quantile(0.9),
+            "p99": self.quantile(0.99),
+            "buckets": {
+                **{str(bound): count for bound, count in zip(self.buckets, self.counts, strict=False)},
+                "+Inf": self.counts[-1],
+            },
+        }
+
+
+class RateWindow:
+    """Счётчик событий в скользящем окне (кольцо корзин по resolution секунд)"""
+
+    def __init__(self, window: float, resolution: float = 10.0):
+        self.resolution = resolution
+        self.slots = max(int(window // resolution), 1)
+        self.counts = [0] * self.slots
+        self.stamps = [0] * self.slots
+
+    def add(self, now: float | None = None) -> None:
+        stamp = int((now or time.time()) // self.resolution)
+        index = stamp % self.slots
+        if self.stamps[index] != stamp:
+            self.stamps[index] = stamp
+            self.counts[index] = 0
+        self.counts[index] += 1
+
+    def total(self, now: float | None = None) -> int:
+        current = int((now or time.time()) // self.resolution)
+        return sum(count for count, stamp in zip(self.counts, self.stamps, strict=True) if current - stamp < self.slots)
+
+
+def outcome(result: ParsedItemData) -> str:
+    """Исход парсинга: success или класс ошибки"""
+    if result.success:
+        return "success"
+    return result.error_kind.value if result.error_kind else "error"
+
+
+class RequestTrace:
+    """Замер фаз одного HTTP запроса (trace-расширение httpcore)"""
+
+    def __init__(self, telemetry: "ParserTelemetry", marketplace: str):
+        self.telemetry = telemetry
+        self.marketplace = marketplace
+        self.started: dict[str, float] = {}
+
+    async def __call__(self, name: str, info: dict) -> None:
+        now = time.perf_counter()
+        step, _, event = name.partition(".")[2].rpartition(".")
+        if event == "started":
+            self.started[step] = now
+            return
+
+        # Чтение тела прерывается при ранней остановке (failed) - это тоже конец загрузки
+        started = self.started.get(step)
+        if started is None or (event == "failed" and step != "receive_response_body"):
+            return
+        if step in TRACE_PHASES:
+            self.telemetry.observe_phase(TRACE_PHASES[step], now - started, self.marketplace)
+        elif step == "receive_response_headers":
+            # TTFB - от начала отправки запроса до заголовков ответа
+            sent = self.started.get("send_request_headers", started)
+            self.telemetry.observe_phase("ttfb", now - sent, self.marketplace)
+
+
+class ParserTelemetry:
+    """Гистограммы и счётчики по маркетплейсам"""
+
+    def __init__(self, window: float | None = None):
+        self.window = window or settings.PARSER_TELEMETRY_WINDOW
+        self.phases: dict[tuple[str, str], Histogram] = {}
+        self.latency: dict[str, Histogram] = {}
+        self.outcomes: dict[tuple[str, str], int] = {}
+        self.recent: dict[tuple[str, str], RateWindow] = {}
+
+    def trace(self) -> RequestTrace:
+        """trace-расширение для запроса из текущей задачи"""
+        return RequestTrace(self, current_marketplace.get())
+
+    def observe_phase(self, phase: str, seconds: float, marketplace: str | None = None) -> None:
+        key = (marketplace or current_marketplace.get(), phase)
+        histogram = self.phases.get(key)
+        if histogram is None:
+            histogram = self.phases[key] = Histogram()
+        histogram.observe(seconds)
+
+    def record(self, marketplace: str, result: ParsedItemData, seconds: float) -> None:
+        """Учёт завершённого parse()"""
+        histogram = self.latency.get(marketplace)
+        if histogram is None:
+            histogram = self.latency[marketplace] = Histogram()
+        histogram.observe(seconds)
+        self.count(marketplace, outcome(result))
+
+    def count(self, marketplace: str, kind: str) -> None:
+        """Учёт исхода без замера времени (запрос не отправлялся)"""
+        key = (marketplace, kind)
+        self.outcomes[key] = self.outcomes.get(key, 0) + 1
+        window = self.recent.get(key)
+        if window is None:
+            window = self.recent[key] = RateWindow(self.window)
+        window.add()
+
+    def snapshot(self) -> dict:
+        """Состояние по маркетплейсам (для админки)"""
+        marketplaces = {key[0] for key in self.outcomes} | {key[0] for key in self.phases}
+        report = {}
+        for marketplace in sorted(marketplaces):
+            recent = {
+                kind: window.total()
+                for (name, kind), window in self.recent.items()
+                if name == marketplace
+            }
+            recent_total = sum(recent.values())
+            latency = self.latency.get(marketplace)
+            report[marketplace] = {
+                "outcomes": {kind: count for (name, kind), count in self.outcomes.items() if name == marketplace},
+                "recent": {
+                    "window_seconds": self.window,
+                    "per_minute": round(recent_total / self.window * 60, 2),
+                    "success_rate": round(recent.get("success", 0) / recent_total, 4) if recent_total else None,
+                    "outcomes": {kind: count for kind, count in recent.items() if count},
+                },
+                "latency": latency.snapshot() if latency else None,
+                "phases": {
+                    phase: histogram.snapshot()
+                    for (name, phase), histogram in sorted(self.phases.items())
+                    if name == marketplace
+                },
+            }
+        return report
+
+    def reset(self) -> None:
+        self.phases.clear()
+        self.latency.clear()
+        self.outcomes.clear()
+        self.recent.clear()
+
+
+# Глобальная телеметрия парсеров
+parser_telemetry = ParserTelemetry()
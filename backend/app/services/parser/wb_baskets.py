@@ -0,0 +1,278 @@
+"""
+Определение хоста basket-XX для изображений Wildberries
+
+Изображения товара лежат на https://basket-{XX}.wbbasket.ru/vol{vol}/...,
+где номер корзины зависит от vol = артикул // 100000. Соответствие задаётся
+отсортированной таблицей верхних границ vol и ищется через bisect.
+
+Таблицу можно переопределить через Settings.PARSER_WB_BASKETS и заменить
+на лету: администратор публикует новую таблицу (publish, PUT
+/admin/wb-baskets) в Redis, а воркеры перечитывают её при старте и раз в
+PARSER_WB_BASKETS_RELOAD_INTERVAL (reload). Для vol за пределами таблицы
+опционально выполняется проба хостов; найденные корзины запоминаются
+(в процессе и в Redis). Redis о соседях vol спрашивается не чаще раза
+в PARSER_WB_BASKET_REFRESH_TTL, неудачная проба повторяется не чаще
+раза в PROBE_RETRY_INTERVAL.
+
+Корзины идут по возрастанию vol, поэтому найденные точки задают диапазоны:
+vol между двумя точками с одной корзиной лежит в ней же, а проба
+начинается с корзины ближайшей меньшей точки, а не с конца таблицы.
+"""
+import asyncio
+import json
+import time
+from bisect import bisect_left, insort
+from contextlib import suppress
+
+from redis.exceptions import RedisError
+
+from app.config import settings
+from app.core.redis import redis_client
+from app.services.parser.http import parser_http_client
+
+# (последний vol корзины, номер корзины) - по возрастанию vol
+DEFAULT_BASKETS: list[tuple[int, str]] = [
+    (143, "01"),
+    (287, "02"),
+    (431, "03"),
+    (719, "04"),
+    (1007, "05"),
+    (1061, "06"),
+    (1115, "07"),
+    (1169, "08"),
+    (1313, "09"),
+    (1601, "10"),
+    (1655, "11"),
+    (1919, "12"),
+    (2045, "13"),
+    (2189, "14"),
+    (2405, "15"),
+    (2621, "16"),
+    (2837, "17"),
+    (3053, "18"),
+    (3269, "19"),
+    (3485, "20"),
+    (3701, "21"),
+    (3917, "22"),
+    (4133, "23"),
+    (4349, "24"),
+    (4565, "25"),
+]
+
+# ZSET в Redis с корзинами, найденными пробой: score - vol, элемент "vol:basket"
+REDIS_LEARNED_KEY = "wb:baskets:learned:v2"
+
+# Таблица корзин, опубликованная администратором (JSON список пар)
+REDIS_TABLE_KEY = "wb:baskets:table:v1"
+
+# Через сколько секунд повторять неудачную пробу для того же vol
+PROBE_RETRY_INTERVAL = 60 * 60
+
+
+def basket_host(basket: str) -> str:
+    """Хост корзины"""
+    return f"basket-{basket}.wbbasket.ru"
+
+
+class BasketResolver:
+    """Таблица vol -> basket с поиском через bisect"""
+
+    def __init__(self, table: list | None = None):
+        self._bounds: list[int] = []
+        self._baskets: list[str] = []
+        self._learned: dict[int, str] = {}
+        self._learned_vols: list[int] = []  # ключи _learned по возрастанию
+        self._failed_probes: dict[int, float] = {}  # vol -> когда проба не удалась
+        self._refreshed: dict[int, float] = {}  # vol -> когда соседи читались из Redis
+        self._task: asyncio.Task | None = None
+        self.load(table or settings.PARSER_WB_BASKETS or DEFAULT_BASKETS)
+
+    def load(self, table: list) -> None:
+        """
+        Замена таблицы корзин (можно вызывать во время работы)
+
+        Args:
+            table: Пары (последний vol, номер корзины) в любом порядке
+        """
+        rows = sorted((int(max_vol), str(basket).zfill(2)) for max_vol, basket in table)
+        # Присваиваем обе колонки разом, чтобы конкурентный lookup не видел полтаблицы
+        self._bounds, self._baskets = [row[0] for row in rows], [row[1] for row in rows]
+
+    @property
+    def table(self) -> list[tuple[int, str]]:
+        """Текущая таблица: (последний vol, номер корзины)"""
+        return list(zip(self._bounds, self._baskets, strict=True))
+
+    async def publish(self, table: list) -> None:
+        """Замена таблицы во всех воркерах: здесь сразу, в остальных - при reload"""
+        self.load(table)
+        if not redis_client.available:
+            return
+        try:
+            await redis_client.client.set(REDIS_TABLE_KEY, json.dumps(self.table))
+        except (RedisError, OSError):
+            redis_client.mark_down()
+
+    async def reload(self) -> bool:
+        """
+        Загрузка таблицы, опубликованной в Redis
+
+        Returns:
+            Загружена ли таблица (False - в Redis её нет или Redis недоступен)
+        """
+        if not redis_client.available:
+            return False
+        try:
+            raw = await redis_client.client.get(REDIS_TABLE_KEY)
+        except (RedisError, OSError):
+            redis_client.mark_down()
+            return False
+        if raw is None:
+            return False
+        self.load(json.loads(raw))
+        return True
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                await self.reload()
+            except Exception as e:
+                print(f"Ошибка загрузки таблицы корзин WB: {e}")
+            await asyncio.sleep(settings.PARSER_WB_BASKETS_RELOAD_INTERVAL)
+
+    def start(self) -> None:
+        """Запуск перечитывания таблицы (при старте приложения)"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        """Остановка перечитывания таблицы"""
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    def lookup(self, vol: int) -> str | None:
+        """Корзина из таблицы или из найденных пробой; None - vol неизвестен"""
+        bounds, baskets = self._bounds, self._baskets
+        index = bisect_left(bounds, vol)
+        if index < len(bounds):
+            return baskets[index]
+        lower, upper = self.neighbours(vol)
+        return lower if lower is not None and lower == upper else None
+
+    def neighbours(self, vol: int) -> tuple[str | None, str | None]:
+        """Корзины ближайших найденных пробой vol: (не больше vol, не меньше vol)"""
+        vols = self._learned_vols
+        index = bisect_left(vols, vol)
+        if index < len(vols) and vols[index] == vol:
+            return self._learned[vol], self._learned[vol]
+        lower = self._learned[vols[index - 1]] if index > 0 else None
+        upper = self._learned[vols[index]] if index < len(vols) else None
+        return lower, upper
+
+    def fallback(self) -> str:
+        """Последняя известная корзина (если проба выключена или не помогла)"""
+        return self._baskets[-1]
+
+    def learn(self, vol: int, basket: str) -> None:
+        """Запомнить корзину, найденную пробой"""
+        if vol not in self._learned:
+            insort(self._learned_vols, vol)
+        self._learned[vol] = basket
+
+    async def refresh(self, vol: int) -> None:
+        """Подтянуть из Redis соседние точки, найденные другими воркерами"""
+        if not redis_client.available:
+            return
+        # Тот же vol недавно спрашивали - ответ (в том числе пустой) уже учтён
+        now = time.monotonic()
+        refreshed_at = self._refreshed.get(vol)
+        if refreshed_at is not None and now - refreshed_at < settings.PARSER_WB_BASKET_REFRESH_TTL:
+            return
+        self._refreshed[vol] = now
+        try:
+            async with redis_client.client.pipeline(transaction=False) as pipe:
+                pipe.zrevrangebyscore(REDIS_LEARNED_KEY, vol, "-inf", start=0, num=1)
+                pipe.zrangebyscore(REDIS_LEARNED_KEY, vol, "+inf", start=0, num=1)
+                below, above = await pipe.execute()
+        except (RedisError, OSError):
+            redis_client.mark_down()
+            return
+        for member in [*below, *above]:
+            learned_vol, _, basket = member.partition(":")
+            self.learn(int(learned_vol), basket)
+
+    async def resolve(self, article: str) -> str:
+        """
+        Корзина для артикула
+
+        Сначала таблица, затем найденные ранее, затем (если включено)
+        проба хостов. Если ничего не помогло - последняя известная корзина.
+        """
+        vol = int(article) // 100000
+        basket = self.lookup(vol)
+        if basket is not None:
+            return basket
+
+        await self.refresh(vol)
+        basket = self.lookup(vol)
+        if basket is not None:
+            return basket
+
+        if settings.PARSER_WB_BASKET_PROBE:
+            basket = await self.probe(article)
+            if basket is not None:
+                return basket
+
+        return self.fallback()
+
+    async def probe(self, article: str) -> str | None:
+        """
+        Поиск корзины перебором хостов
+
+        Перебор начинается с корзины ближайшего меньшего найденного vol
+        (или со следующей после таблицы) и не заходит за корзину ближайшего
+        большего. Все кандидаты проверяются параллельно HEAD-запросом
+        к card.json товара.
+        """
+        vol = int(article) // 100000
+        part = int(article) // 1000
+
+        failed_at = self._failed_probes.get(vol)
+        if failed_at is not None and time.monotonic() - failed_at < PROBE_RETRY_INTERVAL:
+            return None
+
+        lower, upper = self.neighbours(vol)
+        first = int(lower) if lower is not None else int(self.fallback()) + 1
+        last = first + settings.PARSER_WB_BASKET_PROBE_RANGE - 1
+        if upper is not None:
+            last = min(last, int(upper))
+        candidates = [str(n).zfill(2) for n in range(first, last + 1)]
+
+        async def check(basket: str) -> str | None:
+            url = f"https://{basket_host(basket)}/vol{vol}/part{part}/{article}/info/ru/card.json"
+            try:
+                response = await parser_http_client.client.head(url, timeout=settings.PARSER_WB_BASKET_PROBE_TIMEOUT)
+            except Exception:
+                return None
+            return basket if response.status_code == 200 else None
+
+        found = [basket for basket in await asyncio.gather(*[check(b) for b in candidates]) if basket]
+        if not found:
+            self._failed_probes[vol] = time.monotonic()
+            return None
+
+        basket = found[0]
+        self.learn(vol, basket)
+        if redis_client.available:
+            try:
+                await redis_client.client.zadd(REDIS_LEARNED_KEY, {f"{vol}:{basket}": vol})
+            except (RedisError, OSError):
+                redis_client.mark_down()
+        return basket
+
+
+# Глобальная таблица корзин
+basket_resolver = BasketResolver()
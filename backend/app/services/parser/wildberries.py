@@ -6,9 +6,13 @@
 import re
 import json
 
+from app.config import settings
 from app.models.item import MarketplaceType
 from app.schemas.item import ParsedItemData
 from app.services.parser.base import BaseParser
+from app.services.parser.batching import MicroBatcher
+from app.services.parser.circuit import HostUnavailableError
+from app.services.parser.wb_baskets import BasketResolver, basket_host, basket_resolver
 
 
 class WildberriesParser(BaseParser):
@@ -22,9 +26,22 @@ class WildberriesParser(BaseParser):
     - https://www.wb.ru/catalog/123456789/detail.aspx
     """
 
+    marketplace = MarketplaceType.wildberries
+    domains = ("wildberries.ru", "wb.ru")
+
+    def __init__(self, baskets: BasketResolver | None = None):
+        super().__init__()
+        self.baskets = baskets or basket_resolver
+        # Запросы карточек за короткое окно уходят одним запросом с nm=1;2;3
+        self.cards = MicroBatcher(
+            self._fetch_cards,
+            window=settings.PARSER_WB_BATCH_WINDOW,
+            max_size=settings.PARSER_WB_BATCH_MAX_SIZE,
+        )
+
     def can_parse(self, url: str) -> bool:
         """Проверка, является ли ссылка ссылкой на Wildberries"""
-        return "wildberries.ru" in url or "wb.ru" in url
+        return self.matches_host(url)
 
     async def parse(self, url: str) -> ParsedItemData:
         """
@@ -44,9 +61,8 @@ class WildberriesParser(BaseParser):
             data = await self._fetch_from_api(article)
 
             if not data:
-                return ParsedItemData(
-                    success=False,
-                    error=f"Товар с артикулом {article} не найден на Wildberries. Возможно, товар снят с продажи или ссылка неверна."
+                return self.not_found_result(
+                    f"Товар с артикулом {article} не найден на Wildberries. Возможно, товар снят с продажи или ссылка неверна."
                 )
 
             # Извлекаем данные
@@ -59,7 +75,8 @@ class WildberriesParser(BaseParser):
                 title = f"{brand} / {title}"
 
             # Генерируем URL изображений
-            images = self._generate_image_urls(article)
+            basket = await self.baskets.resolve(article)
+            images = await self.verify_images(self._generate_image_urls(article, basket))
 
             return ParsedItemData(
                 title=title,
@@ -71,48 +88,59 @@ class WildberriesParser(BaseParser):
                 success=True
             )
 
+        except HostUnavailableError:
+            raise
         except Exception as e:
-            return ParsedItemData(
-                success=False,
-                error=f"Ошибка парсинга: {str(e)}"
-            )
+            return self.error_result(e)
 
     async def _fetch_from_api(self, article: str) -> dict | None:
         """
         Получение данных через публичное API Wildberries
 
-        API возвращает данные в формате JSON
+        Запрос попадает в ближайший пакет MicroBatcher.
+        None означает, что API ответило, но товара с таким артикулом нет;
+        сетевые ошибки пробрасываются (их нельзя кэшировать как "не найден").
         """
-        try:
-            import httpx
+        return await self.cards.get(article)
+
+    async def _fetch_cards(self, articles: list[str]) -> dict[str, dict]:
+        """
+        Загрузка нескольких карточек одним запросом
 
-            # Определяем корзину (basket) для товара
-            vol = int(article) // 100000
-            part = int(article) // 1000
+        API возвращает данные в формате JSON, артикулы передаются через ";"
 
-            # URL к публичному API Wildberries v2
-            api_url = f"https://card.wb.ru/cards/v2/detail?nm={article}"
+        Returns:
+            Словарь {артикул: данные товара}
+        """
+        # URL к публичному API Wildberries v2
+        api_url = f"https://card.wb.ru/cards/v2/detail?nm={';'.join(articles)}"
 
-            async with httpx.AsyncClient(timeout=10, follow_redirects=True) as client:
-                headers = {
-                    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-                }
-                response = await client.get(api_url, headers=headers)
-                response.raise_for_status()
+        try:
+            response = await self.http.client.get(api_url)
+            response.raise_for_status()
+        except Exception as e:
+            print(f"Ошибка при запросе к API Wildberries: {e}")
+            raise
 
-                result = response.json()
+        result = response.json()
 
-                # Извлекаем данные товара
-                if 'data' in result and 'products' in result['data']:
-                    products = result['data']['products']
-                    if products and len(products) > 0:
-                        return products[0]
+        # Раскладываем товары по артикулам
+        products = {}
+        if 'data' in result and 'products' in result['data']:
+            for product in result['data']['products'] or []:
+                products[str(product.get('id'))] = product
 
-                return None
+        return products
 
-        except Exception as e:
-            print(f"Ошибка при запросе к API Wildberries: {e}")
-            return None
+    def image_variants(self, url: str) -> list[str]:
+        """WebP, затем JPEG (корзины хранят оба формата)"""
+        if url.endswith(".webp"):
+            return [url, url[:-len(".webp")] + ".jpg"]
+        return [url]
+
+    def get_product_id(self, url: str) -> str | None:
+        """Канонический ID товара - артикул"""
+        return self._extract_article(url)
 
     def _extract_article(self, url: str) -> str | None:
         """Извлечение артикула товара из URL"""
@@ -121,12 +149,16 @@ class WildberriesParser(BaseParser):
             return match.group(1)
         return None
 
-    def _generate_image_urls(self, article: str) -> list:
+    def _generate_image_urls(self, article: str, basket: str | None = None) -> list:
         """
         Генерация URL изображений по схеме Wildberries
 
         Wildberries хранит изображения по схеме:
-        https://basket-{XX}.wb.ru/vol{vol}/part{part}/{article}/images/big/1.jpg
+        https://basket-{XX}.wbbasket.ru/vol{vol}/part{part}/{article}/images/big/1.jpg
+
+        Args:
+            article: Артикул товара
+            basket: Номер корзины (если не передан - по таблице без пробы)
         """
         images = []
 
@@ -138,38 +170,10 @@ class WildberriesParser(BaseParser):
             part = article_int // 1000
 
             # Определяем номер корзины (basket)
-            if vol >= 0 and vol <= 143:
-                basket = "01"
-            elif vol >= 144 and vol <= 287:
-                basket = "02"
-            elif vol >= 288 and vol <= 431:
-                basket = "03"
-            elif vol >= 432 and vol <= 719:
-                basket = "04"
-            elif vol >= 720 and vol <= 1007:
-                basket = "05"
-            elif vol >= 1008 and vol <= 1061:
-                basket = "06"
-            elif vol >= 1062 and vol <= 1115:
-                basket = "07"
-            elif vol >= 1116 and vol <= 1169:
-                basket = "08"
-            elif vol >= 1170 and vol <= 1313:
-                basket = "09"
-            elif vol >= 1314 and vol <= 1601:
-                basket = "10"
-            elif vol >= 1602 and vol <= 1655:
-                basket = "11"
-            elif vol >= 1656 and vol <= 1919:
-                basket = "12"
-            elif vol >= 1920 and vol <= 2045:
-                basket = "13"
-            elif vol >= 2046 and vol <= 2189:
-                basket = "14"
-            else:
-                basket = "15"
-
-            base_url = f"https://basket-{basket}.wbbasket.ru/vol{vol}/part{part}/{article}/images/big/"
+            if basket is None:
+                basket = self.baskets.lookup(vol) or self.baskets.fallback()
+
+            base_url = f"https://{basket_host(basket)}/vol{vol}/part{part}/{article}/images/big/"
 
             # Генерируем URL для первых 5 изображений
             for i in range(1, 6):
@@ -7,14 +7,18 @@
 
 Места для доработки отмечены комментариями TODO: OFFICIAL API
 """
-import json
 import re
+from urllib.parse import urlsplit
 
 from bs4 import BeautifulSoup
 
 from app.models.item import MarketplaceType
-from app.schemas.item import ParsedItemData
-from app.services.parser.base import BaseParser
+from app.schemas.item import ParsedItemData, ParseErrorKind
+from app.services.parser.base import BaseParser, ProductNotFoundError
+from app.services.parser.circuit import HostUnavailableError
+from app.services.parser.executor import parse_executor
+from app.services.parser.metadata import PageMetadata, scan_metadata
+from app.services.parser.revalidation import NotModifiedError
 
 
 class YandexMarketParser(BaseParser):
@@ -26,9 +30,14 @@ class YandexMarketParser(BaseParser):
     - https://ya.ru/product/123456789 (короткая ссылка)
     """
 
+    marketplace = MarketplaceType.yandex_market
+    domains = ("market.yandex.ru",)
+    # Сколько изображений галереи брать (первые)
+    gallery_size = 5
+
     def can_parse(self, url: str) -> bool:
         """Проверка, является ли ссылка ссылкой на Яндекс.Маркет"""
-        return ("market.yandex.ru" in url or "m.market.yandex.ru" in url) and "/product/" in url
+        return self.matches_host(url) and "/product/" in urlsplit(url).path
 
     async def parse(self, url: str) -> ParsedItemData:
         """
@@ -52,23 +61,23 @@ class YandexMarketParser(BaseParser):
             # if settings.YANDEX_MARKET_API_KEY:
             #     return await self._parse_via_api(product_id)
 
-            # Загружаем HTML страницы
-            html = await self.fetch_html(url)
+            # Загружаем HTML страницы: если название и цена нашлись в <head>,
+            # из <body> дочитывается только галерея
+            html = await self.fetch_html(url, enough=self._has_enough, gallery=self._has_gallery)
 
             if not html:
                 return ParsedItemData(
                     success=False,
-                    error="Не удалось загрузить страницу товара"
+                    error="Не удалось загрузить страницу товара",
+                    error_kind=ParseErrorKind.empty
                 )
 
-            # Парсим HTML
-            soup = BeautifulSoup(html, 'html.parser')
-
-            # Извлекаем данные
-            title = self._extract_title(soup)
-            price = self._extract_price_value(soup)
-            images = self._extract_images(soup)
-            description = self._extract_description(soup)
+            # Разбираем HTML в пуле, чтобы не блокировать event loop
+            data = await parse_executor.run(self.extract, html)
+            title = data["title"]
+            description = data["description"]
+            price = data["price"]
+            images = await self.verify_images(data["images"])
 
             return ParsedItemData(
                 title=title,
@@ -81,11 +90,19 @@ class YandexMarketParser(BaseParser):
                 success=True
             )
 
+        except ProductNotFoundError:
+            return self.not_found_result()
+
+        except (HostUnavailableError, NotModifiedError):
+            # Лимит хоста и "страница не изменилась" обрабатывает ProductParserService
+            raise
+
         except Exception as e:
-            return ParsedItemData(
-                success=False,
-                error=f"Ошибка парсинга: {str(e)}"
-            )
+            return self.error_result(e)
+
+    def get_product_id(self, url: str) -> str | None:
+        """Канонический ID товара - числовой ID из URL"""
+        return self._extract_product_id(url)
 
     def _extract_product_id(self, url: str) -> str | None:
         """Извлечение ID товара из URL"""
@@ -95,49 +112,71 @@ class YandexMarketParser(BaseParser):
             return match.group(1)
         return None
 
-    def _extract_title(self, soup: BeautifulSoup) -> str | None:
-        """Извлечение названия товара"""
-        # Ищем в JSON-LD
-        json_ld = soup.find('script', type='application/ld+json')
-        if json_ld:
-            try:
-                data = json.loads(json_ld.string)
-                if 'name' in data:
-                    return data['name']
-            except Exception:
-                pass
+    def image_variants(self, url: str) -> list[str]:
+        """Увеличенное изображение, затем оригинал"""
+        if "/800x800/" in url:
+            return [url, url.replace("/800x800/", "/orig/", 1)]
+        return [url]
 
-        # Ищем в мета-тегах
-        og_title = soup.find('meta', property='og:title')
-        if og_title:
-            return og_title.get('content')
+    @classmethod
+    def extract(cls, html: str) -> dict:
+        """
+        Извлечение данных из HTML (выполняется в пуле parse_executor)
 
-        # Ищем в заголовке
-        title_tag = soup.find('h1')
-        if title_tag:
-            return title_tag.get_text(strip=True)
+        Сначала один потоковый проход по метаданным (JSON-LD, мета-теги,
+        <h1>, <img>); полный DOM строится, только если цены там не нашлось.
 
-        return None
+        Returns:
+            Словарь с ключами title, description, price, images
+        """
+        page = scan_metadata(html)
+
+        price = cls._extract_price_value(page)
+        if price is None:
+            # Запасной путь: цена в JavaScript-данных страницы
+            price = cls._extract_price_from_dom(BeautifulSoup(html, 'html.parser'))
+
+        return {
+            "title": cls._extract_title(page),
+            "description": page.first('og:description'),
+            "price": price,
+            "images": cls._extract_images(page),
+        }
+
+    @classmethod
+    def _has_enough(cls, page: PageMetadata) -> bool:
+        """Хватает ли данных из <head>, чтобы не разбирать <body> целиком"""
+        return bool(cls._extract_title(page) and cls._extract_price_value(page) is not None)
+
+    @classmethod
+    def _has_gallery(cls, page: PageMetadata) -> bool:
+        """Прочитана ли галерея целиком (дальше <body> не нужен)"""
+        return len(cls._gallery(page)) >= cls.gallery_size
+
+    @classmethod
+    def _gallery(cls, page: PageMetadata) -> list[str]:
+        """Изображения галереи среди прочитанных <img>"""
+        return [src for src in page.img_sources if re.search(r'avatars\.(mds\.)?yandex', src, re.I)]
+
+    @classmethod
+    def _extract_title(cls, page: PageMetadata) -> str | None:
+        """Извлечение названия товара"""
+        # Ищем в JSON-LD
+        product = page.product()
+        if product and product.get('name'):
+            return product['name']
 
-    def _extract_description(self, soup: BeautifulSoup) -> str | None:
-        """Извлечение описания"""
-        og_description = soup.find('meta', property='og:description')
-        if og_description:
-            return og_description.get('content')
-        return None
+        # Ищем в мета-тегах, затем в заголовке
+        return page.first('og:title') or page.h1
 
-    def _extract_price_value(self, soup: BeautifulSoup) -> float | None:
-        """Извлечение цены"""
-        # Ищем в JSON-LD
-        json_ld = soup.find('script', type='application/ld+json')
-        if json_ld:
-            try:
-                data = json.loads(json_ld.string)
-                if 'offers' in data and 'price' in data['offers']:
-                    return float(data['offers']['price'])
-            except Exception:
-                pass
+    @classmethod
+    def _extract_price_value(cls, page: PageMetadata) -> float | None:
+        """Извлечение цены из JSON-LD"""
+        return page.product_price()
 
+    @classmethod
+    def _extract_price_from_dom(cls, soup: BeautifulSoup) -> float | None:
+        """Извлечение цены из JavaScript-данных страницы"""
         # Яндекс.Маркет часто использует React и данные в JavaScript
         # Ищем в data-атрибутах или JavaScript переменных
         script_tags = soup.find_all('script')
@@ -154,26 +193,25 @@ class YandexMarketParser(BaseParser):
 
         return None
 
-    def _extract_images(self, soup: BeautifulSoup) -> list:
+    @classmethod
+    def _extract_images(cls, page: PageMetadata) -> list:
         """Извлечение изображений"""
         images = []
 
         # Ищем в мета-тегах
-        og_image = soup.find('meta', property='og:image')
-        if og_image:
-            img_url = og_image.get('content')
+        img_url = page.first('og:image')
+        if img_url:
             # Увеличиваем размер изображения если возможно
             img_url = re.sub(r'/\d+x\d+/', '/800x800/', img_url)
             images.append(img_url)
 
-        # Ищем изображения в галерее
-        img_tags = soup.find_all('img', src=re.compile(r'avatars\.(mds\.)?yandex', re.I))
+        # Ищем изображения в галерее (если <body> читался)
+        gallery = cls._gallery(page)
 
-        for img in img_tags[:5]:  # Первые 5 изображений
-            src = img.get('src')
-            if src and src not in images:
-                # Увеличиваем размер
-                src = re.sub(r'/\d+x\d+/', '/800x800/', src)
+        for src in gallery[:cls.gallery_size]:
+            # Увеличиваем размер
+            src = re.sub(r'/\d+x\d+/', '/800x800/', src)
+            if src not in images:
                 images.append(src)
 
         return images
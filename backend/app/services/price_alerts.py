@@ -0,0 +1,185 @@
+"""
+Уведомления о снижении цен
+
+Вход - изменения цен за цикл обновления (PriceRefreshService.run_once).
+Владельцы всех подешевевших элементов находятся одним запросом
+(элементы -> списки -> пользователи), снижения группируются по пользователю -
+одно сообщение, сколько бы товаров ни подешевело, - и отправляются в фоне
+с ограничением скорости:
+- в Telegram через WishlistBot, если пользователь вошёл через Telegram;
+- иначе на подтверждённый email, пачками по PRICE_ALERT_EMAIL_BATCH писем
+  через одно SMTP соединение.
+"""
+import asyncio
+import math
+from contextlib import suppress
+from dataclasses import dataclass, field
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.models.item import ItemStatus, WishlistItem
+from app.models.user import User
+from app.models.wishlist import Wishlist
+from app.services.email import email_service
+from app.services.parser.circuit import TokenBucket
+from app.services.telegram_bot import wishlist_bot
+
+
+@dataclass
+class PriceAlert:
+    """Подешевевшие товары одного пользователя"""
+
+    user_id: int
+    email: str | None
+    telegram_id: int | None
+    drops: list[dict] = field(default_factory=list)  # title, link, old_price, new_price
+
+
+def is_drop(old_price: float | None, new_price: float) -> bool:
+    """Снижение цены, о котором стоит уведомить"""
+    if not old_price or new_price >= old_price:
+        return False
+    return (old_price - new_price) / old_price * 100 >= settings.PRICE_ALERT_MIN_DROP_PERCENT
+
+
+class PriceAlertService:
+    """
+    Сбор и отправка уведомлений о снижении цен
+
+    Метрики (stats):
+    - alerts - пользователей с уведомлением
+    - telegram - отправлено сообщений в Telegram
+    - email - отправлено писем
+    - failed - не удалось отправить
+    """
+
+    def __init__(self):
+        self._background: set[asyncio.Task] = set()
+        self.stats = {
+            "alerts": 0,
+            "telegram": 0,
+            "email": 0,
+            "failed": 0,
+        }
+
+    async def collect(self, db: AsyncSession, changes: list) -> list[PriceAlert]:
+        """
+        Уведомления по изменениям цен (PriceChange) - один запрос на все элементы
+
+        Один товар в нескольких списках пользователя попадает в сообщение один раз.
+        """
+        changes_by_item = {
+            item_id: change
+            for change in changes
+            if is_drop(change.old_price, change.new_price)
+            for item_id in change.item_ids
+        }
+        if not changes_by_item:
+            return []
+
+        rows = await db.execute(
+            select(User.id, User.email, User.is_verified, User.telegram_id,
+                   WishlistItem.id, WishlistItem.title, WishlistItem.link)
+            .join(Wishlist, Wishlist.owner_id == User.id)
+            .join(WishlistItem, WishlistItem.wishlist_id == Wishlist.id)
+            .where(
+                WishlistItem.id.in_(changes_by_item),
+                WishlistItem.status != ItemStatus.purchased,
+                User.is_active.is_(True),
+            )
+            .order_by(User.id, WishlistItem.id)
+        )
+
+        alerts: dict[int, PriceAlert] = {}
+        seen: set[tuple[int, str]] = set()
+        for user_id, email, is_verified, telegram_id, item_id, title, link in rows:
+            change = changes_by_item[item_id]
+            if (user_id, change.key) in seen:
+                continue
+            seen.add((user_id, change.key))
+
+            alert = alerts.get(user_id)
+            if alert is None:
+                alert = alerts[user_id] = PriceAlert(
+                    user_id=user_id,
+                    email=email if is_verified else None,
+                    telegram_id=telegram_id,
+                )
+            alert.drops.append({
+                "title": title,
+                "link": link,
+                "old_price": change.old_price,
+                "new_price": change.new_price,
+            })
+        return list(alerts.values())
+
+    async def send(self, alerts: list[PriceAlert]) -> None:
+        """Отправка уведомлений: Telegram и email параллельно, каждый со своим лимитом"""
+        limit = settings.PRICE_ALERT_MAX_ITEMS
+        telegram, emails = [], []
+        for alert in alerts:
+            if alert.telegram_id and wishlist_bot.app:
+                telegram.append(alert)
+            elif alert.email:
+                emails.append(email_service.price_drop_message(
+                    alert.email, alert.drops[:limit], max(len(alert.drops) - limit, 0)
+                ))
+        self.stats["alerts"] += len(alerts)
+        await asyncio.gather(self._send_telegram(telegram), self._send_emails(emails))
+
+    async def notify(self, db: AsyncSession, changes: list) -> list[PriceAlert]:
+        """Собрать уведомления и отправить их в фоне (не задерживая цикл обновления цен)"""
+        if not settings.PRICE_ALERT_ENABLED:
+            return []
+        alerts = await self.collect(db, changes)
+        if alerts:
+            task = asyncio.create_task(self.send(alerts))
+            self._background.add(task)
+            task.add_done_callback(self._background.discard)
+        return alerts
+
+    async def stop(self) -> None:
+        """Отмена неотправленных уведомлений (при остановке приложения)"""
+        for task in list(self._background):
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+
+    async def _send_telegram(self, alerts: list[PriceAlert]) -> None:
+        limit = settings.PRICE_ALERT_MAX_ITEMS
+        bucket = self._bucket(settings.PRICE_ALERT_TELEGRAM_RATE)
+        for alert in alerts:
+            await self._pace(bucket)
+            sent = await wishlist_bot.send_price_drops(
+                alert.telegram_id, alert.drops[:limit], max(len(alert.drops) - limit, 0)
+            )
+            self.stats["telegram" if sent else "failed"] += 1
+
+    async def _send_emails(self, messages: list) -> None:
+        bucket = self._bucket(settings.PRICE_ALERT_EMAIL_RATE)
+        batch_size = settings.PRICE_ALERT_EMAIL_BATCH
+        for start in range(0, len(messages), batch_size):
+            batch = messages[start:start + batch_size]
+            try:
+                sent = await email_service.send_messages(batch, before_send=lambda: self._pace(bucket))
+            except Exception as e:
+                print(f"Ошибка отправки уведомлений о ценах на email: {e}")
+                sent = 0
+            self.stats["email"] += sent
+            self.stats["failed"] += len(batch) - sent
+
+    @staticmethod
+    def _bucket(rate: float) -> TokenBucket:
+        return TokenBucket(rate, burst=max(int(rate), 1))
+
+    @staticmethod
+    async def _pace(bucket: TokenBucket) -> None:
+        wait = bucket.reserve(max_wait=math.inf)
+        if wait:
+            await asyncio.sleep(wait)
+
+
+# Глобальный сервис уведомлений о ценах
+price_alerts = PriceAlertService()
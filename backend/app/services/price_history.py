@@ -0,0 +1,191 @@
+"""
+История цен товаров
+
+Хранение компактное:
+- точка пишется только при изменении цены (подряд идущие одинаковые цены
+  не дублируются), поэтому цена действует от своей точки до следующей;
+- точки старше PRICE_HISTORY_RAW_DAYS прореживаются до одной в день
+  (последняя цена дня - та, что действовала на его конец).
+
+Диапазоны и "минимальная цена за N дней" читаются по индексу
+(product_key, recorded_at) и считаются сразу для многих товаров.
+"""
+from datetime import datetime, time, timedelta
+
+from sqlalchemy import and_, delete, func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.models.price import PricePoint
+
+# Сколько точек удалять одним DELETE ... WHERE id IN (...)
+COMPACT_DELETE_BATCH = 500
+
+
+class PriceHistoryService:
+    """Запись и чтение истории цен по ключу товара"""
+
+    async def last_prices(self, db: AsyncSession, keys: list[str], before: datetime | None = None) -> dict[str, float]:
+        """
+        Последняя известная цена каждого товара
+
+        Args:
+            keys: Ключи товаров
+            before: Цена, действовавшая на этот момент (по умолчанию - текущая)
+        """
+        if not keys:
+            return {}
+
+        latest = select(PricePoint.product_key, func.max(PricePoint.recorded_at).label("recorded_at")).where(
+            PricePoint.product_key.in_(keys)
+        )
+        if before is not None:
+            latest = latest.where(PricePoint.recorded_at < before)
+        latest = latest.group_by(PricePoint.product_key).subquery()
+
+        rows = await db.execute(
+            select(PricePoint.product_key, PricePoint.price).join(
+                latest,
+                and_(
+                    PricePoint.product_key == latest.c.product_key,
+                    PricePoint.recorded_at == latest.c.recorded_at,
+                ),
+            )
+        )
+        return {key: float(price) for key, price in rows}
+
+    async def record_many(
+        self,
+        db: AsyncSession,
+        prices: dict[str, float],
+        recorded_at: datetime | None = None
+    ) -> dict[str, float | None]:
+        """
+        Записать цены товаров (только изменившиеся)
+
+        Коммит - на вызывающей стороне.
+
+        Args:
+            prices: Ключ товара -> текущая цена
+
+        Returns:
+            Изменившиеся товары: ключ -> предыдущая цена (None - первая точка)
+        """
+        recorded_at = recorded_at or datetime.utcnow()
+        # Цены хранятся с точностью до копейки - так и сравниваем
+        prices = {key: round(price, 2) for key, price in prices.items()}
+        previous = await self.last_prices(db, list(prices))
+
+        changed = {key: previous.get(key) for key, price in prices.items() if previous.get(key) != price}
+        if changed:
+            await db.execute(
+                insert(PricePoint),
+                [{"product_key": key, "price": prices[key], "recorded_at": recorded_at} for key in changed],
+            )
+        return changed
+
+    async def history(
+        self,
+        db: AsyncSession,
+        key: str,
+        since: datetime,
+        until: datetime | None = None
+    ) -> list[tuple[datetime, float]]:
+        """
+        Точки истории товара за период
+
+        Первой идёт цена, действовавшая на начало периода (если она известна),
+        с временем since.
+        """
+        query = select(PricePoint.recorded_at, PricePoint.price).where(
+            PricePoint.product_key == key,
+            PricePoint.recorded_at >= since,
+        )
+        if until is not None:
+            query = query.where(PricePoint.recorded_at < until)
+        rows = await db.execute(query.order_by(PricePoint.recorded_at))
+
+        points = [(recorded_at, float(price)) for recorded_at, price in rows]
+        start = await self.last_prices(db, [key], before=since)
+        if key in start and (not points or points[0][0] > since):
+            points.insert(0, (since, start[key]))
+        return points
+
+    async def min_prices(self, db: AsyncSession, keys: list[str], days: int | None = None) -> dict[str, float]:
+        """
+        Минимальная цена каждого товара за последние days дней
+
+        Учитывается и цена, действовавшая на начало окна: при дедупликации
+        её точка может быть старше окна.
+        """
+        if not keys:
+            return {}
+        since = datetime.utcnow() - timedelta(days=days or settings.PRICE_HISTORY_MIN_DAYS)
+
+        rows = await db.execute(
+            select(PricePoint.product_key, func.min(PricePoint.price))
+            .where(PricePoint.product_key.in_(keys), PricePoint.recorded_at >= since)
+            .group_by(PricePoint.product_key)
+        )
+        minimums = {key: float(price) for key, price in rows}
+
+        for key, price in (await self.last_prices(db, keys, before=since)).items():
+            minimums[key] = min(price, minimums.get(key, price))
+        return minimums
+
+    @staticmethod
+    def compact_cutoff(now: datetime | None = None) -> datetime:
+        """Граница прореживания: начало дня PRICE_HISTORY_RAW_DAYS дней назад"""
+        day = ((now or datetime.utcnow()) - timedelta(days=settings.PRICE_HISTORY_RAW_DAYS)).date()
+        return datetime.combine(day, time.min)
+
+    async def compact(self, db: AsyncSession, older_than: datetime | None = None, since: datetime | None = None) -> int:
+        """
+        Прореживание точек до одной в день
+
+        Остаётся последняя точка дня - цена, действовавшая на его конец,
+        поэтому last_prices, history и min_prices на границах дней видят
+        те же цены. Точка, повторяющая предыдущую оставшуюся цену, тоже
+        удаляется. Коммит - на вызывающей стороне.
+
+        Args:
+            older_than: Граница (по умолчанию compact_cutoff()); лучше начало дня
+            since: Дни до этого момента уже прорежены - не перечитываются
+
+        Returns:
+            Сколько точек удалено
+        """
+        cutoff = older_than or self.compact_cutoff()
+        query = select(PricePoint.id, PricePoint.product_key, PricePoint.recorded_at, PricePoint.price).where(
+            PricePoint.recorded_at < cutoff
+        )
+        if since is not None:
+            query = query.where(PricePoint.recorded_at >= since)
+        rows = (await db.execute(query.order_by(PricePoint.product_key, PricePoint.recorded_at, PricePoint.id))).all()
+        if not rows:
+            return 0
+
+        # Цена на начало окна - чтобы не оставить её повтор первой точкой окна
+        previous = await self.last_prices(db, list({key for _, key, _, _ in rows}), before=since) if since else {}
+
+        stale = []
+        for index, (point_id, key, recorded_at, price) in enumerate(rows):
+            following = rows[index + 1] if index + 1 < len(rows) else None
+            if following is not None and following[1] == key and following[2].date() == recorded_at.date():
+                stale.append(point_id)  # Не последняя точка дня
+            elif previous.get(key) == float(price):
+                stale.append(point_id)  # Цена не изменилась с прошлого дня
+            else:
+                previous[key] = float(price)
+
+        for start in range(0, len(stale), COMPACT_DELETE_BATCH):
+            await db.execute(
+                delete(PricePoint)
+                .where(PricePoint.id.in_(stale[start:start + COMPACT_DELETE_BATCH]))
+                .execution_options(synchronize_session=False)
+            )
+        return len(stale)
+
+
+# Глобальный сервис истории цен
+price_history = PriceHistoryService()
@@ -0,0 +1,338 @@
+"""
+Фоновое обновление цен товаров в списках желаний
+
+Каждый элемент со ссылкой на маркетплейс хранит время следующего обновления
+(WishlistItem.price_refresh_at). Цикл выбирает наступившие через частичный
+индекс по этому полю - без просмотра всей таблицы - и:
+
+1. группирует элементы по товару (тысячи элементов с одной ссылкой = один парсинг);
+2. берёт не больше PRICE_REFRESH_PRODUCTS_PER_CYCLE товаров за цикл;
+3. парсит их через ProductParserService.parse_many (кэш, лимиты маркетплейсов);
+4. записывает товары в каталог (app.services.product_catalog), цены и
+   следующее время обновления элементов - одним bulk UPDATE, а изменившиеся
+   цены - в историю цен товара (app.services.price_history);
+5. о снижении цен уведомляет владельцев (app.services.price_alerts).
+
+Интервал до следующего обновления короче для списков с близким событием
+(event_date) и для популярных списков (views_count). При нескольких воркерах
+цикл выполняет только один - через lock в Redis; от повторного парсинга тех
+же товаров (lock истёк, Redis недоступен) защищает захват элементов
+условным UPDATE перед парсингом.
+"""
+import asyncio
+import math
+import time
+from contextlib import suppress
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+
+from redis.exceptions import RedisError
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.core.redis import redis_client
+from app.database import AsyncSessionLocal
+from app.models.item import WishlistItem
+from app.models.wishlist import Wishlist
+from app.schemas.item import ParsedItemData, ParseErrorKind
+from app.services.price_alerts import price_alerts
+from app.services.price_history import price_history
+from app.services.product_catalog import product_catalog
+from app.services.product_parser import ProductParserService, product_parser
+
+REDIS_LOCK_KEY = "price:refresh:lock"
+
+# Граница прореженной истории цен (ISO дата-время)
+REDIS_COMPACTED_KEY = "price:history:compacted_until"
+
+
+@dataclass
+class ProductGroup:
+    """Элементы разных пользователей, ссылающиеся на один товар"""
+
+    key: str
+    link: str
+    items: list[tuple[int, date | None, int]] = field(default_factory=list)  # (id, event_date, views_count)
+
+
+@dataclass
+class PriceChange:
+    """Изменившаяся цена товара"""
+
+    key: str
+    old_price: float | None
+    new_price: float
+    item_ids: list[int]
+
+
+def next_refresh_at(now: datetime, event_date: date | None, views_count: int | None) -> datetime:
+    """
+    Когда обновлять цену элемента в следующий раз
+
+    Базовый интервал PRICE_REFRESH_BASE_HOURS делится на срочность события
+    (до 4 раз, если событие в пределах PRICE_REFRESH_EVENT_WINDOW_DAYS) и на
+    популярность списка (логарифм просмотров), но не короче PRICE_REFRESH_MIN_HOURS.
+    """
+    hours = settings.PRICE_REFRESH_BASE_HOURS
+
+    if event_date is not None:
+        days_left = (event_date - now.date()).days
+        window = settings.PRICE_REFRESH_EVENT_WINDOW_DAYS
+        if 0 <= days_left <= window:
+            hours /= 1 + 3 * (window - days_left) / window
+
+    hours /= 1 + math.log10(1 + (views_count or 0))
+    return now + timedelta(hours=max(hours, settings.PRICE_REFRESH_MIN_HOURS))
+
+
+class PriceRefreshService:
+    """
+    Планировщик обновления цен
+
+    Метрики (stats, суммарно за время работы):
+    - cycles - выполнено циклов
+    - items - элементов выбрано из очереди
+    - products - товаров спарсено
+    - updated - элементов с новой ценой
+    - failed - товаров, которые не удалось спарсить
+    - unscheduled - элементов снято с обновления (ссылка не на маркетплейс)
+    """
+
+    def __init__(self, parser: ProductParserService | None = None):
+        self.parser = parser or product_parser
+        self._task: asyncio.Task | None = None
+        self._compacted_at = 0.0
+        self._history_compacted_until: datetime | None = None
+        self.stats = {
+            "cycles": 0,
+            "items": 0,
+            "products": 0,
+            "updated": 0,
+            "failed": 0,
+            "unscheduled": 0,
+        }
+
+    @staticmethod
+    def schedule(item: WishlistItem) -> None:
+        """Поставить элемент в очередь обновления (при создании или смене ссылки)"""
+        item.price_refresh_at = datetime.utcnow() if item.link else None
+
+    async def run_once(self, db: AsyncSession) -> list[PriceChange]:
+        """
+        Один цикл обновления
+
+        Returns:
+            Изменившиеся цены (по товарам)
+        """
+        now = datetime.utcnow()
+        rows = await db.execute(
+            select(WishlistItem.id, WishlistItem.link, WishlistItem.price, Wishlist.event_date, Wishlist.views_count)
+            .join(Wishlist, Wishlist.id == WishlistItem.wishlist_id)
+            .where(WishlistItem.price_refresh_at <= now)
+            .order_by(WishlistItem.price_refresh_at)
+            .limit(settings.PRICE_REFRESH_MAX_ITEMS_PER_CYCLE)
+        )
+
+        # Группы в порядке самого просроченного элемента
+        groups: dict[str, ProductGroup] = {}
+        old_prices: dict[str, float | None] = {}
+        unsupported: list[int] = []
+        for item_id, link, price, event_date, views_count in rows:
+            self.stats["items"] += 1
+            key = self.parser.product_key(link) if link else None
+            if key is None:
+                unsupported.append(item_id)
+                continue
+
+            group = groups.get(key)
+            if group is None:
+                group = groups[key] = ProductGroup(key=key, link=link)
+                old_prices[key] = float(price) if price is not None else None
+            group.items.append((item_id, event_date, views_count))
+
+        # Бюджет цикла; остальные товары остаются в очереди до следующего цикла
+        batch = list(groups.values())[:settings.PRICE_REFRESH_PRODUCTS_PER_CYCLE]
+
+        # Элементы занимаются до парсинга: время обновления сдвигается условным
+        # UPDATE и фиксируется сразу. Другой воркер (или цикл, переживший lock)
+        # их уже не выберет, а транзакция не висит открытой на время парсинга.
+        # Если цикл упадёт, элементы вернутся в очередь как после ошибки парсинга.
+        claimed = await self._claim(
+            db, [*unsupported, *(item_id for group in batch for item_id, _, _ in group.items)], now
+        )
+        unsupported = [item_id for item_id in unsupported if item_id in claimed]
+        for group in batch:
+            group.items = [item for item in group.items if item[0] in claimed]
+        batch = [group for group in batch if group.items]
+
+        params = [{"id": item_id, "price_refresh_at": None} for item_id in unsupported]
+        self.stats["unscheduled"] += len(unsupported)
+
+        prices: dict[str, float] = {}
+        parsed: list[tuple[ProductGroup, ParsedItemData]] = []
+        async for index, result in self.parser.parse_many([group.link for group in batch]):
+            group = batch[index]
+            self.stats["products"] += 1
+            parsed.append((group, result))
+
+            if result.success and result.price:
+                self.stats["updated"] += len(group.items)
+                prices[group.key] = result.price
+            else:
+                self.stats["failed"] += 1
+
+        # Каталог обновляется по ряду на товар, элементы получают ссылку на него
+        product_ids = await product_catalog.store_many(
+            db, {group.key: result for group, result in parsed if result.success}
+        )
+        for group, result in parsed:
+            params.extend(self._item_updates(group, result, now, product_ids.get(group.key)))
+
+        changes = []
+        if prices:
+            changed = await price_history.record_many(db, prices, recorded_at=now)
+            for key, previous in changed.items():
+                # Первая точка истории - сравниваем с ценой, сохранённой в элементе
+                old_price = previous if previous is not None else old_prices[key]
+                if old_price != round(prices[key], 2):
+                    changes.append(PriceChange(
+                        key=key,
+                        old_price=old_price,
+                        new_price=prices[key],
+                        item_ids=[item_id for item_id, _, _ in groups[key].items],
+                    ))
+
+        if params:
+            # ORM bulk UPDATE по первичному ключу (executemany)
+            await db.execute(update(WishlistItem), params)
+        linked = [values["id"] for values in params if values.get("product_id") is not None]
+        if linked:
+            # Привязанные элементы больше не хранят копию описания и картинок товара
+            await product_catalog.dedupe(db, linked)
+        await db.commit()
+
+        self.stats["cycles"] += 1
+        return changes
+
+    @staticmethod
+    async def _claim(db: AsyncSession, item_ids: list[int], now: datetime) -> set[int]:
+        """Занять элементы на время цикла; возвращает те, что ещё стояли в очереди"""
+        if not item_ids:
+            return set()
+        result = await db.scalars(
+            update(WishlistItem)
+            .where(WishlistItem.id.in_(item_ids), WishlistItem.price_refresh_at <= now)
+            .values(price_refresh_at=now + timedelta(hours=settings.PRICE_REFRESH_RETRY_HOURS))
+            .returning(WishlistItem.id)
+            .execution_options(synchronize_session=False)
+        )
+        claimed = set(result)
+        await db.commit()
+        return claimed
+
+    def _item_updates(
+        self,
+        group: ProductGroup,
+        result: ParsedItemData,
+        now: datetime,
+        product_id: int | None = None
+    ) -> list[dict]:
+        """Параметры UPDATE для элементов товара"""
+        updates = []
+        for item_id, event_date, views_count in group.items:
+            values = {"id": item_id, "price_checked_at": now}
+            if product_id is not None:
+                values["product_id"] = product_id
+            if result.success:
+                values["price_refresh_at"] = next_refresh_at(now, event_date, views_count)
+                if result.price:
+                    values["price"] = result.price
+            elif result.error_kind == ParseErrorKind.not_found:
+                # Товар снят с продажи - больше не обновляем
+                values["price_refresh_at"] = None
+            else:
+                values["price_refresh_at"] = now + timedelta(hours=settings.PRICE_REFRESH_RETRY_HOURS)
+            updates.append(values)
+        return updates
+
+    async def _compact_history(self, db: AsyncSession) -> None:
+        """
+        Прореживание истории цен раз в PRICE_HISTORY_COMPACT_HOURS
+
+        Прореживаются только дни после прошлой границы (хранится в Redis
+        и в процессе): каждый день истории читается один раз.
+        """
+        now = time.monotonic()
+        if self._compacted_at and now - self._compacted_at < settings.PRICE_HISTORY_COMPACT_HOURS * 3600:
+            return
+        self._compacted_at = now
+
+        cutoff = price_history.compact_cutoff()
+        since = await self._compacted_until()
+        if since is not None and since >= cutoff:
+            return
+        await price_history.compact(db, older_than=cutoff, since=since)
+        await db.commit()
+        await self._store_compacted_until(cutoff)
+
+    async def _compacted_until(self) -> datetime | None:
+        """Граница уже прореженной истории (None - прореживать с начала)"""
+        if redis_client.available:
+            try:
+                value = await redis_client.client.get(REDIS_COMPACTED_KEY)
+            except (RedisError, OSError):
+                redis_client.mark_down()
+            else:
+                if value:
+                    return datetime.fromisoformat(value)
+        return self._history_compacted_until
+
+    async def _store_compacted_until(self, cutoff: datetime) -> None:
+        self._history_compacted_until = cutoff
+        if redis_client.available:
+            try:
+                await redis_client.client.set(REDIS_COMPACTED_KEY, cutoff.isoformat())
+            except (RedisError, OSError):
+                redis_client.mark_down()
+
+    async def _acquire_cycle(self) -> bool:
+        """Цикл выполняет один воркер: lock живёт один интервал"""
+        if not redis_client.available:
+            return True
+        try:
+            return bool(await redis_client.client.set(
+                REDIS_LOCK_KEY, "1", nx=True, ex=max(int(settings.PRICE_REFRESH_INTERVAL) - 1, 1)
+            ))
+        except (RedisError, OSError):
+            redis_client.mark_down()
+            return True
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                if await self._acquire_cycle():
+                    async with AsyncSessionLocal() as db:
+                        changes = await self.run_once(db)
+                        await price_alerts.notify(db, changes)
+                        await self._compact_history(db)
+            except Exception as e:
+                print(f"Ошибка обновления цен: {e}")
+            await asyncio.sleep(settings.PRICE_REFRESH_INTERVAL)
+
+    def start(self) -> None:
+        """Запуск фонового цикла (при старте приложения)"""
+        if settings.PRICE_REFRESH_ENABLED and self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        """Остановка фонового цикла"""
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+
+# Глобальный планировщик обновления цен
+price_refresher = PriceRefreshService()
@@ -0,0 +1,260 @@
+"""
+Общий каталог товаров маркетплейсов
+
+Результат парсинга товара хранится один раз (таблица products) и:
+- отдаётся повторными parse-url и parse-urls без парсинга, пока не старше
+  TTL кэша парсинга (PARSER_CACHE_TTL) - цены из каталога не старее, чем из кэша;
+- подставляется в элементы списков: элемент хранит ссылку на товар
+  (product_id) и только свои отличия от него (см. app.models.item.catalog_field);
+- обновляется фоновым обновлением цен - по одному ряду на товар.
+"""
+from collections.abc import AsyncIterator
+from datetime import datetime, timedelta
+
+from sqlalchemy import Text, cast, insert, select, tuple_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.models.item import WishlistItem
+from app.models.product import Product
+from app.schemas.item import ParsedItemData
+from app.services.product_parser import ProductParserService, product_parser
+
+# Поля товара, которые элемент берёт из каталога, если не задал свои
+CATALOG_FIELDS = ("description", "image_url", "images")
+
+
+def split_key(key: str) -> tuple[str, str]:
+    """Ключ "маркетплейс:ID" -> (маркетплейс, ID)"""
+    marketplace, external_id = key.split(":", 1)
+    return marketplace, external_id
+
+
+class ProductCatalogService:
+    """Чтение и запись каталога товаров"""
+
+    def __init__(self, parser: ProductParserService | None = None):
+        self.parser = parser or product_parser
+
+    async def get(self, db: AsyncSession, key: str) -> Product | None:
+        """Товар по ключу "маркетплейс:ID" """
+        marketplace, external_id = split_key(key)
+        result = await db.execute(
+            select(Product).where(Product.marketplace == marketplace, Product.external_id == external_id)
+        )
+        return result.scalar_one_or_none()
+
+    async def store_many(self, db: AsyncSession, results: dict[str, ParsedItemData]) -> dict[str, int]:
+        """
+        Записать результаты парсинга (upsert по ключу товара)
+
+        Один путь для Postgres и SQLite: известные товары обновляются по ID,
+        новые вставляются в SAVEPOINT. Если одновременный parse-url успел
+        вставить тот же товар, ряд обновляется. Коммит - на вызывающей стороне.
+
+        Args:
+            results: Ключ товара -> успешный результат парсинга
+
+        Returns:
+            Ключ товара -> ID ряда в каталоге
+        """
+        if not results:
+            return {}
+
+        now = datetime.utcnow()
+        rows = {}
+        for key, result in results.items():
+            marketplace, external_id = split_key(key)
+            rows[key] = {
+                "marketplace": marketplace,
+                "external_id": external_id,
+                "title": result.title,
+                "description": result.description,
+                "price": result.price,
+                "currency": result.currency,
+                "image_url": result.image_url,
+                "images": result.images,
+                "parsed_at": now,
+            }
+
+        ids = await self._ids(db, list(rows))
+        if ids:
+            # ORM bulk UPDATE по первичному ключу (executemany)
+            await db.execute(update(Product), [{"id": ids[key], **rows[key]} for key in ids])
+
+        missing = [{**row, "created_at": now} for key, row in rows.items() if key not in ids]
+        if not missing:
+            return ids
+        try:
+            async with db.begin_nested():
+                await db.execute(insert(Product), missing)
+        except IntegrityError:
+            # Товар одновременно записал другой запрос - пишем по одному
+            for row in missing:
+                await self._insert_or_update(db, row)
+        return await self._ids(db, list(rows))
+
+    @staticmethod
+    async def _ids(db: AsyncSession, keys: list[str]) -> dict[str, int]:
+        """Ключ товара -> ID ряда для товаров, уже записанных в каталог"""
+        result = await db.execute(
+            select(Product.id, Product.marketplace, Product.external_id).where(
+                tuple_(Product.marketplace, Product.external_id).in_([split_key(key) for key in keys])
+            )
+        )
+        return {f"{marketplace}:{external_id}": product_id for product_id, marketplace, external_id in result}
+
+    @staticmethod
+    async def _insert_or_update(db: AsyncSession, row: dict) -> None:
+        """Записать один товар: вставка, а при конфликте ключа - обновление"""
+        try:
+            async with db.begin_nested():
+                await db.execute(insert(Product), [row])
+        except IntegrityError:
+            values = {name: value for name, value in row.items() if name != "created_at"}
+            await db.execute(
+                update(Product)
+                .where(Product.marketplace == row["marketplace"], Product.external_id == row["external_id"])
+                .values(**values)
+            )
+
+    def product_key(self, url: str) -> str | None:
+        """Ключ товара в каталоге для ссылки (None - не товар маркетплейса)"""
+        return self.parser.product_key(url) if url and url.startswith("http") else None
+
+    @staticmethod
+    def is_fresh(product: Product) -> bool:
+        """Товар спарсен не раньше TTL кэша парсинга его маркетплейса"""
+        ttl = settings.PARSER_CACHE_TTL.get(product.marketplace, settings.PARSER_CACHE_TTL["other"])
+        return product.parsed_at >= datetime.utcnow() - timedelta(seconds=ttl)
+
+    async def parse_url(self, db: AsyncSession, url: str) -> ParsedItemData:
+        """
+        Парсинг товара по URL через каталог
+
+        Недавно спарсенный товар отдаётся из каталога, иначе ссылка парсится
+        и результат записывается в каталог.
+        """
+        key = self.product_key(url)
+        if key is None:
+            return await self.parser.parse_url(url)
+
+        product = await self.get(db, key)
+        if product is not None and self.is_fresh(product):
+            return self.to_parsed(product)
+
+        result = await self.parser.parse_url(url)
+        if result.success:
+            await self.store_many(db, {key: result})
+            await db.commit()
+        return result
+
+    async def parse_many(self, db: AsyncSession, urls: list[str]) -> AsyncIterator[tuple[int, ParsedItemData]]:
+        """
+        Пакетный парсинг через каталог (как parse_url для каждой ссылки)
+
+        Свежие товары каталога выбираются одним запросом и отдаются сразу,
+        остальные ссылки парсятся параллельно (ProductParserService.parse_many),
+        успешные результаты записываются в каталог по мере готовности.
+
+        Yields:
+            (индекс ссылки в urls, данные товара) - по мере готовности
+        """
+        keys = [self.product_key(url) for url in urls]
+        known = {key for key in keys if key is not None}
+        products = {}
+        if known:
+            result = await db.execute(
+                select(Product).where(
+                    tuple_(Product.marketplace, Product.external_id).in_([split_key(key) for key in known])
+                )
+            )
+            products = {f"{product.marketplace}:{product.external_id}": product for product in result.scalars()}
+
+        pending = []
+        for index, key in enumerate(keys):
+            product = products.get(key)
+            if product is not None and self.is_fresh(product):
+                yield index, self.to_parsed(product)
+            else:
+                pending.append(index)
+        if not pending:
+            return
+
+        async for position, result in self.parser.parse_many([urls[index] for index in pending]):
+            index = pending[position]
+            if result.success and keys[index] is not None:
+                await self.store_many(db, {keys[index]: result})
+                await db.commit()
+            yield index, result
+
+    async def attach(self, db: AsyncSession, item: WishlistItem) -> None:
+        """
+        Привязать элемент к товару каталога по ссылке
+
+        Поля, совпадающие с товаром, в элементе не хранятся - они читаются
+        из каталога. Очищенные владельцем ("" или []) остаются пустыми.
+        """
+        key = self.parser.product_key(item.link) if item.link else None
+        product = await self.get(db, key) if key else None
+        item.product_id = product.id if product else None
+        item.product = product
+        if product is None:
+            return
+
+        # Копии значений товара заменяются на NULL (NULL и так читается из каталога)
+        for name in CATALOG_FIELDS:
+            own = getattr(item, f"_{name}")
+            if own is not None and own == getattr(product, name):
+                setattr(item, f"_{name}", None)
+
+    @staticmethod
+    async def dedupe(db: AsyncSession, item_ids: list[int] | None = None) -> None:
+        """
+        Убрать из привязанных элементов копии полей товара
+
+        Элементы, привязанные к каталогу после создания (фоновым обновлением
+        цен), хранят описание и картинки, скопированные при парсинге. Совпадающие
+        с товаром значения заменяются на NULL - они читаются из каталога.
+        Коммит - на вызывающей стороне.
+
+        Args:
+            item_ids: Только эти элементы (None - все привязанные)
+        """
+        items = WishlistItem.__table__
+        products = Product.__table__
+        for name in CATALOG_FIELDS:
+            own, shared = items.c[name], products.c[name]
+            # JSON сравнивается как текст: в Postgres у json нет оператора =
+            if name == "images":
+                own, shared = cast(own, Text), cast(shared, Text)
+            statement = (
+                update(items)
+                .where(
+                    items.c.product_id.is_not(None),
+                    items.c[name].is_not(None),
+                    own == select(shared).where(products.c.id == items.c.product_id).scalar_subquery(),
+                )
+                .values({name: None})
+            )
+            if item_ids is not None:
+                statement = statement.where(items.c.id.in_(item_ids))
+            await db.execute(statement)
+
+    @staticmethod
+    def to_parsed(product: Product) -> ParsedItemData:
+        """Товар каталога в виде результата парсинга"""
+        return ParsedItemData(
+            title=product.title,
+            description=product.description,
+            price=float(product.price) if product.price is not None else None,
+            currency=product.currency,
+            image_url=product.image_url,
+            images=product.images or [],
+            marketplace=product.marketplace,
+        )
+
+
+# Глобальный каталог товаров
+product_catalog = ProductCatalogService()
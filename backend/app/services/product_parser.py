@@ -3,8 +3,22 @@
 
 Выбирает подходящий парсер в зависимости от URL и возвращает данные товара
 """
-from app.schemas.item import ParsedItemData
-from app.services.parser import OpenGraphParser, OzonParser, WildberriesParser, YandexMarketParser
+import asyncio
+import hashlib
+import time
+from collections.abc import AsyncIterator
+from urllib.parse import urldefrag
+
+from app.config import settings
+from app.models.item import MarketplaceType
+from app.schemas.item import ParsedItemData, ParseErrorKind
+from app.services.parser.base import BaseParser
+from app.services.parser.cache import ParseResultCache, parse_cache
+from app.services.parser.circuit import HostUnavailableError
+from app.services.parser.registry import ParserRegistry, parser_registry
+from app.services.parser.revalidation import NotModifiedError, Revalidation, current_revalidation
+from app.services.parser.singleflight import SingleFlight
+from app.services.parser.telemetry import current_marketplace, parser_telemetry
 
 
 class ProductParserService:
@@ -14,15 +28,25 @@ class ProductParserService:
     Автоматически выбирает подходящий парсер в зависимости от URL
     """
 
-    def __init__(self):
-        # Инициализируем все парсеры
-        self.parsers = [
-            WildberriesParser(),
-            OzonParser(),
-            YandexMarketParser(),
-            # OpenGraph всегда последний (fallback для любых ссылок)
-            OpenGraphParser()
-        ]
+    def __init__(self, cache: ParseResultCache | None = None, registry: ParserRegistry | None = None):
+        self.cache = cache or parse_cache
+        # Выбор парсера по домену ссылки (парсеры импортируются лениво)
+        self.registry = registry or parser_registry
+        # Одновременные запросы одного товара выполняются один раз
+        self.singleflight = SingleFlight()
+
+        # Ограничения параллелизма для пакетного парсинга (на процесс)
+        self._batch_limit = asyncio.Semaphore(settings.PARSER_BATCH_CONCURRENCY)
+        self._marketplace_limits: dict[str, asyncio.Semaphore] = {}
+
+        # Парсинги, продолжающие обновлять кэш после ответа устаревшим значением
+        self._background: set[asyncio.Task] = set()
+        self.stats = {
+            "hedged": 0,        # маркетплейс не ответил за PARSER_HEDGE_DELAY
+            "hedge_wins": 0,    # первым пришёл результат запасного парсера
+            "stale_wins": 0,    # ответили устаревшим значением из кэша
+            "not_modified": 0,  # страница не изменилась, прошлый результат переиспользован
+        }
 
     async def parse_url(self, url: str) -> ParsedItemData:
         """
@@ -41,21 +65,201 @@ class ProductParserService:
                 error="Некорректная ссылка. URL должен начинаться с http:// или https://"
             )
 
-        # Ищем подходящий парсер
-        for parser in self.parsers:
-            if parser.can_parse(url):
-                try:
-                    result = await parser.parse(url)
+        # Парсер маркетплейса по домену, затем OpenGraph (fallback для любых ссылок)
+        candidates = self.registry.candidates(url)
+        if settings.PARSER_HEDGE_ENABLED and len(candidates) > 1:
+            return await self._parse_hedged(url, candidates[0], candidates[1:])
+        return await self._parse_sequential(url, candidates)
+
+    async def parse_many(self, urls: list[str]) -> AsyncIterator[tuple[int, ParsedItemData]]:
+        """
+        Параллельный парсинг списка ссылок
+
+        Ссылки парсятся одновременно с общим лимитом PARSER_BATCH_CONCURRENCY
+        и лимитом PARSER_BATCH_PER_MARKETPLACE на каждый маркетплейс.
+
+        Args:
+            urls: Ссылки на товары
+
+        Yields:
+            (индекс ссылки в urls, данные товара) - по мере готовности
+        """
+        tasks = [asyncio.create_task(self._parse_limited(index, url)) for index, url in enumerate(urls)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # Клиент отключился - не тратим запросы к маркетплейсам впустую
+            for task in tasks:
+                task.cancel()
+
+    async def _parse_limited(self, index: int, url: str) -> tuple[int, ParsedItemData]:
+        """Парсинг одной ссылки из пакета с учётом лимитов"""
+        marketplace = self.resolve_parser(url).marketplace.value
+
+        limit = self._marketplace_limits.get(marketplace)
+        if limit is None:
+            limit = self._marketplace_limits[marketplace] = asyncio.Semaphore(settings.PARSER_BATCH_PER_MARKETPLACE)
+
+        # Сначала слот маркетплейса: ожидая его, не занимаем общий слот
+        async with limit, self._batch_limit:
+            return index, await self.parse_url(url)
+
+    def resolve_parser(self, url: str) -> BaseParser:
+        """Первый парсер, который умеет обрабатывать ссылку"""
+        return self.registry.resolve(url)
+
+    async def _parse_sequential(self, url: str, parsers: list[BaseParser]) -> ParsedItemData:
+        """Парсеры по очереди до первого приемлемого результата"""
+        results = []
+        for parser in parsers:
+            result = await self._run_parser(parser, url)
+            if self.is_acceptable(result):
+                return result
+            results.append(result)
+        # Ошибка первого парсера самая конкретная
+        return results[0]
+
+    async def _parse_hedged(self, url: str, primary: BaseParser, fallbacks: list[BaseParser]) -> ParsedItemData:
+        """
+        Парсинг с подстраховкой
+
+        Если парсер маркетплейса не ответил за PARSER_HEDGE_DELAY, отдаётся
+        устаревший результат из кэша, а если его нет - параллельно запускаются
+        запасные парсеры. Возвращается первый приемлемый результат, проигравший
+        отменяется. Неудачный ответ маркетплейса сразу передаёт ход запасным.
+        """
+        primary_task = asyncio.create_task(self._run_parser(primary, url))
+        tasks = [primary_task]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=settings.PARSER_HEDGE_DELAY)
+            if done:
+                result = primary_task.result()
+                if self.is_acceptable(result):
                     return result
-                except Exception:
-                    # Если парсер упал с ошибкой, пробуем следующий
-                    continue
-
-        # Если ни один парсер не сработал
-        return ParsedItemData(
-            success=False,
-            error="Не удалось распарсить ссылку"
-        )
+                fallback = await self._parse_sequential(url, fallbacks)
+                return fallback if self.is_acceptable(fallback) else result
+
+            self.stats["hedged"] += 1
+            stale = await self.cache.get_stale(self.cache_key(primary, url))
+            if stale is not None:
+                # Парсинг маркетплейса продолжается и обновит кэш
+                self.stats["stale_wins"] += 1
+                self._background.add(primary_task)
+                primary_task.add_done_callback(self._background.discard)
+                tasks.remove(primary_task)
+                return stale
+
+            hedge_task = asyncio.create_task(self._parse_sequential(url, fallbacks))
+            tasks.append(hedge_task)
+
+            results = {}
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    result = task.result()
+                    if self.is_acceptable(result):
+                        if task is hedge_task:
+                            self.stats["hedge_wins"] += 1
+                        return result
+                    results[task] = result
+            return results[primary_task]
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _run_parser(self, parser: BaseParser, url: str) -> ParsedItemData:
+        """Один парсер: кэш, затем парсинг через single-flight"""
+        key = self.cache_key(parser, url)
+
+        cached = await self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        try:
+            return await self.singleflight.do(
+                key,
+                lambda: self._parse_and_store(parser, url, key),
+                lambda: self.cache.get(key),
+            )
+        except HostUnavailableError:
+            # Хост ограничил нас - запрос не отправлялся
+            return ParsedItemData(
+                success=False,
+                error="Маркетплейс временно ограничил запросы, попробуйте позже",
+                error_kind=ParseErrorKind.unavailable
+            )
+        except Exception:
+            return ParsedItemData(
+                success=False,
+                error="Не удалось распарсить ссылку"
+            )
+
+    @staticmethod
+    def is_acceptable(result: ParsedItemData) -> bool:
+        """Результат окончательный: данные товара или "товар не найден" """
+        return result.success or result.error_kind == ParseErrorKind.not_found
+
+    async def _parse_and_store(self, parser: BaseParser, url: str, key: str) -> ParsedItemData:
+        """
+        Парсинг и сохранение результата в кэш
+
+        Если товар уже парсился, страница загружается условно: на 304 или
+        неизменившееся содержимое возвращается прошлый результат без разбора.
+        Время и исход парсинга учитываются в телеметрии маркетплейса.
+        """
+        previous, validators = await self.cache.get_previous(key)
+        revalidation = Revalidation(validators if previous is not None else None)
+
+        marketplace = parser.marketplace.value
+        token = current_revalidation.set(revalidation)
+        marketplace_token = current_marketplace.set(marketplace)
+        started = time.perf_counter()
+        try:
+            result = await parser.parse(url)
+        except NotModifiedError:
+            result = None
+        except HostUnavailableError:
+            parser_telemetry.count(marketplace, ParseErrorKind.unavailable.value)
+            raise
+        finally:
+            current_marketplace.reset(marketplace_token)
+            current_revalidation.reset(token)
+
+        if revalidation.not_modified and previous is not None:
+            self.stats["not_modified"] += 1
+            result = previous
+        parser_telemetry.record(marketplace, result, time.perf_counter() - started)
+
+        await self.cache.put(key, parser.marketplace.value, result, revalidation.validators)
+        return result
+
+    def product_key(self, url: str) -> str | None:
+        """
+        Канонический ключ товара маркетплейса ("маркетплейс:ID")
+
+        None - ссылка не на товар поддерживаемого маркетплейса.
+        """
+        parser = self.resolve_parser(url)
+        if parser.marketplace == MarketplaceType.other:
+            return None
+        product_id = parser.get_product_id(url)
+        return f"{parser.marketplace.value}:{product_id}" if product_id else None
+
+    def cache_key(self, parser: BaseParser, url: str) -> str:
+        """
+        Ключ кэша для ссылки
+
+        Для маркетплейсов - канонический ID товара (разные ссылки на один
+        товар дают один ключ), для остальных сайтов - хэш URL без якоря.
+        """
+        product_id = parser.get_product_id(url)
+        if product_id:
+            return f"{parser.marketplace.value}:{product_id}"
+
+        url_hash = hashlib.sha1(urldefrag(url).url.encode()).hexdigest()
+        return f"url:{url_hash}"
 
 
 # Создаём глобальный экземпляр сервиса
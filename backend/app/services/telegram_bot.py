@@ -5,13 +5,17 @@ Telegram бот для Wishlist
 - Авторизация через Telegram
 - Уведомления о бронировании подарков
 - Напоминания о событиях
+- Уведомления о снижении цен
 - Быстрые команды
 """
 
+from html import escape
+
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update, WebAppInfo
 from telegram.ext import Application, CommandHandler, ContextTypes
 
 from app.config import settings
+from app.core.utils import safe_href
 
 
 class WishlistBot:
@@ -202,6 +206,56 @@ class WishlistBot:
         except Exception as e:
             print(f"Ошибка отправки напоминания в Telegram: {e}")
 
+    async def send_price_drops(self, telegram_id: int, drops: list[dict], more: int = 0) -> bool:
+        """
+        Отправка уведомления о снижении цен (все товары одним сообщением)
+
+        Args:
+            telegram_id: Telegram ID владельца списков
+            drops: Товары - словари с ключами title, link, old_price, new_price
+            more: Сколько ещё товаров подешевело, но не вошло в сообщение
+
+        Returns:
+            Отправлено ли сообщение
+        """
+        if not self.app:
+            return False
+
+        lines = []
+        for drop in drops:
+            # Ссылку задаёт владелец списка - только http(s), с экранированием
+            href = safe_href(drop.get('link'))
+            title = escape(drop['title'])
+            if href:
+                title = f'<a href="{href}">{title}</a>'
+            lines.append(
+                f"• {title}: "
+                f"<s>{drop['old_price']:.0f} ₽</s> → <b>{drop['new_price']:.0f} ₽</b>"
+            )
+        if more:
+            lines.append(f"…и ещё {more}")
+        text = "📉 <b>Цены снизились!</b>\n\n" + "\n".join(lines)
+
+        keyboard = [
+            [InlineKeyboardButton(
+                "📋 Открыть списки",
+                web_app=WebAppInfo(url=self.webapp_url)
+            )]
+        ]
+
+        try:
+            await self.app.bot.send_message(
+                chat_id=telegram_id,
+                text=text,
+                parse_mode='HTML',
+                reply_markup=InlineKeyboardMarkup(keyboard),
+                disable_web_page_preview=True
+            )
+            return True
+        except Exception as e:
+            print(f"Ошибка отправки уведомления о ценах в Telegram: {e}")
+            return False
+
 
 # Глобальный экземпляр бота
 wishlist_bot = WishlistBot()
@@ -0,0 +1,294 @@
+"""
+Загрузка изображений (обложки списков и фото товаров)
+
+Тело multipart запроса читается потоком и пишется на диск порциями -
+файл целиком в памяти не держится, MAX_UPLOAD_SIZE проверяется по мере
+чтения. Во время записи считается sha256: файл сохраняется под хэшем
+содержимого, поэтому повторная загрузка того же файла ничего не пишет
+и возвращает ту же ссылку.
+
+Раскладка в UPLOAD_DIR:
+- images/ab/<sha256><.расширение> - исходник;
+- images/ab/<sha256>-<ширина>.webp - превью UPLOAD_VARIANT_WIDTHS (в фоне,
+  в пуле процессов прокси изображений);
+- tmp/ - файлы в процессе загрузки.
+
+Ссылки - UPLOAD_URL_PREFIX + путь: файлы неизменяемы, nginx отдаёт их
+напрямую с долгим кэшем.
+"""
+import asyncio
+import hashlib
+import os
+import uuid
+from collections.abc import AsyncIterator
+from contextlib import suppress
+from pathlib import Path
+
+from multipart.exceptions import MultipartParseError
+from multipart.multipart import MultipartParser, parse_options_header
+from PIL import Image, UnidentifiedImageError
+
+from app.config import settings
+from app.schemas.upload import UploadedImage
+from app.services.image_proxy import image_proxy, render_variant
+from app.services.parser.executor import ParseExecutor, ParseQueueFullError
+
+# Имя поля формы с файлом
+FILE_FIELD = "file"
+
+# Запас на заголовки multipart сверх MAX_UPLOAD_SIZE (для проверки Content-Length)
+MULTIPART_OVERHEAD = 16 * 1024
+
+# Формат Pillow -> расширение сохранённого файла
+FORMAT_EXTENSIONS = {"JPEG": ".jpg", "PNG": ".png", "GIF": ".gif", "WEBP": ".webp"}
+
+
+class UploadError(Exception):
+    """Файл не принят (status_code - HTTP статус ответа)"""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def identify_image(path: Path) -> tuple[str, int, int]:
+    """Формат и размеры изображения (по заголовку файла)"""
+    with Image.open(path) as image:
+        image.verify()
+        return image.format, image.width, image.height
+
+
+def render_file(source_path: str, target_path: str, width: int, quality: int, max_pixels: int) -> int:
+    """Превью файла в файл (выполняется в пуле процессов, байты не гоняются через pipe)"""
+    variant = render_variant(Path(source_path).read_bytes(), width, "webp", quality, max_pixels)
+    target = Path(target_path)
+    tmp = target.with_name(f".{target.name}.{os.getpid()}.tmp")
+    tmp.write_bytes(variant)
+    os.replace(tmp, target)
+    return len(variant)
+
+
+class FilePartReader:
+    """
+    Колбэки python-multipart: данные поля FILE_FIELD копятся в pending
+
+    Колбэки синхронные, поэтому запись на диск делает вызывающий после
+    каждой порции тела (как в starlette.formparsers).
+    """
+
+    def __init__(self):
+        self.pending: list[bytes] = []
+        self.filename: str | None = None
+        self.finished = False
+        self._header_name = b""
+        self._header_value = b""
+        self._disposition = b""
+        self._in_file = False
+
+    def callbacks(self) -> dict:
+        return {
+            "on_part_begin": self.on_part_begin,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+        }
+
+    def on_part_begin(self) -> None:
+        self._disposition = b""
+        self._in_file = False
+
+    def on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._header_name += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._header_value += data[start:end]
+
+    def on_header_end(self) -> None:
+        if self._header_name.lower() == b"content-disposition":
+            self._disposition = self._header_value
+        self._header_name = self._header_value = b""
+
+    def on_headers_finished(self) -> None:
+        _, options = parse_options_header(self._disposition)
+        if options.get(b"name") != FILE_FIELD.encode() or b"filename" not in options:
+            return  # Прочие поля формы игнорируются
+        if self.filename is not None:
+            raise UploadError(400, "Можно загрузить только один файл")
+
+        self.filename = options[b"filename"].decode("utf-8", "replace")
+        extension = Path(self.filename).suffix.lower()
+        if extension not in settings.ALLOWED_EXTENSIONS:
+            raise UploadError(400, f"Недопустимый тип файла. Разрешены: {', '.join(settings.ALLOWED_EXTENSIONS)}")
+        self._in_file = True
+
+    def on_part_data(self, data: bytes, start: int, end: int) -> None:
+        if self._in_file:
+            self.pending.append(data[start:end])
+
+    def on_part_end(self) -> None:
+        if self._in_file:
+            self.finished = True
+        self._in_file = False
+
+
+class UploadService:
+    """Приём, дедупликация и превью загруженных изображений"""
+
+    def __init__(self, executor: ParseExecutor | None = None):
+        # Превью строятся в том же пуле, что и у прокси изображений
+        self.executor = executor or image_proxy.executor
+        self._background: set[asyncio.Task] = set()
+        self.stats = {
+            "uploads": 0,
+            "deduplicated": 0,
+            "rejected": 0,
+            "variants": 0,
+        }
+
+    @property
+    def upload_dir(self) -> Path:
+        return Path(settings.UPLOAD_DIR)
+
+    def url_for(self, path: Path) -> str:
+        """Публичная ссылка на файл из UPLOAD_DIR"""
+        return f"{settings.UPLOAD_URL_PREFIX}/{path.relative_to(self.upload_dir).as_posix()}"
+
+    async def save_image(self, content_type: str, stream: AsyncIterator[bytes]) -> UploadedImage:
+        """
+        Приём изображения из multipart тела запроса
+
+        Args:
+            content_type: Заголовок Content-Type запроса (с boundary)
+            stream: Тело запроса порциями
+
+        Raises:
+            UploadError: Нет файла, недопустимый тип, не изображение или больше MAX_UPLOAD_SIZE
+        """
+        try:
+            return await self._save_image(content_type, stream)
+        except UploadError:
+            self.stats["rejected"] += 1
+            raise
+
+    async def _save_image(self, content_type: str, stream: AsyncIterator[bytes]) -> UploadedImage:
+        media_type, params = parse_options_header(content_type)
+        boundary = params.get(b"boundary")
+        if media_type != b"multipart/form-data" or not boundary:
+            raise UploadError(400, "Ожидается multipart/form-data")
+
+        reader = FilePartReader()
+        parser = MultipartParser(boundary, reader.callbacks())
+        tmp_dir = self.upload_dir / "tmp"
+        tmp_dir.mkdir(parents=True, exist_ok=True)
+        tmp = tmp_dir / f"{uuid.uuid4().hex}.part"
+
+        hasher = hashlib.sha256()
+        size = 0
+        file = await asyncio.to_thread(open, tmp, "wb")
+        try:
+            async for chunk in stream:
+                parser.write(chunk)
+                if not reader.pending:
+                    continue
+                data = b"".join(reader.pending)
+                reader.pending.clear()
+                size += len(data)
+                if size > settings.MAX_UPLOAD_SIZE:
+                    raise UploadError(413, f"Файл больше {settings.MAX_UPLOAD_SIZE // (1024 * 1024)} МБ")
+                hasher.update(data)
+                await asyncio.to_thread(file.write, data)
+            parser.finalize()
+            await asyncio.to_thread(file.close)
+
+            if not reader.finished:
+                raise UploadError(400, f"Файл не передан (поле {FILE_FIELD})")
+            return await self._store(tmp, hasher.hexdigest(), size)
+        except MultipartParseError as e:
+            file.close()
+            tmp.unlink(missing_ok=True)
+            raise UploadError(400, "Некорректное тело multipart") from e
+        except Exception:
+            file.close()
+            tmp.unlink(missing_ok=True)
+            raise
+
+    async def _store(self, tmp: Path, digest: str, size: int) -> UploadedImage:
+        """Проверка содержимого и перенос файла под хэшем"""
+        try:
+            image_format, width, height = await asyncio.to_thread(identify_image, tmp)
+        except Image.DecompressionBombError as e:
+            # Заголовок с огромными размерами: Pillow отказывает ещё в Image.open
+            raise UploadError(413, "Слишком большое разрешение изображения") from e
+        except (UnidentifiedImageError, OSError, SyntaxError) as e:
+            raise UploadError(415, "Файл не является изображением") from e
+
+        extension = FORMAT_EXTENSIONS.get(image_format)
+        if extension not in settings.ALLOWED_EXTENSIONS:
+            raise UploadError(415, "Формат изображения не поддерживается")
+        if width * height > settings.IMAGE_PROXY_MAX_PIXELS:
+            raise UploadError(413, "Слишком большое разрешение изображения")
+
+        path = self.upload_dir / "images" / digest[:2] / f"{digest}{extension}"
+        deduplicated = path.exists()
+        if deduplicated:
+            tmp.unlink(missing_ok=True)
+            self.stats["deduplicated"] += 1
+        else:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(tmp, path)
+            self.stats["uploads"] += 1
+
+        variants = {
+            variant_width: path.with_name(f"{digest}-{variant_width}.webp")
+            for variant_width in sorted(settings.UPLOAD_VARIANT_WIDTHS)
+            if variant_width < width
+        }
+        missing = {variant_width: target for variant_width, target in variants.items() if not target.exists()}
+        if missing:
+            task = asyncio.create_task(self._render_variants(path, missing))
+            self._background.add(task)
+            task.add_done_callback(self._background.discard)
+
+        return UploadedImage(
+            url=self.url_for(path),
+            size=size,
+            width=width,
+            height=height,
+            deduplicated=deduplicated,
+            variants={variant_width: self.url_for(target) for variant_width, target in variants.items()},
+        )
+
+    async def _render_variants(self, path: Path, targets: dict[int, Path]) -> None:
+        """Превью в пуле процессов (ошибка превью не влияет на загрузку)"""
+        for width, target in targets.items():
+            try:
+                await self.executor.run(
+                    render_file, str(path), str(target), width,
+                    settings.IMAGE_PROXY_QUALITY, settings.IMAGE_PROXY_MAX_PIXELS
+                )
+                self.stats["variants"] += 1
+            except ParseQueueFullError:
+                # Пул занят - превью можно получить через прокси изображений
+                print(f"Превью {target.name} пропущено: пул перегружен")
+                return
+            except Exception as e:
+                print(f"Ошибка создания превью {target.name}: {e}")
+
+    async def join(self) -> None:
+        """Дождаться фоновых превью"""
+        if self._background:
+            await asyncio.gather(*self._background, return_exceptions=True)
+
+    async def stop(self) -> None:
+        """Отмена фоновых превью (при остановке приложения)"""
+        for task in list(self._background):
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+
+
+# Глобальный приём загрузок
+upload_service = UploadService()
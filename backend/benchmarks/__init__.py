@@ -0,0 +1,3 @@
+"""
+Бенчмарки backend (запуск из каталога backend: python -m benchmarks.<модуль>)
+"""
@@ -0,0 +1,419 @@
+"""
+Бенчмарк парсеров товаров на записанных ответах маркетплейсов
+
+Корпус (benchmarks/corpus/manifest.json) - набор товаров: ссылка, парсер,
+записанные ответы (HTML страниц, JSON API) и ожидаемые поля. Ответы отдаёт
+локальный HTTP сервер, а FixtureTransport перенаправляет на него запросы
+парсеров, сохраняя исходные URL (хост - первый сегмент пути).
+
+Страницы маркетплейсов весят мегабайты, поэтому в корпусе лежит только
+значимая часть, а размер оригинала восстанавливается заполнителем перед
+</body> (padding_kib) - от него зависят байты и время чтения.
+
+Для каждого парсера считаются:
+- перцентили задержки parse() (p50/p90/p99) и медиана по каждому товару;
+- пиковая память (tracemalloc) за один parse();
+- байты, прочитанные из сети за один parse();
+- точность - доля совпавших ожидаемых полей;
+- медиана parse() с проверкой изображений (probe_p50_ms): ожидаемые
+  изображения отдаются тем же сервером, кэш проверок очищается перед
+  каждым прогоном (Redis не используется).
+
+Результат сравнивается с benchmarks/baseline.json (задержка - по медианам
+товаров и probe_p50_ms, память, байты, точность); регрессия - код выхода 1.
+
+Запуск (из каталога backend):
+    python -m benchmarks.parsers                    # прогон и сравнение с baseline
+    python -m benchmarks.parsers --update-baseline  # записать текущие значения как baseline
+    python -m benchmarks.parsers --record           # перезаписать ответы корпуса с живых сайтов
+
+Задержки зависят от машины: baseline стоит обновлять на той же машине,
+где выполняется проверка.
+"""
+import argparse
+import asyncio
+import json
+import math
+import sys
+import threading
+import time
+import tracemalloc
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import httpx
+
+from app.config import settings
+from app.services.parser import OpenGraphParser, OzonParser, WildberriesParser, YandexMarketParser
+from app.services.parser.base import BaseParser
+from app.services.parser.http import parser_http_client
+from app.services.parser.images import image_prober
+
+BENCHMARKS_DIR = Path(__file__).parent
+CORPUS_DIR = BENCHMARKS_DIR / "corpus"
+BASELINE_PATH = BENCHMARKS_DIR / "baseline.json"
+
+# Парсер корпуса -> класс парсера
+PARSERS: dict[str, type[BaseParser]] = {
+    "wildberries": WildberriesParser,
+    "ozon": OzonParser,
+    "yandex_market": YandexMarketParser,
+    "opengraph": OpenGraphParser,
+}
+
+# Допустимое отклонение от baseline: доля + абсолютный запас на шум
+LATENCY_TOLERANCE = 1.0
+LATENCY_SLACK_MS = 10.0
+MEMORY_TOLERANCE = 0.25
+MEMORY_SLACK_KIB = 64.0
+BYTES_TOLERANCE = 0.05
+
+# Ответ CDN на проверку изображения: заголовок PNG 1000x1000
+IMAGE_BODY = b"\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR\x00\x00\x03\xe8\x00\x00\x03\xe8\x08\x02\x00\x00\x00"
+
+FILLER_ROW = '<div class="tile"><a href="/product/similar-{0}/"><span>Похожий товар {0}</span></a></div>\n'
+
+
+@dataclass
+class Fixture:
+    """Записанный ответ"""
+
+    body: bytes
+    content_type: str
+    status: int = 200
+
+
+@dataclass
+class Case:
+    """Товар корпуса"""
+
+    name: str
+    parser: str
+    url: str
+    expected: dict
+    responses: list[dict] = field(default_factory=list)
+
+
+def load_corpus(corpus_dir: Path = CORPUS_DIR, padding: bool = True) -> tuple[list[Case], dict[str, Fixture]]:
+    """
+    Загрузка корпуса
+
+    Args:
+        padding: Восстанавливать размер страниц заполнителем (False - быстрый прогон)
+
+    Returns:
+        Товары и записанные ответы по исходному URL
+    """
+    manifest = json.loads((corpus_dir / "manifest.json").read_text(encoding="utf-8"))
+    cases, fixtures = [], {}
+    for data in manifest["cases"]:
+        case = Case(**data)
+        cases.append(case)
+        for response in case.responses:
+            body = (corpus_dir / response["file"]).read_bytes()
+            size = response.get("padding_kib", 0) * 1024 if padding else 0
+            if size:
+                rows = "".join(FILLER_ROW.format(i) for i in range(size // len(FILLER_ROW) + 1))
+                body = body.replace(b"</body>", rows.encode()[:size] + b"</body>", 1)
+            fixtures[response["url"]] = Fixture(
+                body=body,
+                content_type=response["content_type"],
+                status=response.get("status", 200),
+            )
+    return cases, fixtures
+
+
+class FixtureServer:
+    """Локальный HTTP сервер записанных ответов (в отдельном потоке)"""
+
+    def __init__(self, fixtures: dict[str, Fixture]):
+        self.fixtures = fixtures
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Заголовки и тело уходят отдельными записями - без Nagle не ждём delayed ACK
+            disable_nagle_algorithm = True
+
+            def do_GET(self):  # noqa: N802
+                # /{хост}/{путь}?{query} -> https://{хост}/{путь}?{query}
+                fixture = fixtures.get(f"https:/{self.path}")
+                if fixture is None:
+                    fixture = Fixture(body=b"", content_type="text/plain", status=404)
+                self.send_response(fixture.status)
+                self.send_header("Content-Type", fixture.content_type)
+                self.send_header("Content-Length", str(len(fixture.body)))
+                self.end_headers()
+                # Парсер может прекратить чтение после </head> и закрыть соединение
+                try:
+                    self.wfile.write(fixture.body)
+                except (BrokenPipeError, ConnectionResetError):
+                    self.close_connection = True
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def __enter__(self) -> "FixtureServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+
+class CountingStream(httpx.AsyncByteStream):
+    """Тело ответа со счётчиком прочитанных байт"""
+
+    def __init__(self, stream: httpx.AsyncByteStream, counter: list[int]):
+        self.stream = stream
+        self.counter = counter
+
+    async def __aiter__(self):
+        async for chunk in self.stream:
+            self.counter[0] += len(chunk)
+            yield chunk
+
+    async def aclose(self) -> None:
+        await self.stream.aclose()
+
+
+class FixtureTransport(httpx.AsyncBaseTransport):
+    """Транспорт, отправляющий запросы парсеров на FixtureServer"""
+
+    def __init__(self, port: int):
+        self.port = port
+        self.transport = httpx.AsyncHTTPTransport()
+        self.bytes_read = [0]
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        request.url = request.url.copy_with(
+            scheme="http",
+            host="127.0.0.1",
+            port=self.port,
+            raw_path=b"/" + request.url.raw_host + request.url.raw_path,
+        )
+        response = await self.transport.handle_async_request(request)
+        response.stream = CountingStream(response.stream, self.bytes_read)
+        return response
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+
+def percentile(values: list[float], q: float) -> float:
+    """Перцентиль по ближайшему рангу"""
+    ordered = sorted(values)
+    return ordered[max(math.ceil(q / 100 * len(ordered)) - 1, 0)]
+
+
+def accuracy(case: Case, result) -> tuple[int, int]:
+    """Сколько ожидаемых полей совпало (совпало, всего)"""
+    matched = 0
+    for name, expected in case.expected.items():
+        value = getattr(result, name)
+        if isinstance(expected, float):
+            matched += value is not None and abs(value - expected) < 0.01
+        else:
+            matched += value == expected
+    return matched, len(case.expected)
+
+
+async def measure(cases: list[Case], fixtures: dict[str, Fixture], iterations: int = 20) -> dict[str, dict]:
+    """
+    Прогон корпуса
+
+    Returns:
+        Метрики по парсерам: p50_ms, p90_ms, p99_ms, peak_kib, bytes, accuracy
+    """
+    report: dict[str, dict] = {}
+    # Изображения проверяются только в отдельном прогоне (probe_p50_ms)
+    image_probe, settings.PARSER_IMAGE_PROBE = settings.PARSER_IMAGE_PROBE, False
+    fixtures = {
+        **{
+            url: Fixture(body=IMAGE_BODY, content_type="image/png")
+            for case in cases
+            for url in case.expected.get("images", [])
+        },
+        **fixtures,
+    }
+    with FixtureServer(fixtures) as server:
+        transport = FixtureTransport(server.port)
+        await parser_http_client.use_transport(transport)
+        try:
+            for name, parser_class in PARSERS.items():
+                parser_cases = [case for case in cases if case.parser == name]
+                if parser_cases:
+                    report[name] = await _measure_parser(parser_class(), parser_cases, transport, iterations)
+        finally:
+            await parser_http_client.close()
+            settings.PARSER_IMAGE_PROBE = image_probe
+    return report
+
+
+async def _measure_parser(parser: BaseParser, cases: list[Case], transport: FixtureTransport, iterations: int) -> dict:
+    latencies, probe_latencies, peaks, reads = [], [], [], []
+    case_medians = {}
+    matched = total = 0
+
+    for case in cases:
+        # Прогрев (соединение, ленивые импорты) и проверка точности
+        result = await parser.parse(case.url)
+        case_matched, case_total = accuracy(case, result)
+        matched += case_matched
+        total += case_total
+
+        case_latencies = []
+        for _ in range(iterations):
+            before = transport.bytes_read[0]
+            started = time.perf_counter()
+            await parser.parse(case.url)
+            case_latencies.append((time.perf_counter() - started) * 1000)
+            reads.append(transport.bytes_read[0] - before)
+        latencies.extend(case_latencies)
+        case_medians[case.name] = round(percentile(case_latencies, 50), 2)
+
+        tracemalloc.start()
+        try:
+            await parser.parse(case.url)
+            peaks.append(tracemalloc.get_traced_memory()[1] / 1024)
+        finally:
+            tracemalloc.stop()
+
+        # Непроверенные изображения: parse() ждёт ответов CDN
+        settings.PARSER_IMAGE_PROBE = True
+        try:
+            for _ in range(iterations):
+                image_prober.clear()
+                started = time.perf_counter()
+                await parser.parse(case.url)
+                probe_latencies.append((time.perf_counter() - started) * 1000)
+        finally:
+            settings.PARSER_IMAGE_PROBE = False
+
+    return {
+        "cases": len(cases),
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p90_ms": round(percentile(latencies, 90), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "probe_p50_ms": round(percentile(probe_latencies, 50), 2),
+        "peak_kib": round(max(peaks), 1),
+        "bytes": round(sum(reads) / len(reads)),
+        "accuracy": round(matched / total, 4) if total else 1.0,
+        "case_p50_ms": case_medians,
+    }
+
+
+def compare(report: dict[str, dict], baseline: dict[str, dict]) -> list[str]:
+    """
+    Сравнение с baseline
+
+    Returns:
+        Описания регрессий (пусто - проверка пройдена)
+    """
+    regressions = []
+    for name, current in report.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+
+        # Задержка сравнивается по медианам товаров: у парсера распределение
+        # многомодальное (остановка на </head> или полный DOM), его перцентили шумят
+        for case, median in current["case_p50_ms"].items():
+            base_median = base["case_p50_ms"].get(case)
+            if base_median is None:
+                continue
+            limit = base_median * (1 + LATENCY_TOLERANCE) + LATENCY_SLACK_MS
+            if median > limit:
+                regressions.append(f"{name}/{case}: p50_ms {median} > {limit:.2f} (baseline {base_median})")
+
+        if "probe_p50_ms" in base:
+            limit = base["probe_p50_ms"] * (1 + LATENCY_TOLERANCE) + LATENCY_SLACK_MS
+            if current["probe_p50_ms"] > limit:
+                regressions.append(
+                    f"{name}: probe_p50_ms {current['probe_p50_ms']} > {limit:.2f} (baseline {base['probe_p50_ms']})"
+                )
+
+        limit = base["peak_kib"] * (1 + MEMORY_TOLERANCE) + MEMORY_SLACK_KIB
+        if current["peak_kib"] > limit:
+            regressions.append(f"{name}: peak_kib {current['peak_kib']} > {limit:.1f} (baseline {base['peak_kib']})")
+
+        limit = base["bytes"] * (1 + BYTES_TOLERANCE)
+        if current["bytes"] > limit:
+            regressions.append(f"{name}: bytes {current['bytes']} > {limit:.0f} (baseline {base['bytes']})")
+
+        if current["accuracy"] < base["accuracy"]:
+            regressions.append(f"{name}: accuracy {current['accuracy']} < {base['accuracy']}")
+    return regressions
+
+
+def format_report(report: dict[str, dict]) -> str:
+    """Таблица результатов"""
+    columns = ("cases", "p50_ms", "p90_ms", "p99_ms", "probe_p50_ms", "peak_kib", "bytes", "accuracy")
+    lines = [f"{'parser':<15}" + "".join(f"{column:>13}" for column in columns)]
+    for name, metrics in report.items():
+        lines.append(f"{name:<15}" + "".join(f"{metrics[column]:>13}" for column in columns))
+    return "\n".join(lines)
+
+
+async def record(cases: list[Case], corpus_dir: Path = CORPUS_DIR) -> None:
+    """Перезапись ответов корпуса с живых сайтов (заполнитель не применяется)"""
+    for case in cases:
+        for response in case.responses:
+            try:
+                live = await parser_http_client.client.get(response["url"])
+            except httpx.HTTPError as e:
+                print(f"{case.name}: {response['url']} - {e}")
+                continue
+            (corpus_dir / response["file"]).write_bytes(live.content)
+            print(f"{case.name}: {response['url']} - {live.status_code}, {len(live.content)} байт")
+    await parser_http_client.close()
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Бенчмарк парсеров товаров на записанном корпусе")
+    parser.add_argument("--iterations", type=int, default=20, help="прогонов каждого товара")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true", help="записать результат как baseline")
+    parser.add_argument("--record", action="store_true", help="перезаписать ответы корпуса с живых сайтов")
+    args = parser.parse_args(argv)
+
+    cases, fixtures = load_corpus()
+    if args.record:
+        asyncio.run(record(cases))
+        return 0
+
+    report = asyncio.run(measure(cases, fixtures, args.iterations))
+    print(format_report(report))
+
+    if args.update_baseline:
+        args.baseline.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+        print(f"\nBaseline записан: {args.baseline}")
+        return 0
+
+    if not args.baseline.exists():
+        print(f"\nBaseline не найден: {args.baseline} (создайте через --update-baseline)")
+        return 0
+
+    regressions = compare(report, json.loads(args.baseline.read_text(encoding="utf-8")))
+    if regressions:
+        print("\nРегрессии относительно baseline:")
+        for regression in regressions:
+            print(f"  - {regression}")
+        return 1
+
+    print("\nРегрессий нет")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,13 +4,16 @@
 import asyncio
 from typing import AsyncGenerator
 
+import httpx
 import pytest
 import pytest_asyncio
 from httpx import AsyncClient
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 
+from app.config import settings
 from app.database import Base, get_db
 from app.main import app
+from app.services.parser.http import parser_http_client
 
 # Тестовая база данных (SQLite in-memory)
 TEST_DATABASE_URL = "sqlite+aiosqlite:///:memory:"
@@ -29,6 +32,18 @@ def event_loop():
     loop.close()
 
 
+@pytest.fixture(autouse=True)
+def disable_redis(monkeypatch):
+    """Тесты работают без Redis (только локальные кэши)"""
+    monkeypatch.setattr(settings, "REDIS_ENABLED", False)
+
+
+@pytest.fixture(autouse=True)
+def disable_image_probe(monkeypatch):
+    """Изображения не проверяются: подменные ответы есть только для страниц и API"""
+    monkeypatch.setattr(settings, "PARSER_IMAGE_PROBE", False)
+
+
 @pytest_asyncio.fixture(scope="function")
 async def db_session() -> AsyncGenerator[AsyncSession, None]:
     """
@@ -60,3 +75,25 @@ async def client(db_session: AsyncSession) -> AsyncGenerator[AsyncClient, None]:
         yield ac
 
     app.dependency_overrides.clear()
+
+
+@pytest.fixture
+def mock_http():
+    """
+    Подмена общего HTTP клиента парсеров на httpx.MockTransport
+
+    Возвращает словарь {url: response}, который тест заполняет сам.
+    """
+    responses: dict[str, httpx.Response] = {}
+    requests: list[httpx.Request] = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        # Отдаём управление циклу, как при настоящем сетевом запросе
+        await asyncio.sleep(0.01)
+        return responses.get(str(request.url), httpx.Response(404))
+
+    original = parser_http_client._client
+    parser_http_client._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    yield responses, requests
+    parser_http_client._client = original
@@ -0,0 +1,269 @@
+"""
+Тесты для прокси и загрузки изображений
+"""
+import math
+import os
+import zlib
+from io import BytesIO
+
+import httpx
+import pytest
+from httpx import AsyncClient
+from PIL import Image
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.v1 import images as images_api
+from app.api.v1 import uploads as uploads_api
+from app.config import settings
+from app.core.security import create_access_token
+from app.models.user import User
+from app.services.image_proxy import ImageProxyService
+from app.services.parser import http as http_module
+from app.services.parser.circuit import HostGuard
+from app.services.parser.executor import ParseExecutor
+from app.services.uploads import UploadService
+
+
+def png_bytes(width: int, height: int) -> bytes:
+    """PNG заданного размера"""
+    output = BytesIO()
+    Image.new("RGB", (width, height), (200, 40, 40)).save(output, format="PNG")
+    return output.getvalue()
+
+
+# Публичный адрес, на который "резолвятся" хосты тестов
+PUBLIC_IP = "93.184.216.34"
+
+
+@pytest.fixture
+def proxy(monkeypatch, tmp_path, mock_http):
+    """Прокси с кэшем во временном каталоге, ответами mock_http и подменным DNS"""
+    responses, requests = mock_http
+    connected = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        # Соединение - с проверенным IP, исходный хост - в Host и SNI
+        connected.append((request.url.host, request.headers["host"], request.extensions["sni_hostname"]))
+        request.url = request.url.copy_with(host=request.headers["host"])
+        requests.append(request)
+        return responses.get(str(request.url), httpx.Response(404))
+
+    monkeypatch.setattr(settings, "UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "IMAGE_PROXY_ALLOWED_HOSTS", ["example", "internal.test"])
+    service = ImageProxyService(transport=httpx.MockTransport(handler))
+    service.connected = connected
+    lookups = {"internal.test": ["10.0.0.5"], "rebind.internal.test": [PUBLIC_IP, "127.0.0.1"]}
+
+    async def lookup(host: str) -> list[str]:
+        return lookups.get(host, [PUBLIC_IP])
+
+    monkeypatch.setattr(service, "_lookup", lookup)
+    monkeypatch.setattr(images_api, "image_proxy", service)
+    yield service
+    service.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_image_proxy_resizes_and_caches(client: AsyncClient, mock_http, proxy):
+    """Тест: исходник скачивается один раз, превью строятся в пуле и берутся с диска"""
+    responses, requests = mock_http
+    source = png_bytes(1200, 600)
+    for url in ("https://cdn.example/a.png", "https://mirror.example/a-copy.png"):
+        responses[url] = httpx.Response(200, content=source, headers={"Content-Type": "image/png"})
+
+    response = await client.get("/api/v1/images/proxy", params={"url": "https://cdn.example/a.png", "w": 300})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/webp"
+    assert "immutable" in response.headers["cache-control"]
+    with Image.open(BytesIO(response.content)) as image:
+        assert image.format == "WEBP"
+        assert image.size == (320, 160)
+
+    # Та же ширина из кэша, другая - из сохранённого исходника
+    assert (await client.get("/api/v1/images/proxy", params={"url": "https://cdn.example/a.png", "w": 320})).status_code == 200
+    assert (await client.get("/api/v1/images/proxy", params={"url": "https://cdn.example/a.png", "w": 640})).status_code == 200
+    assert len(requests) == 1
+    assert proxy.stats == {"hits": 1, "source_fetches": 1, "renders": 2, "evicted": 0}
+
+    # Та же картинка по другой ссылке - те же файлы (адресация по содержимому)
+    response = await client.get("/api/v1/images/proxy", params={"url": "https://mirror.example/a-copy.png", "w": 320})
+    assert response.status_code == 200
+    assert len(requests) == 2
+    assert proxy.stats["renders"] == 2
+    assert len(list((proxy.cache_dir / "objects").rglob("*"))) == 4  # каталог, исходник и два превью
+
+    # Соединение - с проверенным адресом, прокси из окружения не используются
+    assert proxy.connected[0] == (PUBLIC_IP, "cdn.example", "cdn.example")
+    assert proxy.client.trust_env is False
+
+
+@pytest.mark.asyncio
+async def test_image_proxy_rejects_bad_sources(client: AsyncClient, mock_http, proxy):
+    """Тест: внутренние адреса, не-изображения и недоступные источники"""
+    responses, requests = mock_http
+    responses["https://cdn.example/page"] = httpx.Response(200, text="<html></html>", headers={"Content-Type": "text/html"})
+
+    # Не CDN маркетплейса, внутренние адреса и хост с внутренним адресом среди публичных
+    for url in (
+        "http://127.0.0.1/secret.png",
+        "https://evil.test/a.png",
+        "https://internal.test/a.png",
+        "https://rebind.internal.test/a.png",
+    ):
+        response = await client.get("/api/v1/images/proxy", params={"url": url})
+        assert response.status_code == 400, url
+    assert requests == []
+
+    # Редирект на разрешённый хост с внутренним адресом
+    responses["https://cdn.example/moved.png"] = httpx.Response(302, headers={"Location": "https://internal.test/a.png"})
+    response = await client.get("/api/v1/images/proxy", params={"url": "https://cdn.example/moved.png"})
+    assert response.status_code == 400
+    assert len(requests) == 1
+
+    response = await client.get("/api/v1/images/proxy", params={"url": "https://cdn.example/page"})
+    assert response.status_code == 415
+
+    response = await client.get("/api/v1/images/proxy", params={"url": "https://cdn.example/missing.png"})
+    assert response.status_code == 502
+
+
+@pytest.mark.asyncio
+async def test_image_proxy_host_unavailable(client: AsyncClient, mock_http, proxy, monkeypatch):
+    """Тест: открытая цепь хоста-источника - 503 с Retry-After, источник не запрашивается"""
+    _, requests = mock_http
+    guard = HostGuard(failures=1)
+    await guard.record("cdn.example", False)
+    monkeypatch.setattr(http_module, "host_guard", guard)
+
+    response = await client.get("/api/v1/images/proxy", params={"url": "https://cdn.example/a.png"})
+
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == str(math.ceil(settings.PARSER_CIRCUIT_OPEN_SECONDS))
+    assert requests == []
+    assert guard.stats["rejected"] == 1
+
+
+@pytest.mark.asyncio
+async def test_image_proxy_evicts_least_recently_used(mock_http, proxy, monkeypatch):
+    """Тест: при переполнении кэша удаляются файлы, к которым дольше не обращались"""
+    responses, _ = mock_http
+    for name in ("old", "new"):
+        responses[f"https://cdn.example/{name}.png"] = httpx.Response(
+            200, content=png_bytes(400, 400 if name == "old" else 300), headers={"Content-Type": "image/png"}
+        )
+
+    old_path, _ = await proxy.get("https://cdn.example/old.png", 160)
+    old_source = old_path.with_name(old_path.name.split("-")[0])
+    for path in (old_path, old_source):
+        os.utime(path, (1, 1))
+
+    monkeypatch.setattr(settings, "IMAGE_PROXY_CACHE_MAX_BYTES", old_source.stat().st_size + 1)
+    new_path, _ = await proxy.get("https://cdn.example/new.png", 160)
+
+    assert not old_source.exists()
+    assert new_path.exists()
+    assert proxy.stats["evicted"] >= 1
+
+
+@pytest.fixture
+def uploads(monkeypatch, tmp_path):
+    """Приём загрузок во временный каталог"""
+    monkeypatch.setattr(settings, "UPLOAD_DIR", str(tmp_path))
+    service = UploadService(executor=ParseExecutor(kind="process", workers=1, phase=None))
+    monkeypatch.setattr(uploads_api, "upload_service", service)
+    yield service
+    service.executor.shutdown()
+
+
+async def auth_headers(db_session: AsyncSession) -> dict:
+    user = User(email="uploader@example.com", username="uploader")
+    db_session.add(user)
+    await db_session.commit()
+    return {"Authorization": f"Bearer {create_access_token({'user_id': user.id})}"}
+
+
+@pytest.mark.asyncio
+async def test_upload_image_dedupes_and_builds_variants(client: AsyncClient, db_session: AsyncSession, uploads, tmp_path):
+    """Тест: файл сохраняется под хэшем, повтор не пишется, превью строятся в фоне"""
+    headers = await auth_headers(db_session)
+    data = png_bytes(800, 400)
+
+    response = await client.post("/api/v1/uploads/images", files={"file": ("cover.png", data, "image/png")}, headers=headers)
+
+    assert response.status_code == 201
+    body = response.json()
+    assert body["url"].startswith("/uploads/images/") and body["url"].endswith(".png")
+    assert (body["size"], body["width"], body["height"], body["deduplicated"]) == (len(data), 800, 400, False)
+    assert set(body["variants"]) == {"320", "640"}
+    stored = tmp_path / body["url"].removeprefix("/uploads/")
+    assert stored.read_bytes() == data
+
+    await uploads.join()
+    with Image.open(tmp_path / body["variants"]["320"].removeprefix("/uploads/")) as variant:
+        assert (variant.format, variant.size) == ("WEBP", (320, 160))
+
+    response = await client.post("/api/v1/uploads/images", files={"file": ("copy.png", data, "image/png")}, headers=headers)
+    assert response.json()["deduplicated"] is True
+    assert response.json()["url"] == body["url"]
+    assert len(list((tmp_path / "images").rglob("*.png"))) == 1
+    assert list((tmp_path / "tmp").iterdir()) == []
+
+
+@pytest.mark.asyncio
+async def test_upload_size_enforced_while_streaming(client: AsyncClient, db_session: AsyncSession, uploads, tmp_path, monkeypatch):
+    """Тест: лимит размера проверяется по мере чтения тела без Content-Length"""
+    headers = await auth_headers(db_session)
+    monkeypatch.setattr(settings, "MAX_UPLOAD_SIZE", 64 * 1024)
+    boundary = "testboundary"
+
+    async def body():
+        yield (
+            f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"big.png\"\r\n"
+            "Content-Type: image/png\r\n\r\n"
+        ).encode()
+        for _ in range(64):
+            yield b"\0" * 16 * 1024
+        yield f"\r\n--{boundary}--\r\n".encode()
+
+    response = await client.post(
+        "/api/v1/uploads/images",
+        content=body(),
+        headers={**headers, "Content-Type": f"multipart/form-data; boundary={boundary}"},
+    )
+
+    assert response.status_code == 413
+    assert list((tmp_path / "tmp").iterdir()) == []
+    assert not (tmp_path / "images").exists()
+    assert uploads.stats["rejected"] == 1
+
+
+@pytest.mark.asyncio
+async def test_upload_rejects_non_images(client: AsyncClient, db_session: AsyncSession, uploads):
+    """Тест: недопустимое расширение и не-изображение с расширением картинки"""
+    headers = await auth_headers(db_session)
+
+    response = await client.post("/api/v1/uploads/images", files={"file": ("notes.txt", b"hello", "text/plain")}, headers=headers)
+    assert response.status_code == 400
+
+    response = await client.post("/api/v1/uploads/images", files={"file": ("fake.png", b"<html></html>", "image/png")}, headers=headers)
+    assert response.status_code == 415
+
+    response = await client.post("/api/v1/uploads/images", files={"other": ("a.png", png_bytes(10, 10), "image/png")}, headers=headers)
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_upload_rejects_decompression_bomb(client: AsyncClient, db_session: AsyncSession, uploads, tmp_path):
+    """Тест: поддельный заголовок PNG 20000x20000 отклоняется с 413, а не падает с 500"""
+    headers = await auth_headers(db_session)
+    data = png_bytes(10, 10)
+    # Размеры в IHDR подменены, CRC пересчитан - заголовок корректный
+    ihdr = b"IHDR" + (20000).to_bytes(4, "big") + (20000).to_bytes(4, "big") + data[24:29]
+    bomb = data[:12] + ihdr + zlib.crc32(ihdr).to_bytes(4, "big") + data[33:]
+
+    response = await client.post("/api/v1/uploads/images", files={"file": ("bomb.png", bomb, "image/png")}, headers=headers)
+
+    assert response.status_code == 413
+    assert list((tmp_path / "tmp").iterdir()) == []
+    assert not (tmp_path / "images").exists()
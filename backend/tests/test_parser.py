@@ -0,0 +1,1094 @@
+"""
+Тесты для парсеров товаров
+"""
+import asyncio
+import json
+import pickle
+import threading
+from importlib.metadata import EntryPoint
+
+import httpx
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.v1 import admin as admin_api
+from app.config import settings
+from app.core.redis import redis_client
+from app.core.security import create_access_token
+from app.models.item import WishlistItem
+from app.models.user import User
+from app.models.wishlist import Wishlist
+from app.schemas.item import ParsedItemData, ParseErrorKind
+from app.services.parser import OpenGraphParser, OzonParser, WildberriesParser, YandexMarketParser
+from app.services.parser import registry as registry_module
+from app.services.parser.batching import MicroBatcher
+from app.services.parser.cache import ParseResultCache
+from app.services.parser.circuit import CircuitOpenError, HostGuard, TokenBucket
+from app.services.parser.executor import ParseExecutor, ParseQueueFullError, parse_executor
+from app.services.parser.http import GuardedTransport, parser_http_client
+from app.services.parser.images import ImageProber, image_size
+from app.services.parser.metadata import MetadataScanner, scan_metadata
+from app.services.parser.registry import ParserRegistry
+from app.services.parser.revalidation import NotModifiedError, Revalidation, Validators, current_revalidation
+from app.services.parser.telemetry import current_marketplace, parser_telemetry
+from app.services.parser.wb_baskets import BasketResolver
+from app.services.product_catalog import product_catalog
+from app.services.product_parser import ProductParserService
+from benchmarks import parsers as parser_benchmark
+
+WB_API_URL = "https://card.wb.ru/cards/v2/detail?nm={article}"
+
+OZON_HTML = """
+<html><head>
+<meta property="og:title" content="Кофемолка">
+<meta property="og:description" content="Жерновая кофемолка">
+<meta property="og:image" content="https://cdn1.ozone.ru/s3/multimedia/wc500/1.jpg">
+<script type="application/ld+json">{"name": "Кофемолка электрическая", "offers": {"price": "3490"}}</script>
+</head><body><h1>Кофемолка</h1></body></html>
+"""
+
+
+@pytest.mark.asyncio
+async def test_parsers_share_http_client():
+    """Тест: все парсеры используют один общий HTTP клиент"""
+    await parser_http_client.start()
+    try:
+        assert WildberriesParser().http.client is OzonParser().http.client
+    finally:
+        await parser_http_client.close()
+
+
+@pytest.mark.asyncio
+async def test_fetch_html_uses_shared_client(mock_http):
+    """Тест: fetch_html ходит через общий клиент"""
+    responses, requests = mock_http
+    responses["https://example.com/"] = httpx.Response(200, text="<html>ok</html>")
+
+    html = await OzonParser().fetch_html("https://example.com/")
+
+    assert html == "<html>ok</html>"
+    assert len(requests) == 1
+
+
+@pytest.mark.asyncio
+async def test_parse_cache_keyed_by_article(mock_http):
+    """Тест: разные ссылки на один товар WB парсятся один раз"""
+    responses, requests = mock_http
+    responses[WB_API_URL.format(article="123456789")] = httpx.Response(
+        200, json={"data": {"products": [{"id": 123456789, "name": "Кружка", "brand": "WB", "salePriceU": 49900}]}}
+    )
+    service = ProductParserService(cache=ParseResultCache())
+
+    first = await service.parse_url("https://www.wildberries.ru/catalog/123456789/detail.aspx")
+    second = await service.parse_url("https://wb.ru/catalog/123456789/detail.aspx?size=42")
+
+    assert first.success and second.success
+    assert second.title == "WB / Кружка"
+    assert second.price == 499
+    assert len(requests) == 1
+    assert service.cache.stats["lru_hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_parse_cache_negative(mock_http):
+    """Тест: "товар не найден" кэшируется, временные ошибки - нет"""
+    responses, requests = mock_http
+    responses[WB_API_URL.format(article="1")] = httpx.Response(200, json={"data": {"products": []}})
+    responses[WB_API_URL.format(article="2")] = httpx.Response(503)
+    # Запасной OpenGraph тоже получает временную ошибку
+    responses["https://www.wildberries.ru/catalog/2/detail.aspx"] = httpx.Response(503)
+    service = ProductParserService(cache=ParseResultCache())
+
+    for _ in range(2):
+        missing = await service.parse_url("https://www.wildberries.ru/catalog/1/detail.aspx")
+        failed = await service.parse_url("https://www.wildberries.ru/catalog/2/detail.aspx")
+
+    assert missing.error_kind == "not_found"
+    assert failed.success is False and failed.error_kind == "http_status"
+    # 1 запрос для "не найден" + по 2 (API и страница) на каждую временную ошибку
+    assert len(requests) == 5
+    assert service.cache.stats["negative_hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_concurrent_parses_are_coalesced(mock_http):
+    """Тест: одновременные запросы одного товара делают один запрос к API"""
+    responses, requests = mock_http
+    responses[WB_API_URL.format(article="555555")] = httpx.Response(
+        200, json={"data": {"products": [{"id": 555555, "name": "Плед", "salePriceU": 150000}]}}
+    )
+    service = ProductParserService(cache=ParseResultCache())
+
+    results = await asyncio.gather(*[
+        service.parse_url("https://www.wildberries.ru/catalog/555555/detail.aspx")
+        for _ in range(20)
+    ])
+
+    assert all(r.success and r.title == "Плед" for r in results)
+    assert len(requests) == 1
+    assert service.singleflight.stats["coalesced"] == 19
+
+
+@pytest.mark.asyncio
+async def test_parse_urls_batch_stream(client: AsyncClient, db_session: AsyncSession, mock_http, monkeypatch):
+    """Тест: пакетный парсинг отдаёт NDJSON-строку на каждую ссылку и пишет товары в каталог"""
+    responses, requests = mock_http
+    responses[WB_API_URL.format(article="101;102;103")] = httpx.Response(
+        200, json={"data": {"products": [
+            {"id": int(article), "name": f"Товар {article}", "salePriceU": 10000}
+            for article in ("101", "102", "103")
+        ]}}
+    )
+
+    user = User(email="batch@example.com", username="batchuser")
+    db_session.add(user)
+    await db_session.commit()
+    token = create_access_token({"user_id": user.id})
+
+    urls = [f"https://www.wildberries.ru/catalog/{article}/detail.aspx" for article in ("101", "102", "103")]
+    urls.append("not-a-url")
+
+    response = await client.post(
+        "/api/v1/parser/parse-urls",
+        json={"urls": urls},
+        headers={"Authorization": f"Bearer {token}"}
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    by_index = {line["index"]: line for line in lines}
+    assert sorted(by_index) == [0, 1, 2, 3]
+    assert by_index[1]["result"]["title"] == "Товар 102"
+    assert by_index[3]["result"]["success"] is False
+    # Три карточки WB ушли одним пакетным запросом
+    assert len(requests) == 1
+
+    assert all([await product_catalog.get(db_session, f"wildberries:{article}") for article in ("101", "102", "103")])
+
+    # Повтор с пустым кэшем парсинга - из каталога, как у parse-url
+    monkeypatch.setattr(product_catalog, "parser", ProductParserService(cache=ParseResultCache()))
+    response = await client.post(
+        "/api/v1/parser/parse-urls",
+        json={"urls": urls[:3]},
+        headers={"Authorization": f"Bearer {token}"}
+    )
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert sorted(line["result"]["title"] for line in lines) == ["Товар 101", "Товар 102", "Товар 103"]
+    assert len(requests) == 1
+
+
+@pytest.mark.asyncio
+async def test_wildberries_cards_are_batched(mock_http):
+    """Тест: артикулы, запрошенные одновременно, уходят одним запросом nm=a;b;c"""
+    responses, requests = mock_http
+    responses[WB_API_URL.format(article="11;22;33")] = httpx.Response(
+        200, json={"data": {"products": [
+            {"id": 11, "name": "Первый", "salePriceU": 10000},
+            {"id": 33, "name": "Третий", "salePriceU": 30000},
+        ]}}
+    )
+    parser = WildberriesParser()
+
+    results = await asyncio.gather(*[
+        parser.parse(f"https://www.wildberries.ru/catalog/{article}/detail.aspx")
+        for article in ("11", "22", "33")
+    ])
+
+    assert [r.title for r in results] == ["Первый", None, "Третий"]
+    assert results[1].error_kind == "not_found"
+    assert len(requests) == 1
+
+
+@pytest.mark.asyncio
+async def test_micro_batcher_cancelled_flush_releases_waiters():
+    """Тест: отменённый пакет не оставляет ожидающих висеть"""
+    started = asyncio.Event()
+
+    async def fetch(keys):
+        started.set()
+        await asyncio.sleep(60)
+
+    batcher = MicroBatcher(fetch, window=60, max_size=2)
+    waiters = [asyncio.create_task(batcher.get(key)) for key in ("1", "2")]
+    await started.wait()
+    for task in batcher._flushing:
+        task.cancel()
+
+    results = await asyncio.wait_for(asyncio.gather(*waiters, return_exceptions=True), timeout=1)
+    assert all(isinstance(result, asyncio.CancelledError) for result in results)
+
+
+def test_wildberries_basket_table_boundaries():
+    """Тест: границы диапазонов vol в таблице корзин"""
+    baskets = BasketResolver()
+
+    assert baskets.lookup(0) == "01"
+    assert baskets.lookup(143) == "01"
+    assert baskets.lookup(144) == "02"
+    assert baskets.lookup(2189) == "14"
+    assert baskets.lookup(2190) == "15"
+    assert baskets.lookup(10_000) is None
+
+    baskets.load([[10, "1"], [20, "2"]])
+    assert baskets.lookup(15) == "02"
+
+
+@pytest.mark.asyncio
+async def test_wildberries_basket_probe(mock_http):
+    """Тест: корзина для неизвестного vol находится пробой и запоминается"""
+    responses, requests = mock_http
+    article = "470000123"  # vol 4700 - за пределами встроенной таблицы
+    responses[f"https://basket-27.wbbasket.ru/vol4700/part470000/{article}/info/ru/card.json"] = httpx.Response(200)
+    baskets = BasketResolver()
+
+    assert await baskets.resolve(article) == "27"
+    probes = len(requests)
+    assert await baskets.resolve(article) == "27"
+    assert len(requests) == probes
+
+    # Следующий vol: проба продолжается с найденной корзины, а не с конца таблицы
+    article = "490000123"
+    responses[f"https://basket-28.wbbasket.ru/vol4900/part490000/{article}/info/ru/card.json"] = httpx.Response(200)
+    requests.clear()
+    assert await baskets.resolve(article) == "28"
+    assert min(request.url.host for request in requests) == "basket-27.wbbasket.ru"
+
+    # Между двумя точками с одной корзиной - без запросов
+    baskets.learn(4750, "27")
+    requests.clear()
+    assert await baskets.resolve("472500000") == "27"
+    assert requests == []
+
+
+class FakeRedis:
+    """Redis в памяти: строки и ZSET корзин, счётчик обращений"""
+
+    def __init__(self):
+        self.values: dict[str, str] = {}
+        self.zsets: dict[str, dict[str, float]] = {}
+        self.calls = 0
+
+    async def get(self, key):
+        self.calls += 1
+        return self.values.get(key)
+
+    async def set(self, key, value):  # noqa: A003
+        self.calls += 1
+        self.values[key] = value
+
+    async def zadd(self, key, mapping):
+        self.calls += 1
+        self.zsets.setdefault(key, {}).update(mapping)
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, redis: FakeRedis):
+        self.redis = redis
+        self.commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def zrevrangebyscore(self, key, high, low, start=0, num=None):
+        members = sorted(self.redis.zsets.get(key, {}).items(), key=lambda item: -item[1])
+        self.commands.append([member for member, score in members if score <= high][:num])
+
+    def zrangebyscore(self, key, low, high, start=0, num=None):
+        members = sorted(self.redis.zsets.get(key, {}).items(), key=lambda item: item[1])
+        self.commands.append([member for member, score in members if score >= low][:num])
+
+    async def execute(self):
+        self.redis.calls += 1
+        return self.commands
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    """Redis "доступен": обращения идут в FakeRedis"""
+    redis = FakeRedis()
+    monkeypatch.setattr(settings, "REDIS_ENABLED", True)
+    monkeypatch.setattr(redis_client, "_client", redis)
+    monkeypatch.setattr(redis_client, "_down_until", 0.0)
+    return redis
+
+
+@pytest.mark.asyncio
+async def test_wildberries_basket_table_reload(client: AsyncClient, db_session: AsyncSession, fake_redis, monkeypatch):
+    """Тест: таблица корзин публикуется администратором и подхватывается другими воркерами"""
+    published = BasketResolver()
+    monkeypatch.setattr(admin_api, "basket_resolver", published)
+    admin = User(email="baskets@example.com", username="basketsadmin", is_admin=True)
+    db_session.add(admin)
+    await db_session.commit()
+
+    response = await client.put(
+        "/api/v1/admin/wb-baskets",
+        json={"table": [[143, "01"], [5000, "30"]]},
+        headers={"Authorization": f"Bearer {create_access_token({'user_id': admin.id})}"},
+    )
+
+    assert response.status_code == 200
+    assert published.lookup(4800) == "30"
+    worker = BasketResolver()
+    assert worker.lookup(4800) is None
+    assert await worker.reload()
+    assert worker.lookup(4800) == "30"
+
+
+@pytest.mark.asyncio
+async def test_wildberries_basket_refresh_is_cached(fake_redis, monkeypatch):
+    """Тест: неизвестный vol не спрашивается у Redis на каждом разрешении"""
+    monkeypatch.setattr(settings, "PARSER_WB_BASKET_PROBE", False)
+    baskets = BasketResolver()
+
+    assert await baskets.resolve("470000123") == baskets.fallback()
+    calls = fake_redis.calls
+    assert await baskets.resolve("470000456") == baskets.fallback()
+    assert fake_redis.calls == calls == 1
+
+    # Точка, найденная другим воркером, подхватывается соседним vol
+    fake_redis.zsets["wb:baskets:learned:v2"] = {"4800:27": 4800, "4600:27": 4600}
+    assert await baskets.resolve("480000000") == "27"
+
+
+@pytest.mark.asyncio
+async def test_ozon_extraction_runs_in_executor(mock_http):
+    """Тест: разбор HTML Ozon выполняется в пуле и даёт те же данные"""
+    responses, _ = mock_http
+    url = "https://www.ozon.ru/product/kofemolka-123456/"
+    responses[url] = httpx.Response(200, text=OZON_HTML)
+
+    result = await OzonParser().parse(url)
+
+    assert result.success
+    assert result.title == "Кофемолка электрическая"
+    assert result.price == 3490
+    assert result.description == "Жерновая кофемолка"
+    # Для пула процессов extract должен сериализоваться
+    assert pickle.loads(pickle.dumps(OzonParser.extract))(OZON_HTML)["title"] == "Кофемолка электрическая"
+
+
+@pytest.mark.asyncio
+async def test_executor_rejects_when_queue_full():
+    """Тест: при переполненной очереди задача отклоняется"""
+    executor = ParseExecutor(kind="thread", workers=1, max_queue=1)
+    try:
+        first = asyncio.create_task(executor.run(pow, 2, 10))
+        await asyncio.sleep(0)
+        with pytest.raises(ParseQueueFullError):
+            await executor.run(pow, 2, 10)
+        assert await first == 1024
+        assert executor.stats["completed"] == 1
+        assert executor.stats["rejected"] == 1
+    finally:
+        executor.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_fetch_html_scans_each_chunk_once(mock_http, monkeypatch):
+    """Тест: сканер получает каждую порцию один раз, без Content-Length остановка учитывается отдельно"""
+    responses, _ = mock_http
+    html = OZON_HTML.replace("<head>", "<head>" + "<meta name=\"x\" content=\"y\">" * 200)
+    chunks = [html[i:i + 64].encode() for i in range(0, len(html), 64)]
+
+    async def stream():
+        for chunk in chunks:
+            yield chunk
+
+    url = "https://shop.example/item"
+    responses[url] = httpx.Response(200, headers={"content-type": "text/html; charset=utf-8"}, content=stream())
+    fed = []
+    original_feed = MetadataScanner.feed
+    monkeypatch.setattr(MetadataScanner, "feed", lambda self, chunk: fed.append(chunk) or original_feed(self, chunk))
+    monkeypatch.setattr(parser_http_client, "stats", dict.fromkeys(parser_http_client.stats, 0))
+
+    read = await OpenGraphParser().fetch_html(url, enough=lambda page: page.product_price() is not None)
+
+    assert "".join(fed) == read
+    assert parser_http_client.stats["stopped_early"] == 1
+    assert parser_http_client.stats["saved_unknown"] == 1
+    assert parser_http_client.stats["bytes_saved"] == 0
+
+
+@pytest.mark.asyncio
+async def test_ozon_reads_gallery_from_body(mock_http, monkeypatch):
+    """Тест: галерея из <body> не теряется, но похожие товары за ней не скачиваются"""
+    responses, _ = mock_http
+    url = "https://www.ozon.ru/product/kofemolka-elektricheskaya-bork-j700-123456789/"
+    html = (parser_benchmark.CORPUS_DIR / "ozon_123456789.html").read_bytes()
+    page, tail = html.split(b"</body>")
+    filler = [b"<p>" + b"x" * 1000 + b"</p>"] * 200
+    sent = []
+
+    async def stream():
+        for chunk in [page, *filler, b"</body>" + tail]:
+            sent.append(chunk)
+            yield chunk
+
+    responses[url] = httpx.Response(200, content=stream(), headers={"Content-Type": "text/html; charset=utf-8"})
+    monkeypatch.setattr(parser_http_client, "stats", dict.fromkeys(parser_http_client.stats, 0))
+
+    result = await OzonParser().parse(url)
+
+    assert result.success
+    assert result.price == 14990
+    assert len(result.images) == 2
+    assert len(sent) < len(filler)
+    assert parser_http_client.stats["stopped_early"] == 1
+
+
+@pytest.mark.asyncio
+async def test_executor_counts_cancelled_jobs_until_done():
+    """Тест: отменённый вызывающий не освобождает место, пока задача выполняется в пуле"""
+    executor = ParseExecutor(kind="thread", workers=1, max_queue=1)
+    release = threading.Event()
+    try:
+        waiter = asyncio.create_task(executor.run(release.wait, 5))
+        await asyncio.sleep(0.05)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+
+        assert executor.in_flight == 1
+        with pytest.raises(ParseQueueFullError):
+            await executor.run(pow, 2, 10)
+
+        release.set()
+        for _ in range(100):
+            if executor.in_flight == 0:
+                break
+            await asyncio.sleep(0.01)
+        assert await executor.run(pow, 2, 10) == 1024
+    finally:
+        release.set()
+        executor.shutdown()
+
+
+def test_metadata_scan_stops_at_head():
+    """Тест: при достаточных данных в <head> тело документа не читается"""
+    page = scan_metadata(OZON_HTML, enough=lambda page: page.product_price() is not None)
+
+    assert page.stopped_early
+    assert page.product()["name"] == "Кофемолка электрическая"
+    assert page.product_price() == 3490
+    assert page.h1 is None  # <body> не читался
+
+
+def test_metadata_fallbacks_without_head_data():
+    """Тест: без мета-тегов данные берутся из <title>, <h1> и вёрстки"""
+    html = """
+    <html><head><title>Магазин</title></head>
+    <body><h1>Чайник <b>стеклянный</b></h1><span data-widget="webPrice">1 299 ₽</span></body></html>
+    """
+
+    og = OpenGraphParser.extract(html)
+    ozon = OzonParser.extract(html)
+
+    assert og["title"] == "Магазин"
+    assert ozon["title"] == "Чайник стеклянный"
+    assert ozon["price"] == 1299
+
+
+@pytest.mark.asyncio
+async def test_fetch_html_stops_after_head(mock_http, monkeypatch):
+    """Тест: загрузка страницы прекращается после </head>, тело не скачивается"""
+    responses, _ = mock_http
+    head, body = OZON_HTML.encode().split(b"<body>")
+    body_chunks = [b"<body>" + body] + [b"<p>" + b"x" * 1000 + b"</p>"] * 100
+    sent = []
+
+    async def stream():
+        for chunk in [head[:50], head[50:], *body_chunks]:
+            sent.append(chunk)
+            yield chunk
+
+    url = "https://www.ozon.ru/product/kofemolka-123/"
+    length = len(head) + sum(map(len, body_chunks))
+    responses[url] = httpx.Response(
+        200,
+        headers={"content-type": "text/html; charset=utf-8", "content-length": str(length)},
+        content=stream(),
+    )
+    monkeypatch.setattr(parser_http_client, "stats", dict.fromkeys(parser_http_client.stats, 0))
+
+    html = await OpenGraphParser().fetch_html(url, enough=lambda page: page.product_price() is not None)
+
+    assert "Кофемолка электрическая" in html
+    assert len(sent) < len(body_chunks)
+    assert parser_http_client.stats["stopped_early"] == 1
+    assert parser_http_client.stats["bytes_saved"] > 90_000
+
+
+@pytest.mark.asyncio
+async def test_fetch_html_respects_byte_cap(mock_http, monkeypatch):
+    """Тест: тело страницы читается не больше PARSER_FETCH_MAX_BYTES"""
+    responses, _ = mock_http
+    url = "https://example.com/big"
+    responses[url] = httpx.Response(200, content="<html><body>" + "ж" * 10_000)
+    monkeypatch.setattr(settings, "PARSER_FETCH_MAX_BYTES", 1001)
+
+    html = await OpenGraphParser().fetch_html(url)
+
+    # Обрезанный посередине символ не ломает декодирование
+    assert html.startswith("<html><body>ж")
+    assert len(html.encode()) <= 1004
+
+
+def test_registry_dispatch_by_domain():
+    """Тест: парсер выбирается по домену ссылки, а не по подстроке"""
+    registry = ParserRegistry()
+
+    assert registry.resolve("https://www.wildberries.ru/catalog/123/detail.aspx").marketplace.value == "wildberries"
+    assert registry.resolve("https://m.market.yandex.ru/product/1").marketplace.value == "yandex_market"
+    assert registry.resolve("https://OZON.ru/product/chayn-1/").marketplace.value == "ozon"
+    # Домен маркетплейса в пути или в чужом домене - это обычный сайт
+    assert registry.resolve("https://blog.example.com/wb.ru/review").marketplace.value == "other"
+    assert registry.resolve("https://notozon.ru/product/1").marketplace.value == "other"
+    assert registry.resolve("https://www.ozon.ru/category/chayniki/").marketplace.value == "other"
+
+
+def test_registry_entry_points(monkeypatch):
+    """Тест: сторонние парсеры подключаются через entry points и импортируются лениво"""
+    entry_point = EntryPoint(
+        name="lamoda.ru",
+        value="app.services.parser.opengraph:OpenGraphParser",
+        group=registry_module.ENTRY_POINT_GROUP,
+    )
+    monkeypatch.setattr(registry_module, "entry_points", lambda group: [entry_point])
+    registry = ParserRegistry()
+
+    assert "lamoda.ru" in registry.domains
+    assert registry._instances == {}
+    assert isinstance(registry.resolve("https://www.lamoda.ru/p/abc/"), OpenGraphParser)
+
+
+@pytest.mark.asyncio
+async def test_circuit_breaker_opens_and_probes():
+    """Тест: после серии 429 запросы не отправляются, затем проходит один пробный"""
+    status = {"code": 429}
+    sent = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        sent.append(request)
+        await asyncio.sleep(0.01)
+        return httpx.Response(status["code"])
+
+    guard = HostGuard(failures=3, window=60, open_seconds=0.2)
+    async with httpx.AsyncClient(transport=GuardedTransport(httpx.MockTransport(handler), guard)) as client:
+        for _ in range(3):
+            await client.get("https://www.ozon.ru/product/1/")
+        with pytest.raises(CircuitOpenError):
+            await client.get("https://www.ozon.ru/product/1/")
+        assert len(sent) == 3
+        assert await guard.is_open("www.ozon.ru")
+
+        # Полуоткрытая цепь: один пробный запрос, остальные отклоняются
+        await asyncio.sleep(0.25)
+        status["code"] = 200
+        results = await asyncio.gather(
+            *[client.get("https://www.ozon.ru/product/1/") for _ in range(3)],
+            return_exceptions=True,
+        )
+        assert sum(isinstance(r, httpx.Response) for r in results) == 1
+        assert sum(isinstance(r, CircuitOpenError) for r in results) == 2
+
+        # Успешная проба закрыла цепь
+        assert (await client.get("https://www.ozon.ru/product/1/")).status_code == 200
+        assert guard.stats["opened"] == 1
+        assert guard.stats["probes"] == 1
+
+
+@pytest.mark.asyncio
+async def test_parse_url_fails_fast_when_circuit_open():
+    """Тест: при открытой цепи парсинг сразу возвращает ошибку без запросов"""
+    sent = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        sent.append(request)
+        return httpx.Response(429)
+
+    guard = HostGuard(failures=1, window=60, open_seconds=60)
+    original = parser_http_client._client
+    parser_http_client._client = httpx.AsyncClient(transport=GuardedTransport(httpx.MockTransport(handler), guard))
+    try:
+        service = ProductParserService(cache=ParseResultCache())
+        first = await service.parse_url("https://www.ozon.ru/product/chaynik-1/")
+        second = await service.parse_url("https://www.ozon.ru/product/chaynik-1/")
+    finally:
+        await parser_http_client._client.aclose()
+        parser_http_client._client = original
+
+    assert len(sent) == 1
+    assert not first.success
+    assert second.error_kind == ParseErrorKind.unavailable
+
+
+def test_token_bucket_rejects_long_wait():
+    """Тест: token bucket отдаёт burst сразу, затем ждёт или отказывает"""
+    bucket = TokenBucket(rate=10, burst=2)
+
+    assert bucket.reserve(max_wait=1) == 0
+    assert bucket.reserve(max_wait=1) == 0
+    assert bucket.reserve(max_wait=1) == pytest.approx(0.1, abs=0.01)
+    assert bucket.reserve(max_wait=0.1) is None
+
+
+@pytest.mark.asyncio
+async def test_hedged_parse_races_opengraph(monkeypatch):
+    """Тест: медленный парсер маркетплейса проигрывает OpenGraph и отменяется"""
+    calls = {"count": 0, "cancelled": 0}
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        calls["count"] += 1
+        try:
+            # Первый запрос (парсер Ozon) зависает, второй (OpenGraph) отвечает сразу
+            await asyncio.sleep(5 if calls["count"] == 1 else 0)
+        except asyncio.CancelledError:
+            calls["cancelled"] += 1
+            raise
+        return httpx.Response(200, text=OZON_HTML)
+
+    monkeypatch.setattr(settings, "PARSER_HEDGE_DELAY", 0.05)
+    original = parser_http_client._client
+    parser_http_client._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    try:
+        service = ProductParserService(cache=ParseResultCache())
+        started = asyncio.get_running_loop().time()
+        result = await service.parse_url("https://www.ozon.ru/product/kofemolka-123/")
+        elapsed = asyncio.get_running_loop().time() - started
+        # Даём отмене дойти до зависшего запроса
+        await asyncio.sleep(0.05)
+    finally:
+        parser_http_client._client = original
+
+    assert result.success
+    assert result.title == "Кофемолка"
+    assert elapsed < 1
+    assert service.stats["hedge_wins"] == 1
+    assert calls["cancelled"] == 1
+
+
+@pytest.mark.asyncio
+async def test_hedged_parse_serves_stale_value(mock_http, monkeypatch):
+    """Тест: при медленном маркетплейсе отдаётся устаревшее значение из кэша"""
+    monkeypatch.setattr(settings, "PARSER_HEDGE_DELAY", 0.001)
+    monkeypatch.setitem(settings.PARSER_CACHE_TTL, "ozon", 0)
+    cache = ParseResultCache()
+    await cache.put("ozon:123", "ozon", ParsedItemData(success=True, title="Старая цена", price=100))
+    await asyncio.sleep(0.01)
+
+    service = ProductParserService(cache=cache)
+    assert await cache.get("ozon:123") is None
+    result = await service.parse_url("https://www.ozon.ru/product/kofemolka-123/")
+
+    assert result.title == "Старая цена"
+    assert service.stats["stale_wins"] == 1
+
+
+@pytest.mark.asyncio
+async def test_reparse_sends_conditional_request(mock_http, monkeypatch):
+    """Тест: повторный парсинг отправляет If-None-Match и на 304 не разбирает страницу"""
+    responses, requests = mock_http
+    url = "https://www.ozon.ru/product/kofemolka-123/"
+    responses[url] = httpx.Response(
+        200, text=OZON_HTML, headers={"etag": '"v1"', "last-modified": "Wed, 01 Jan 2025 00:00:00 GMT"}
+    )
+    monkeypatch.setitem(settings.PARSER_CACHE_TTL, "ozon", 0)
+    service = ProductParserService(cache=ParseResultCache())
+
+    first = await service.parse_url(url)
+    await asyncio.sleep(0.01)
+
+    responses[url] = httpx.Response(304)
+    submitted = parser_http_client.stats["responses"]
+    second = await service.parse_url(url)
+
+    assert requests[-1].headers["if-none-match"] == '"v1"'
+    assert requests[-1].headers["if-modified-since"] == "Wed, 01 Jan 2025 00:00:00 GMT"
+    assert second.title == first.title and second.price == 3490
+    assert service.stats["not_modified"] == 1
+    # Тело 304 не читалось
+    assert parser_http_client.stats["responses"] == submitted
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("parser_cls", [OzonParser, OpenGraphParser, YandexMarketParser])
+async def test_parsers_propagate_not_modified(mock_http, parser_cls):
+    """Тест: 304 не превращается в ошибку парсинга - NotModifiedError уходит вызывающему"""
+    responses, _ = mock_http
+    url = {
+        OzonParser: "https://www.ozon.ru/product/kofemolka-123/",
+        OpenGraphParser: "https://shop.example/item",
+        YandexMarketParser: "https://market.yandex.ru/product/123",
+    }[parser_cls]
+    responses[url] = httpx.Response(304)
+    token = current_revalidation.set(Revalidation(Validators(etag='"v1"', last_modified=None, content_hash=None)))
+    try:
+        with pytest.raises(NotModifiedError):
+            await parser_cls().parse(url)
+    finally:
+        current_revalidation.reset(token)
+
+
+@pytest.mark.asyncio
+async def test_reparse_unchanged_content_skips_extraction(mock_http, monkeypatch):
+    """Тест: без ETag неизменившееся содержимое определяется по хэшу"""
+    responses, _ = mock_http
+    url = "https://www.ozon.ru/product/kofemolka-123/"
+    responses[url] = httpx.Response(200, text=OZON_HTML)
+    monkeypatch.setitem(settings.PARSER_CACHE_TTL, "ozon", 0)
+    service = ProductParserService(cache=ParseResultCache())
+
+    await service.parse_url(url)
+    await asyncio.sleep(0.01)
+    submitted = parse_executor.stats["submitted"]
+    result = await service.parse_url(url)
+
+    assert result.success and result.price == 3490
+    assert service.stats["not_modified"] == 1
+    assert parse_executor.stats["submitted"] == submitted
+
+
+@pytest.mark.asyncio
+async def test_parse_url_reuses_product_catalog(client: AsyncClient, db_session: AsyncSession, mock_http, monkeypatch):
+    """Тест: товар парсится один раз, элементы хранят только ссылку на него"""
+    responses, requests = mock_http
+    responses[WB_API_URL.format(article="777")] = httpx.Response(200, json={"data": {"products": [
+        {"id": 777, "name": "Плед", "salePriceU": 250000, "pics": 2},
+    ]}})
+
+    user = User(email="catalog@example.com", username="cataloguser")
+    db_session.add(user)
+    await db_session.flush()
+    wishlist = Wishlist(title="Дом", slug="catalog-home", owner_id=user.id)
+    db_session.add(wishlist)
+    await db_session.commit()
+    headers = {"Authorization": f"Bearer {create_access_token({'user_id': user.id})}"}
+    link = "https://www.wildberries.ru/catalog/777/detail.aspx"
+
+    # Каждый вызов - с пустым кэшем парсинга: переиспользуется именно каталог
+    for _ in range(2):
+        monkeypatch.setattr(product_catalog, "parser", ProductParserService(cache=ParseResultCache()))
+        response = await client.post("/api/v1/parser/parse-url", json={"url": link}, headers=headers)
+        assert response.status_code == 200
+    parsed = response.json()
+    assert parsed["title"] == "Плед"
+    assert parsed["images"]
+    assert len(requests) == 1
+
+    response = await client.post("/api/v1/items/", json={**parsed, "wishlist_id": wishlist.id, "link": link}, headers=headers)
+
+    assert response.status_code == 201
+    assert response.json()["image_url"] == parsed["image_url"]
+    assert response.json()["images"] == parsed["images"]
+    item = await db_session.get(WishlistItem, response.json()["id"])
+    assert item.product_id is not None
+    # Картинки не скопированы в элемент
+    assert item._image_url is None
+    assert item._images is None
+
+    # Не переданные картинки тоже берутся из каталога
+    response = await client.post(
+        "/api/v1/items/", json={"title": "Плед", "wishlist_id": wishlist.id, "link": link}, headers=headers
+    )
+    assert response.json()["images"] == parsed["images"]
+
+    # Очищенное владельцем поле не подменяется значением из каталога
+    response = await client.put(f"/api/v1/items/{item.id}", json={"image_url": None, "images": None}, headers=headers)
+    assert response.status_code == 200
+    assert not response.json()["image_url"]
+    assert response.json()["images"] == []
+
+    # Каталог свежий не дольше TTL кэша парсинга
+    monkeypatch.setitem(settings.PARSER_CACHE_TTL, "wildberries", 0)
+    monkeypatch.setattr(product_catalog, "parser", ProductParserService(cache=ParseResultCache()))
+    await client.post("/api/v1/parser/parse-url", json={"url": link}, headers=headers)
+    assert len(requests) == 2
+
+
+@pytest.mark.asyncio
+async def test_product_catalog_store_many_handles_concurrent_insert(db_session: AsyncSession, monkeypatch):
+    """Тест: товар, вставленный одновременным запросом, обновляется, а не роняет запись"""
+    first = ParsedItemData(title="Плед", price=2500, marketplace="wildberries")
+    ids = await product_catalog.store_many(db_session, {"wildberries:777": first, "wildberries:778": first})
+    await db_session.commit()
+
+    # Другой запрос вставил товар между чтением и вставкой
+    ids_before = product_catalog._ids
+    calls = []
+
+    async def stale_ids(db, keys):
+        calls.append(keys)
+        return {} if len(calls) == 1 else await ids_before(db, keys)
+
+    monkeypatch.setattr(product_catalog, "_ids", stale_ids)
+    second = ParsedItemData(title="Плед", price=2300, marketplace="wildberries")
+    stored = await product_catalog.store_many(
+        db_session, {"wildberries:777": second, "wildberries:779": second}
+    )
+    await db_session.commit()
+
+    assert stored["wildberries:777"] == ids["wildberries:777"]
+    assert set(stored) == {"wildberries:777", "wildberries:779"}
+    product = await product_catalog.get(db_session, "wildberries:777")
+    await db_session.refresh(product)
+    assert float(product.price) == 2300
+
+
+async def create_catalog_item(db_session: AsyncSession, **fields) -> tuple[Wishlist, WishlistItem]:
+    """Список с элементом, привязанным к товару wildberries:900"""
+    parsed = ParsedItemData(
+        title="Ваза", description="Из каталога", price=1500, marketplace="wildberries",
+        image_url="https://example.com/vase.webp", images=["https://example.com/vase.webp"],
+    )
+    await product_catalog.store_many(db_session, {"wildberries:900": parsed})
+    user = User(email="vase@example.com", username="vaseuser")
+    db_session.add(user)
+    await db_session.flush()
+    wishlist = Wishlist(title="Дом", slug="vase-home", owner_id=user.id)
+    db_session.add(wishlist)
+    await db_session.flush()
+
+    item = WishlistItem(
+        wishlist_id=wishlist.id, title="Ваза", link="https://www.wildberries.ru/catalog/900/detail.aspx", **fields
+    )
+    await product_catalog.attach(db_session, item)
+    db_session.add(item)
+    await db_session.commit()
+    return wishlist, item
+
+
+@pytest.mark.asyncio
+async def test_product_catalog_attach_keeps_cleared_fields(db_session: AsyncSession):
+    """Тест: при привязке к каталогу убираются только копии товара, очищенные поля остаются"""
+    _, item = await create_catalog_item(
+        db_session, description="", image_url="https://example.com/vase.webp", images=[]
+    )
+
+    assert item._image_url is None
+    assert item.image_url == "https://example.com/vase.webp"
+    assert item.description == ""
+    assert item.images == []
+
+
+@pytest.mark.asyncio
+async def test_catalog_fields_in_queries(db_session: AsyncSession):
+    """Тест: поля из каталога работают в select(), where() и update()"""
+    wishlist, item = await create_catalog_item(db_session)
+    own = WishlistItem(wishlist_id=wishlist.id, title="Своя ваза", product_id=item.product_id, description="Своё")
+    db_session.add(own)
+    await db_session.commit()
+
+    descriptions = await db_session.execute(
+        select(WishlistItem.id, WishlistItem.description).order_by(WishlistItem.id)
+    )
+    assert descriptions.all() == [(item.id, "Из каталога"), (own.id, "Своё")]
+    found = await db_session.scalars(select(WishlistItem.id).where(WishlistItem.description == "Из каталога"))
+    assert found.all() == [item.id]
+
+    await db_session.execute(
+        update(WishlistItem).where(WishlistItem.id == own.id).values({WishlistItem.description: "Новое"})
+    )
+    await db_session.commit()
+    await db_session.refresh(own)
+    assert own._description == "Новое"
+
+
+@pytest.mark.asyncio
+async def test_parser_benchmark_corpus():
+    """Тест: все парсеры извлекают ожидаемые поля из записанного корпуса, регрессии ловятся"""
+    cases, fixtures = parser_benchmark.load_corpus(padding=False)
+
+    report = await parser_benchmark.measure(cases, fixtures, iterations=1)
+
+    assert set(report) == set(parser_benchmark.PARSERS)
+    assert all(metrics["accuracy"] == 1.0 for metrics in report.values())
+    assert all(metrics["bytes"] > 0 for metrics in report.values())
+    # Цена проверки изображений измеряется отдельным прогоном
+    assert all(metrics["probe_p50_ms"] > 0 for metrics in report.values())
+    assert parser_benchmark.compare(report, report) == []
+
+    slower = {
+        name: {**metrics, "case_p50_ms": {case: ms * 3 + 10 for case, ms in metrics["case_p50_ms"].items()}}
+        for name, metrics in report.items()
+    }
+    baseline = {name: {**metrics, "bytes": metrics["bytes"] // 2} for name, metrics in report.items()}
+    assert parser_benchmark.compare(slower, report)
+    assert len(parser_benchmark.compare(report, baseline)) == len(report)
+
+
+@pytest.mark.asyncio
+async def test_parser_telemetry_classifies_failures(monkeypatch):
+    """Тест: исходы парсинга считаются по маркетплейсам и классам ошибок"""
+    responses = {
+        "https://www.ozon.ru/product/kofemolka-1/": httpx.Response(200, text=OZON_HTML),
+        "https://www.ozon.ru/product/kofemolka-2/": httpx.Response(429),
+        WB_API_URL.format(article="5"): httpx.Response(503),
+        "https://shop.example/blank": httpx.Response(200, text="<html><head></head><body></body></html>"),
+    }
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/slow":
+            raise httpx.ReadTimeout("timed out", request=request)
+        return responses.get(str(request.url), httpx.Response(404))
+
+    monkeypatch.setattr(parser_http_client, "_client", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    monkeypatch.setattr(settings, "PARSER_HEDGE_ENABLED", False)
+    parser_telemetry.reset()
+    service = ProductParserService(cache=ParseResultCache())
+
+    results = [
+        await service.parse_url(url)
+        for url in (
+            "https://www.ozon.ru/product/kofemolka-1/",
+            "https://www.ozon.ru/product/kofemolka-2/",
+            "https://www.wildberries.ru/catalog/5/detail.aspx",
+            "https://shop.example/slow",
+            "https://shop.example/blank",
+        )
+    ]
+
+    assert [result.error_kind for result in results] == [None, "blocked", "not_found", "timeout", "empty"]
+    stats = parser_telemetry.snapshot()
+    assert stats["ozon"]["outcomes"] == {"success": 1, "blocked": 1}
+    assert stats["ozon"]["recent"]["success_rate"] == 0.5
+    assert stats["ozon"]["latency"]["count"] == 2
+    assert stats["ozon"]["phases"]["parse"]["count"] == 1
+    assert stats["wildberries"]["outcomes"] == {"http_status": 1}
+    # OpenGraph - запасной парсер для тех же ссылок (страница WB отдала 404)
+    assert stats["other"]["outcomes"] == {"blocked": 1, "not_found": 1, "timeout": 1, "empty": 1}
+
+
+@pytest.mark.asyncio
+async def test_parser_telemetry_request_phases():
+    """Тест: фазы настоящего HTTP запроса попадают в гистограммы маркетплейса"""
+    parser_telemetry.reset()
+    fixtures = {"https://shop.example/page": parser_benchmark.Fixture(body=b"<html>" + b"x" * 4096, content_type="text/html")}
+
+    with parser_benchmark.FixtureServer(fixtures) as server:
+        transport = GuardedTransport(httpx.AsyncHTTPTransport(), guard=HostGuard())
+        async with httpx.AsyncClient(transport=transport) as http:
+            token = current_marketplace.set("ozon")
+            try:
+                response = await http.get(f"http://127.0.0.1:{server.port}/shop.example/page")
+            finally:
+                current_marketplace.reset(token)
+
+    assert response.status_code == 200
+    phases = parser_telemetry.snapshot()["ozon"]["phases"]
+    # Без TLS: соединение, ожидание первого байта и загрузка тела
+    assert {name: phase["count"] for name, phase in phases.items()} == {"connect": 1, "download": 1, "ttfb": 1}
+
+
+@pytest.mark.asyncio
+async def test_parser_stats_admin_only(client: AsyncClient, db_session: AsyncSession):
+    """Тест: телеметрию парсеров видит только администратор"""
+    parser_telemetry.reset()
+    parser_telemetry.record("wildberries", ParsedItemData(title="Плед"), 0.2)
+    user = User(email="stats@example.com", username="statsuser")
+    admin = User(email="stats-admin@example.com", username="statsadmin", is_admin=True)
+    db_session.add_all([user, admin])
+    await db_session.commit()
+
+    response = await client.get(
+        "/api/v1/admin/parser-stats",
+        headers={"Authorization": f"Bearer {create_access_token({'user_id': user.id})}"},
+    )
+    assert response.status_code == 403
+
+    response = await client.get(
+        "/api/v1/admin/parser-stats",
+        headers={"Authorization": f"Bearer {create_access_token({'user_id': admin.id})}"},
+    )
+    assert response.status_code == 200
+    wildberries = response.json()["marketplaces"]["wildberries"]
+    assert wildberries["outcomes"] == {"success": 1}
+    assert wildberries["latency"]["p50"] == 0.25
+    assert "executor" in response.json()
+
+
+def png_header(width: int, height: int) -> bytes:
+    """Начало PNG файла (сигнатура и IHDR)"""
+    return b"\x89PNG\r\n\x1a\n" + b"\x00\x00\x00\rIHDR" + width.to_bytes(4, "big") + height.to_bytes(4, "big") + b"\x08\x02\x00\x00\x00"
+
+
+def test_image_size_from_header():
+    """Тест: размеры читаются из заголовков PNG, GIF, JPEG и WebP"""
+    jpeg = b"\xff\xd8" + b"\xff\xe0\x00\x04\x00\x00" + b"\xff\xc0\x00\x11\x08" + (600).to_bytes(2, "big") + (800).to_bytes(2, "big")
+    webp = b"RIFF\x00\x00\x00\x00WEBPVP8X" + b"\x00" * 8 + (899).to_bytes(3, "little") + (1199).to_bytes(3, "little")
+
+    assert image_size(png_header(1000, 1200)) == (1000, 1200)
+    assert image_size(b"GIF89a" + (32).to_bytes(2, "little") + (16).to_bytes(2, "little")) == (32, 16)
+    assert image_size(jpeg) == (800, 600)
+    assert image_size(webp) == (900, 1200)
+    assert image_size(b"<html>") is None
+
+
+@pytest.mark.asyncio
+async def test_image_probe_drops_dead_and_picks_variant(mock_http, monkeypatch):
+    """Тест: мёртвые изображения выбрасываются, выбирается первый живой вариант, результаты кэшируются"""
+    responses, requests = mock_http
+    base = "https://cdn1.ozone.ru/s3/multimedia-1/"
+    headers = {"Content-Type": "image/png", "Content-Range": "bytes 0-16383/48213"}
+    responses[base + "1.jpg"] = httpx.Response(206, content=png_header(1000, 1000), headers=headers)
+    responses[base + "wc1000/2.jpg"] = httpx.Response(206, content=png_header(1000, 1333), headers=headers)
+    responses[base + "wc1000/3.jpg"] = httpx.Response(200, text="<html>placeholder</html>", headers={"Content-Type": "text/html"})
+    # wc1000/1.jpg и оба варианта 4.jpg - 404
+
+    monkeypatch.setattr(settings, "PARSER_IMAGE_PROBE", True)
+    monkeypatch.setattr(settings, "PARSER_IMAGE_PROBE_TIMEOUT", 0.001)
+    parser = OzonParser()
+    gallery = [base + f"wc1000/{n}.jpg" for n in range(1, 5)]
+
+    # Не успели за срок: ничего не выбрасываем и не кэшируем
+    slow = ImageProber()
+    monkeypatch.setattr("app.services.parser.base.image_prober", slow)
+    assert await parser.verify_images(gallery) == gallery
+    assert slow.stats["unknown"] == 8 and not slow._lru
+
+    monkeypatch.setattr(settings, "PARSER_IMAGE_PROBE_TIMEOUT", 1.0)
+    prober = ImageProber()
+    monkeypatch.setattr("app.services.parser.base.image_prober", prober)
+    requests.clear()
+    images = await parser.verify_images(gallery)
+    # Повторная проверка - из кэша, без запросов
+    assert await parser.verify_images(gallery) == images
+
+    assert images == [base + "1.jpg", base + "wc1000/2.jpg"]
+    assert len(requests) == 8
+    assert all(request.headers["Range"] == "bytes=0-16383" for request in requests)
+    info = prober.get(base + "wc1000/2.jpg")
+    assert (info.width, info.height, info.content_length) == (1000, 1333, 48213)
+    assert prober.get(base + "wc1000/4.jpg").ok is False
+
+
+@pytest.mark.asyncio
+async def test_image_probe_has_own_telemetry_label(monkeypatch):
+    """Тест: запросы проверки изображений не попадают в телеметрию маркетплейса парсинга"""
+    parser_telemetry.reset()
+    url = "https://cdn1.ozone.ru/s3/multimedia-1/wc1000/1.jpg"
+    fixtures = {url: parser_benchmark.Fixture(body=png_header(1000, 1000), content_type="image/png")}
+
+    with parser_benchmark.FixtureServer(fixtures) as server:
+        transport = GuardedTransport(parser_benchmark.FixtureTransport(server.port), guard=HostGuard())
+        await parser_http_client.use_transport(transport)
+        token = current_marketplace.set("ozon")
+        try:
+            infos = await ImageProber().probe_many([url])
+        finally:
+            current_marketplace.reset(token)
+            await parser_http_client.close()
+
+    assert infos[url].ok
+    stats = parser_telemetry.snapshot()
+    assert "ozon" not in stats
+    assert stats["image_probe"]["phases"]["ttfb"]["count"] == 1
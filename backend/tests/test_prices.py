@@ -0,0 +1,367 @@
+"""
+Тесты для фонового обновления цен
+"""
+from datetime import date, datetime, timedelta
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.config import settings
+from app.core.security import get_password_hash
+from app.models.item import ItemStatus, WishlistItem
+from app.models.user import User
+from app.models.wishlist import Wishlist, WishlistAccessType
+from app.services import email as email_module
+from app.services.parser.cache import ParseResultCache
+from app.services.price_alerts import PriceAlertService
+from app.services.price_history import price_history
+from app.services.price_refresh import PriceChange, PriceRefreshService, next_refresh_at
+from app.services.product_parser import ProductParserService
+from app.services.telegram_bot import wishlist_bot
+
+WB_LINK = "https://www.wildberries.ru/catalog/{article}/detail.aspx"
+WB_API_URL = "https://card.wb.ru/cards/v2/detail?nm={articles}"
+
+
+async def create_wishlist(db_session: AsyncSession, username: str = "prices", **fields) -> Wishlist:
+    """Пользователь со списком желаний"""
+    user = User(
+        email=f"{username}@example.com",
+        username=username,
+        hashed_password=get_password_hash("password123")
+    )
+    db_session.add(user)
+    await db_session.flush()
+
+    wishlist = Wishlist(title="День рождения", slug=f"{username}-dr", owner_id=user.id, **fields)
+    db_session.add(wishlist)
+    await db_session.flush()
+    return wishlist
+
+
+def add_item(db_session: AsyncSession, wishlist: Wishlist, link: str | None, price: float | None = None) -> WishlistItem:
+    """Элемент, уже стоящий в очереди обновления"""
+    item = WishlistItem(
+        wishlist_id=wishlist.id,
+        title="Товар",
+        link=link,
+        price=price,
+        price_refresh_at=datetime.utcnow() - timedelta(minutes=1),
+    )
+    db_session.add(item)
+    return item
+
+
+@pytest.mark.asyncio
+async def test_price_refresh_dedupes_products(db_session: AsyncSession, mock_http):
+    """Тест: элементы с одним товаром обновляются одним парсингом и одним UPDATE"""
+    responses, requests = mock_http
+    responses[WB_API_URL.format(articles="101;202")] = httpx.Response(200, json={"data": {"products": [
+        {"id": 101, "name": "Чайник", "salePriceU": 199000},
+        {"id": 202, "name": "Кружка", "salePriceU": 50000},
+    ]}})
+
+    first = await create_wishlist(db_session, "first")
+    second = await create_wishlist(db_session, "second")
+    items = [
+        add_item(db_session, first, WB_LINK.format(article=101), price=2500),
+        add_item(db_session, second, WB_LINK.format(article=101) + "?size=1", price=2500),
+        add_item(db_session, second, WB_LINK.format(article=202)),
+        add_item(db_session, first, "https://example.com/gift"),
+    ]
+    await db_session.commit()
+
+    service = PriceRefreshService(ProductParserService(cache=ParseResultCache()))
+    changes = await service.run_once(db_session)
+
+    assert len(requests) == 1
+    assert {change.key: change.new_price for change in changes} == {"wildberries:101": 1990, "wildberries:202": 500}
+
+    db_session.expire_all()
+    rows = (await db_session.execute(select(WishlistItem).order_by(WishlistItem.id))).scalars().all()
+    assert [float(row.price) if row.price else None for row in rows] == [1990, 1990, 500, None]
+    assert all(row.price_refresh_at > datetime.utcnow() for row in rows[:3])
+    # Ссылка не на маркетплейс снимается с обновления
+    assert rows[3].price_refresh_at is None
+    assert len(items) == service.stats["items"]
+
+
+@pytest.mark.asyncio
+async def test_price_refresh_dedupes_catalog_fields(db_session: AsyncSession, mock_http):
+    """Тест: элемент, привязанный к каталогу обновлением цен, не хранит копии картинок товара"""
+    responses, requests = mock_http
+    responses[WB_API_URL.format(articles="501")] = httpx.Response(200, json={"data": {"products": [
+        {"id": 501, "name": "Ваза", "salePriceU": 150000, "pics": 2},
+    ]}})
+    parser = ProductParserService(cache=ParseResultCache())
+    parsed = await parser.parse_url(WB_LINK.format(article=501))
+
+    wishlist = await create_wishlist(db_session)
+    item = add_item(db_session, wishlist, WB_LINK.format(article=501))
+    item.description = "Для мамы"
+    item.image_url = parsed.image_url
+    item.images = parsed.images
+    await db_session.commit()
+    item_id = item.id
+
+    await PriceRefreshService(parser).run_once(db_session)
+
+    db_session.expire_all()
+    item = await db_session.get(WishlistItem, item_id)
+    assert item.product_id is not None
+    assert item._image_url is None and item._images is None
+    assert item.images == parsed.images
+    # Своё описание владельца остаётся
+    assert item.description == "Для мамы"
+
+
+@pytest.mark.asyncio
+async def test_price_refresh_respects_budget(db_session: AsyncSession, mock_http, monkeypatch):
+    """Тест: за цикл парсится не больше бюджета товаров, остальные ждут"""
+    responses, requests = mock_http
+    responses[WB_API_URL.format(articles="301")] = httpx.Response(200, json={"data": {"products": [
+        {"id": 301, "name": "Лампа", "salePriceU": 100000},
+    ]}})
+    monkeypatch.setattr(settings, "PRICE_REFRESH_PRODUCTS_PER_CYCLE", 1)
+
+    wishlist = await create_wishlist(db_session)
+    add_item(db_session, wishlist, WB_LINK.format(article=301))
+    waiting = add_item(db_session, wishlist, WB_LINK.format(article=302))
+    waiting.price_refresh_at = datetime.utcnow()
+    await db_session.commit()
+    waiting_id = waiting.id
+
+    service = PriceRefreshService(ProductParserService(cache=ParseResultCache()))
+    await service.run_once(db_session)
+
+    assert service.stats["products"] == 1
+    db_session.expire_all()
+    refreshed = await db_session.get(WishlistItem, waiting_id)
+    assert refreshed.price_checked_at is None
+    assert refreshed.price_refresh_at <= datetime.utcnow()
+
+
+@pytest.mark.asyncio
+async def test_price_refresh_claims_items_before_parsing(db_session: AsyncSession, mock_http, monkeypatch):
+    """Тест: цикл другого воркера во время парсинга не берёт те же элементы"""
+    responses, requests = mock_http
+    responses[WB_API_URL.format(articles="401")] = httpx.Response(200, json={"data": {"products": [
+        {"id": 401, "name": "Плед", "salePriceU": 300000},
+    ]}})
+    wishlist = await create_wishlist(db_session)
+    add_item(db_session, wishlist, WB_LINK.format(article=401))
+    await db_session.commit()
+
+    parser = ProductParserService(cache=ParseResultCache())
+    service = PriceRefreshService(parser)
+    other = PriceRefreshService(ProductParserService(cache=ParseResultCache()))
+    parse_many = parser.parse_many
+
+    async def parse_many_with_second_worker(links):
+        # Элементы уже заняты и зафиксированы - второй цикл видит пустую очередь
+        async with async_sessionmaker(db_session.bind)() as session:
+            await other.run_once(session)
+        async for row in parse_many(links):
+            yield row
+
+    monkeypatch.setattr(parser, "parse_many", parse_many_with_second_worker)
+    await service.run_once(db_session)
+
+    assert other.stats["items"] == 0
+    assert service.stats["updated"] == 1
+    assert len(requests) == 1
+
+
+def test_next_refresh_prioritises_events_and_views():
+    """Тест: близкое событие и популярный список обновляются чаще"""
+    now = datetime(2026, 3, 1, 12, 0)
+    base = next_refresh_at(now, None, 0) - now
+    soon = next_refresh_at(now, date(2026, 3, 3), 0) - now
+    popular = next_refresh_at(now, None, 1000) - now
+
+    assert base == timedelta(hours=settings.PRICE_REFRESH_BASE_HOURS)
+    assert soon < base
+    assert popular < base
+    assert next_refresh_at(now, date(2026, 3, 1), 10**6) - now == timedelta(hours=settings.PRICE_REFRESH_MIN_HOURS)
+
+
+@pytest.mark.asyncio
+async def test_price_history_dedupes_and_keeps_window_start(db_session: AsyncSession):
+    """Тест: одинаковые цены подряд не пишутся, минимум учитывает цену на начало окна"""
+    now = datetime.utcnow()
+    await price_history.record_many(db_session, {"ozon:1": 900.0}, recorded_at=now - timedelta(days=45))
+    await price_history.record_many(db_session, {"ozon:1": 900.0}, recorded_at=now - timedelta(days=20))
+    changed = await price_history.record_many(db_session, {"ozon:1": 1200.0, "ozon:2": 50.0}, recorded_at=now)
+    await db_session.commit()
+
+    assert changed == {"ozon:1": 900.0, "ozon:2": None}
+    points = await price_history.history(db_session, "ozon:1", since=now - timedelta(days=30))
+    assert [price for _, price in points] == [900.0, 1200.0]
+    # 900 действовала в начале окна, хотя её точка старше 30 дней
+    assert await price_history.min_prices(db_session, ["ozon:1", "ozon:2"]) == {"ozon:1": 900.0, "ozon:2": 50.0}
+
+
+@pytest.mark.asyncio
+async def test_price_history_compaction(db_session: AsyncSession):
+    """Тест: остаётся последняя цена дня, повтор предыдущей цены удаляется"""
+    day = datetime(2025, 1, 10, 9, 0)
+    points = [(day, 500.0), (day + timedelta(hours=1), 450.0), (day + timedelta(hours=2), 480.0),
+              (day + timedelta(days=1), 470.0), (day + timedelta(days=1, hours=1), 480.0)]
+    for recorded_at, price in points:
+        await price_history.record_many(db_session, {"wildberries:7": price}, recorded_at=recorded_at)
+    await price_history.record_many(db_session, {"wildberries:7": 470.0}, recorded_at=datetime.utcnow())
+    await db_session.commit()
+
+    deleted = await price_history.compact(db_session)
+    await db_session.rollback()
+    # Коммит - на вызывающей стороне, как у record_many
+    assert deleted == 4
+    assert len(await price_history.history(db_session, "wildberries:7", since=day)) == 6
+
+    await price_history.compact(db_session)
+    await db_session.commit()
+    points = await price_history.history(db_session, "wildberries:7", since=day)
+    # Конец первого дня - 480, второй день закончился той же ценой
+    assert points[:-1] == [(day + timedelta(hours=2), 480.0)]
+    assert points[-1][1] == 470.0
+    assert (await price_history.last_prices(db_session, ["wildberries:7"], before=day + timedelta(days=2))) == {
+        "wildberries:7": 480.0
+    }
+
+
+@pytest.mark.asyncio
+async def test_price_history_compaction_is_incremental(db_session: AsyncSession):
+    """Тест: дни до прошлой границы не перечитываются"""
+    day = datetime(2025, 2, 1, 9, 0)
+    for offset, price in enumerate([100.0, 90.0, 80.0, 70.0]):
+        await price_history.record_many(db_session, {"ozon:5": price}, recorded_at=day + timedelta(hours=offset))
+    await db_session.commit()
+
+    # Февраль уже за границей - не трогается, хотя в нём есть лишние точки
+    assert await price_history.compact(db_session, since=datetime(2025, 3, 1)) == 0
+    assert await price_history.compact(db_session, since=datetime(2025, 2, 1)) == 3
+
+
+@pytest.mark.asyncio
+async def test_item_price_history_endpoint(client: AsyncClient, db_session: AsyncSession):
+    """Тест: история цены элемента доступна по ключу товара"""
+    wishlist = await create_wishlist(db_session, access_type=WishlistAccessType.public)
+    item = add_item(db_session, wishlist, WB_LINK.format(article=555))
+    await price_history.record_many(
+        db_session, {"wildberries:555": 3000.0}, recorded_at=datetime.utcnow() - timedelta(days=3)
+    )
+    await price_history.record_many(db_session, {"wildberries:555": 2500.0})
+    await db_session.commit()
+
+    response = await client.get(f"/api/v1/items/{item.id}/price-history")
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["product_key"] == "wildberries:555"
+    assert [point["price"] for point in data["points"]] == [3000.0, 2500.0]
+    assert data["current_price"] == 2500.0
+    assert data["min_price_30d"] == 2500.0
+
+
+@pytest.mark.asyncio
+async def test_price_alerts_coalesce_per_user(db_session: AsyncSession, monkeypatch):
+    """Тест: снижения цен собираются одним запросом и уходят одним письмом на пользователя"""
+    wishlist = await create_wishlist(db_session, "alerts")
+    other = await create_wishlist(db_session, "unverified")
+    (await db_session.get(User, wishlist.owner_id)).is_verified = True
+    items = [
+        add_item(db_session, wishlist, WB_LINK.format(article=1)),
+        add_item(db_session, wishlist, WB_LINK.format(article=1) + "?size=2"),
+        add_item(db_session, wishlist, WB_LINK.format(article=2)),
+        add_item(db_session, wishlist, WB_LINK.format(article=3)),
+        add_item(db_session, other, WB_LINK.format(article=1)),
+    ]
+    items[3].status = ItemStatus.purchased
+    await db_session.commit()
+
+    ids = [item.id for item in items]
+    changes = [
+        PriceChange(key="wildberries:1", old_price=1000.0, new_price=800.0, item_ids=[ids[0], ids[1], ids[4]]),
+        PriceChange(key="wildberries:2", old_price=500.0, new_price=450.0, item_ids=[ids[2]]),
+        PriceChange(key="wildberries:3", old_price=700.0, new_price=600.0, item_ids=[ids[3]]),
+        # Рост и слишком маленькое снижение не уведомляем
+        PriceChange(key="wildberries:4", old_price=100.0, new_price=120.0, item_ids=[ids[2]]),
+        PriceChange(key="wildberries:5", old_price=100.0, new_price=99.0, item_ids=[ids[2]]),
+    ]
+
+    statements = []
+    sync_engine = db_session.bind.sync_engine
+    listener = lambda *args: statements.append(args[2])  # noqa: E731
+    event.listen(sync_engine, "before_cursor_execute", listener)
+    try:
+        service = PriceAlertService()
+        alerts = await service.collect(db_session, changes)
+    finally:
+        event.remove(sync_engine, "before_cursor_execute", listener)
+
+    assert len(statements) == 1
+    assert [(alert.email, [drop["new_price"] for drop in alert.drops]) for alert in alerts] == [
+        ("alerts@example.com", [800.0, 450.0]),
+        (None, [800.0]),
+    ]
+
+    connections, outbox = [], []
+
+    class RecordingConnection:
+        """SMTP соединение, которое только запоминает письма"""
+
+        def __init__(self, conf):
+            self.session = self
+
+        async def __aenter__(self):
+            connections.append(self)
+            return self
+
+        async def __aexit__(self, *exc):
+            return False
+
+        async def send_message(self, message):
+            outbox.append(message)
+
+    monkeypatch.setattr(email_module, "Connection", RecordingConnection)
+    monkeypatch.setattr(settings, "PRICE_ALERT_EMAIL_RATE", 1000.0)
+
+    # Три письма - одно SMTP соединение
+    await service.send(alerts * 3)
+
+    # Пользователь без Telegram и подтверждённого email не получает ничего
+    assert len(outbox) == 3
+    assert len(connections) == 1
+    assert outbox[0]["To"] == "alerts@example.com"
+    assert outbox[0]["From"] == f"{settings.SMTP_FROM_NAME} <{settings.SMTP_FROM}>"
+    assert service.stats["email"] == 3
+
+
+@pytest.mark.asyncio
+async def test_price_alert_links_are_escaped(monkeypatch):
+    """Тест: ссылка товара попадает в href экранированной и только если это http(s)"""
+    drops = [
+        {"title": "Чайник <b>", "link": 'https://shop.ru/1?a="><script>', "old_price": 100.0, "new_price": 80.0},
+        {"title": "Ложка", "link": "javascript:alert(1)", "old_price": 50.0, "new_price": 40.0},
+    ]
+
+    body = email_module.EmailService.price_drop_message("a@example.com", drops).body
+    assert '<a href="https://shop.ru/1?a=&quot;&gt;&lt;script&gt;">Чайник &lt;b&gt;</a>' in body
+    assert "javascript:" not in body
+    assert "<li>Ложка: " in body
+
+    sent = []
+
+    class FakeBot:
+        async def send_message(self, **kwargs):
+            sent.append(kwargs["text"])
+
+    monkeypatch.setattr(wishlist_bot, "app", SimpleNamespace(bot=FakeBot()))
+    assert await wishlist_bot.send_price_drops(1, drops)
+    assert '<a href="https://shop.ru/1?a=&quot;&gt;&lt;script&gt;">Чайник &lt;b&gt;</a>' in sent[0]
+    assert "javascript:" not in sent[0]
+    assert "• Ложка: " in sent[0]
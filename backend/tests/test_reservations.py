@@ -0,0 +1,134 @@
+"""
+Тесты бронирования подарков
+"""
+import asyncio
+
+import pytest
+import pytest_asyncio
+from httpx import AsyncClient
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.core.security import create_access_token
+from app.database import Base, get_db
+from app.main import app
+from app.models.item import ItemStatus, WishlistItem
+from app.models.reservation import Reservation
+from app.models.user import User
+from app.models.wishlist import Wishlist, WishlistAccessType
+
+# Сколько гостей одновременно бронируют один подарок
+STRESS_GUESTS = 300
+
+
+async def create_gift(db_session: AsyncSession, guests: int = 1, **wishlist_fields) -> tuple[WishlistItem, list[str]]:
+    """Подарок в чужом списке и токены гостей"""
+    owner = User(email="owner@example.com", username="owner")
+    users = [User(email=f"guest{i}@example.com", username=f"guest{i}") for i in range(guests)]
+    wishlist = Wishlist(
+        owner=owner,
+        title="День рождения",
+        slug="birthday",
+        **{"access_type": WishlistAccessType.by_link, **wishlist_fields},
+    )
+    item = WishlistItem(wishlist=wishlist, title="Наушники")
+    db_session.add_all([owner, *users, wishlist, item])
+    await db_session.commit()
+
+    tokens = [create_access_token({"user_id": user.id}) for user in [owner, *users]]
+    return item, tokens
+
+
+def auth(token: str) -> dict:
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.mark.asyncio
+async def test_create_reservation(client: AsyncClient, db_session: AsyncSession):
+    """Тест: бронь создаётся, подарок становится reserved, повторная бронь отклоняется"""
+    item, (owner_token, guest_token) = await create_gift(db_session)
+
+    response = await client.post("/api/v1/reservations/", json={"item_id": item.id, "comment": "Беру"}, headers=auth(guest_token))
+
+    assert response.status_code == 201
+    assert response.json()["item_id"] == item.id
+    assert response.json()["comment"] == "Беру"
+    await db_session.refresh(item)
+    assert item.status == ItemStatus.reserved
+
+    response = await client.post("/api/v1/reservations/", json={"item_id": item.id}, headers=auth(guest_token))
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Подарок уже забронирован"
+
+
+@pytest.mark.asyncio
+async def test_reservation_permission_checks(client: AsyncClient, db_session: AsyncSession):
+    """Тест: отказы условного UPDATE объясняются так же, как раньше"""
+    item, (owner_token, guest_token) = await create_gift(db_session, allow_reservations=False)
+
+    response = await client.post("/api/v1/reservations/", json={"item_id": item.id}, headers=auth(owner_token))
+    assert response.json()["detail"] == "Нельзя бронировать свои подарки"
+
+    response = await client.post("/api/v1/reservations/", json={"item_id": item.id}, headers=auth(guest_token))
+    assert response.json()["detail"] == "Бронирование отключено для этого списка"
+
+    item.wishlist.allow_reservations = True
+    item.wishlist.access_type = WishlistAccessType.private
+    await db_session.commit()
+    response = await client.post("/api/v1/reservations/", json={"item_id": item.id}, headers=auth(guest_token))
+    assert response.status_code == 403
+
+    response = await client.post("/api/v1/reservations/", json={"item_id": item.id + 100}, headers=auth(guest_token))
+    assert response.status_code == 404
+
+    await db_session.refresh(item)
+    assert item.status == ItemStatus.available
+
+
+@pytest_asyncio.fixture
+async def file_db(tmp_path):
+    """
+    БД в файле: у каждого запроса своя сессия и своё соединение
+
+    Общая сессия client не годится - одновременные запросы должны
+    конкурировать за строку, как в настоящей БД.
+    """
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'stress.db'}", connect_args={"timeout": 60})
+    sessions = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    async def override_get_db():
+        async with sessions() as session:
+            try:
+                yield session
+                await session.commit()
+            except Exception:
+                await session.rollback()
+                raise
+
+    app.dependency_overrides[get_db] = override_get_db
+    async with sessions() as session:
+        yield session
+    app.dependency_overrides.clear()
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+@pytest.mark.slow
+async def test_concurrent_reservations_claim_item_once(file_db: AsyncSession):
+    """Тест: из сотен одновременных броней одного подарка проходит ровно одна"""
+    item, tokens = await create_gift(file_db, guests=STRESS_GUESTS)
+
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        responses = await asyncio.gather(*(
+            client.post("/api/v1/reservations/", json={"item_id": item.id}, headers=auth(token))
+            for token in tokens[1:]
+        ))
+
+    statuses = [response.status_code for response in responses]
+    assert statuses.count(201) == 1
+    assert statuses.count(400) == STRESS_GUESTS - 1
+    assert await file_db.scalar(select(func.count()).select_from(Reservation)) == 1
+    await file_db.refresh(item)
+    assert item.status == ItemStatus.reserved
@@ -1,13 +1,17 @@
 """
 Тесты для работы со списками желаний
 """
+from contextlib import contextmanager
+
 import pytest
 from httpx import AsyncClient
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.security import create_access_token, get_password_hash
+from app.models.item import WishlistItem
 from app.models.user import User
-from app.models.wishlist import Wishlist
+from app.models.wishlist import Wishlist, WishlistAccessType
 
 
 async def create_test_user(db_session: AsyncSession) -> tuple[User, str]:
@@ -167,3 +171,59 @@ async def test_cannot_update_others_wishlist(client: AsyncClient, db_session: As
     )
 
     assert response.status_code == 404  # Или 403
+
+
+@contextmanager
+def count_queries(db_session: AsyncSession):
+    """Список SQL запросов, выполненных внутри блока"""
+    statements: list[str] = []
+
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db_session.bind.sync_engine, "before_cursor_execute", on_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(db_session.bind.sync_engine, "before_cursor_execute", on_execute)
+
+
+@pytest.mark.asyncio
+async def test_get_wishlist_by_username_single_query(client: AsyncClient, db_session: AsyncSession):
+    """Тест: публичная ссылка читается одним запросом, приватный список скрыт в SQL"""
+    owner, token = await create_test_user(db_session)
+    shared = Wishlist(title="По ссылке", slug="shared", owner_id=owner.id, access_type=WishlistAccessType.by_link)
+    private = Wishlist(title="Секрет", slug="secret", owner_id=owner.id)
+    db_session.add_all([shared, private])
+    await db_session.flush()
+    db_session.add_all([
+        WishlistItem(wishlist_id=shared.id, title=title, position=position)
+        for title, position in (("Третий", 2), ("Первый", 0), ("Второй", 1))
+    ])
+    await db_session.commit()
+    # Ответ должен собираться из запроса, а не из объектов сессии
+    db_session.expunge_all()
+
+    with count_queries(db_session) as statements:
+        response = await client.get(f"/api/v1/wishlists/u/{owner.username}/{shared.id}")
+
+    assert response.status_code == 200
+    assert [item["title"] for item in response.json()["items"]] == ["Первый", "Второй", "Третий"]
+    assert len(statements) == 1, statements
+
+    # Приватный список: чужим - 403, владельцу - тем же одним запросом
+    response = await client.get(f"/api/v1/wishlists/u/{owner.username}/{private.id}")
+    assert response.status_code == 403
+    with count_queries(db_session) as statements:
+        response = await client.get(
+            f"/api/v1/wishlists/u/{owner.username}/{private.id}",
+            headers={"Authorization": f"Bearer {token}"}
+        )
+    assert response.status_code == 200
+    assert response.json()["items"] == []
+    assert len(statements) == 2  # Пользователь из токена + список
+
+    response = await client.get(f"/api/v1/wishlists/u/nobody/{shared.id}")
+    assert response.json()["detail"] == "Пользователь не найден"
+    response = await client.get(f"/api/v1/wishlists/u/{owner.username}/{private.id + 100}")
+    assert response.json()["detail"] == "Список не найден"